@@ -223,9 +223,16 @@ export default function AiChat({ userID }: AiChatProps) {
     setMessages((prev) => [...prev, userMessage]);
     setInputValue('');
 
-    // Send user message to backend and get AI response
+    // Stream the AI response from the backend as server-sent events
+    const aiMessageId = (Date.now() + 1).toString();
+    const updateAiMessage = (content: string) => {
+      setMessages((prev) =>
+        prev.map((message) => (message.id === aiMessageId ? { ...message, content } : message))
+      );
+    };
+
     try {
-      const response = await fetch(`http://localhost:5000/api/agent/${userID}`, {
+      const response = await fetch(`http://localhost:5000/api/agent/${userID}/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -233,27 +240,61 @@ export default function AiChat({ userID }: AiChatProps) {
         body: JSON.stringify({ content: userMessage.content }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error('Failed to get AI response');
       }
 
-      const data = await response.json();
-      
-      // Create AI message
-      const aiMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        content: data.response,
-        sender: 'ai',
-        timestamp: new Date(),
-      };
-      
-      setMessages((prev) => [...prev, aiMessage]);
-      
+      // Create an empty AI message that fills in as tokens arrive
+      setMessages((prev) => [
+        ...prev,
+        { id: aiMessageId, content: '', sender: 'ai', timestamp: new Date() },
+      ]);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let content = '';
+      let route: string | null = null;
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        const events = buffer.split('\n\n');
+        buffer = events.pop() ?? '';
+
+        for (const rawEvent of events) {
+          const eventName = rawEvent.match(/^event: (.*)$/m)?.[1];
+          const dataLine = rawEvent.match(/^data: (.*)$/m)?.[1];
+          if (!eventName || !dataLine) continue;
+          const data = JSON.parse(dataLine);
+
+          if (eventName === 'token') {
+            content += data.text;
+            updateAiMessage(content);
+          } else if (eventName === 'reset') {
+            // The tokens so far were the model's preamble to a tool call, not the answer
+            content = '';
+            updateAiMessage(content);
+          } else if (eventName === 'navigate') {
+            route = data.route;
+          } else if (eventName === 'done') {
+            content = data.response;
+            updateAiMessage(content);
+          } else if (eventName === 'error') {
+            throw new Error(data.error);
+          }
+        }
+      }
+
       // Handle navigation if needed
-      if (data.navigate && data.route) {
+      if (route) {
+        const target = route;
         // Navigate after a short delay
         setTimeout(() => {
-          window.location.href = data.route;
+          window.location.href = target;
         }, 1500);
       }
     } catch (error) {
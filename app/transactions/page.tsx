@@ -26,15 +26,27 @@ type UserData = {
   email: string;
 };
 
+type Totals = {
+  income: number;
+  expense: number;
+  net: number;
+  count: number;
+};
+
+const PAGE_SIZE = 25;
+
 export default function TransactionsPage() {
   const { user: clerkUser, isLoaded } = useUser();
   const [userData, setUserData] = useState<UserData | null>(null);
   const [transactions, setTransactions] = useState<Transaction[]>([]);
-  const [filteredTransactions, setFilteredTransactions] = useState<Transaction[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  // Over every transaction matching the filters, not just the pages loaded so far
+  const [totals, setTotals] = useState<Totals | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [searchTerm, setSearchTerm] = useState('');
-  const [visibleTransactions, setVisibleTransactions] = useState(10);
+  const [debouncedSearch, setDebouncedSearch] = useState('');
   const [sortField, setSortField] = useState<string>('created_at');
   const [sortDirection, setSortDirection] = useState<'asc' | 'desc'>('desc');
   const [filterType, setFilterType] = useState<string>('all');
@@ -66,75 +78,58 @@ export default function TransactionsPage() {
     fetchUserData();
   }, [isLoaded, clerkUser]);
 
+  // Filtering, search and sorting happen on the server; each request returns one page
+  const fetchPage = async (cursor: string | null) => {
+    if (!userData || !userData.user_id) return null;
+
+    const params = new URLSearchParams({
+      limit: String(PAGE_SIZE),
+      sort: sortField,
+      order: sortDirection,
+    });
+    if (filterType !== 'all') params.set('type', filterType);
+    if (debouncedSearch) params.set('q', debouncedSearch);
+    if (cursor) params.set('cursor', cursor);
+
+    const response = await fetch(`http://localhost:5000/api/transactions/${userData.user_id}/page?${params}`);
+
+    if (!response.ok) {
+      throw new Error('Failed to fetch transactions');
+    }
+
+    return response.json();
+  };
+
   useEffect(() => {
-    const fetchTransactions = async () => {
-      if (!userData || !userData.user_id) return;
-      
+    const timeout = setTimeout(() => setDebouncedSearch(searchTerm.trim()), 300);
+    return () => clearTimeout(timeout);
+  }, [searchTerm]);
+
+  useEffect(() => {
+    let cancelled = false;
+
+    const fetchFirstPage = async () => {
       try {
-        const response = await fetch(`http://localhost:5000/api/transactions/${userData.user_id}`);
-        
-        if (!response.ok) {
-          throw new Error('Failed to fetch transactions');
-        }
-        
-        const data = await response.json();
-        
-        // Determine transaction type based on amount sign
-        const processedData = data.map((transaction: Transaction) => {
-          // If amount is positive, it's income; if negative, it's expense
-          const transactionType = transaction.amount >= 0 ? 'income' : 'expense';
-          return { ...transaction, transaction_type: transactionType };
-        });
-        
-        setTransactions(processedData);
-        setFilteredTransactions(processedData);
-        setLoading(false);
+        setLoading(true);
+        const data = await fetchPage(null);
+        if (cancelled || !data) return;
+        setTransactions(data.transactions);
+        setNextCursor(data.next_cursor);
+        setTotals(data.totals);
+        setError(null);
       } catch (error) {
         console.error('Error fetching transactions:', error);
-        setError('Failed to load transactions. Please try again later.');
-        setLoading(false);
+        if (!cancelled) setError('Failed to load transactions. Please try again later.');
+      } finally {
+        if (!cancelled) setLoading(false);
       }
     };
 
     if (userData) {
-      fetchTransactions();
-    }
-  }, [userData]);
-
-  useEffect(() => {
-    let filtered = transactions;
-    
-    if (filterType !== 'all') {
-      filtered = filtered.filter(transaction => transaction.transaction_type === filterType);
-    }
-    
-    if (searchTerm) {
-      const term = searchTerm.toLowerCase();
-      filtered = filtered.filter(transaction => 
-        transaction.description.toLowerCase().includes(term) ||
-        transaction.category.toLowerCase().includes(term) ||
-        transaction.note?.toLowerCase().includes(term) ||
-        transaction.amount.toString().includes(term)
-      );
+      fetchFirstPage();
     }
-    
-    filtered = [...filtered].sort((a, b) => {
-      if (sortField === 'amount') {
-        return sortDirection === 'asc' 
-          ? a.amount - b.amount 
-          : b.amount - a.amount;
-      } else if (sortField === 'created_at') {
-        return sortDirection === 'asc'
-          ? new Date(a.created_at).getTime() - new Date(b.created_at).getTime()
-          : new Date(b.created_at).getTime() - new Date(a.created_at).getTime();
-      }
-      return sortDirection === 'asc'
-        ? new Date(a.created_at).getTime() - new Date(b.created_at).getTime()
-        : new Date(b.created_at).getTime() - new Date(a.created_at).getTime();
-    });
-    
-    setFilteredTransactions(filtered);
-  }, [transactions, searchTerm, filterType, sortField, sortDirection]);
+    return () => { cancelled = true; };
+  }, [userData, debouncedSearch, filterType, sortField, sortDirection]);
 
   const handleSort = (field: string) => {
     if (sortField === field) {
@@ -145,8 +140,20 @@ export default function TransactionsPage() {
     }
   };
 
-  const handleLoadMore = () => {
-    setVisibleTransactions(prev => prev + 10);
+  const handleLoadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    try {
+      setLoadingMore(true);
+      const data = await fetchPage(nextCursor);
+      if (!data) return;
+      setTransactions(prev => [...prev, ...data.transactions]);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error('Error fetching transactions:', error);
+      setError('Failed to load transactions. Please try again later.');
+    } finally {
+      setLoadingMore(false);
+    }
   };
 
   const formatCurrency = (amount: number) => {
@@ -164,7 +171,7 @@ export default function TransactionsPage() {
     const headers = ['Date', 'Description', 'Category', 'Amount', 'Type', 'Note'];
     const csvContent = [
       headers.join(','),
-      ...filteredTransactions.map(t => [
+      ...transactions.map(t => [
         formatDate(t.created_at),
         `"${t.description}"`,
         t.category,
@@ -251,7 +258,7 @@ export default function TransactionsPage() {
             </div>
           ) : error ? (
             <div className="text-center py-12 text-red-500">{error}</div>
-          ) : filteredTransactions.length === 0 ? (
+          ) : transactions.length === 0 ? (
             <div className="text-center py-12 text-gray-500">
               {searchTerm ? 'No transactions match your search.' : 'No transactions found.'}
             </div>
@@ -299,7 +306,7 @@ export default function TransactionsPage() {
                     </tr>
                   </thead>
                   <tbody className="divide-y divide-gray-200">
-                    {filteredTransactions.slice(0, visibleTransactions).map((transaction) => (
+                    {transactions.map((transaction) => (
                       <tr key={transaction.transaction_id} className="hover:bg-gray-50">
                         <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">
                           {formatDate(transaction.created_at)}
@@ -334,13 +341,14 @@ export default function TransactionsPage() {
                 </table>
               </div>
               
-              {filteredTransactions.length > visibleTransactions && (
+              {nextCursor && (
                 <div className="text-center py-4">
                   <button 
                     onClick={handleLoadMore}
-                    className="px-4 py-2 bg-gray-100 text-gray-700 rounded-lg hover:bg-gray-200 transition-colors"
+                    disabled={loadingMore}
+                    className="px-4 py-2 bg-gray-100 text-gray-700 rounded-lg hover:bg-gray-200 transition-colors disabled:opacity-50"
                   >
-                    Load More
+                    {loadingMore ? 'Loading...' : 'Load More'}
                   </button>
                 </div>
               )}
@@ -352,36 +360,23 @@ export default function TransactionsPage() {
           <div className="bg-white rounded-xl shadow-sm p-6">
             <h3 className="text-lg font-semibold text-gray-800 mb-2">Total Income</h3>
             <p className="text-2xl font-bold text-green-600">
-              {formatCurrency(
-                filteredTransactions
-                  .filter(t => t.amount >= 0)
-                  .reduce((sum, t) => sum + t.amount, 0)
-              )}
+              {formatCurrency(totals ? totals.income : 0)}
             </p>
           </div>
           
           <div className="bg-white rounded-xl shadow-sm p-6">
             <h3 className="text-lg font-semibold text-gray-800 mb-2">Total Expenses</h3>
             <p className="text-2xl font-bold text-red-600">
-              {formatCurrency(
-                Math.abs(
-                  filteredTransactions
-                    .filter(t => t.amount < 0)
-                    .reduce((sum, t) => sum + t.amount, 0)
-                )
-              )}
+              {formatCurrency(totals ? totals.expense : 0)}
             </p>
           </div>
           
           <div className="bg-white rounded-xl shadow-sm p-6">
             <h3 className="text-lg font-semibold text-gray-800 mb-2">Net Flow</h3>
             <p className={`text-2xl font-bold ${
-              filteredTransactions.reduce((sum, t) => sum + t.amount, 0) >= 0
-                ? 'text-green-600' : 'text-red-600'
+              (totals ? totals.net : 0) >= 0 ? 'text-green-600' : 'text-red-600'
             }`}>
-              {formatCurrency(
-                filteredTransactions.reduce((sum, t) => sum + t.amount, 0)
-              )}
+              {formatCurrency(totals ? totals.net : 0)}
             </p>
           </div>
         </div>
@@ -1,46 +1,53 @@
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import SystemMessage, HumanMessage, AIMessage
-from langchain.tools import Tool
-from langchain.agents import AgentExecutor, create_react_agent
-from langchain.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
-from supabase import create_client
 import json
 import re
 import uuid
+import queue
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+import db
+import clients
+from agent_stream import StreamingCallbackHandler, FINAL_ANSWER
+from history_context import get_history_context
+from user_index import resolve_user, list_users_compact
+import intents
+import chat_memory
+import tracing
 load_dotenv()
 
+# Agent runs in progress in this process; background LLM work waits for zero
+_active_turns = 0
+_active_turns_lock = threading.Lock()
 
-# Initialize Supabase client
-supabase_url = os.getenv('SUPABASE_URL')
-supabase_key = os.getenv('ANON_SUPABASE_KEY')
-supabase = create_client(supabase_url, supabase_key)
-
-# Initialize the chat model
-chat_model = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
-
-def get_transac_hist(user_id):
-    response = supabase.table('transactions').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
-    transactions = response.data
+@contextmanager
+def agent_turn():
+    global _active_turns
+    with _active_turns_lock:
+        _active_turns += 1
+    try:
+        yield
+    finally:
+        with _active_turns_lock:
+            _active_turns -= 1
 
-    string = ""
-    for transaction in transactions:
-        string += f"{transaction['created_at']} | {transaction['description']}; {transaction['note']}: ${transaction['amount']}\n"
+def active_turns():
+    """Number of agent runs in progress"""
+    return _active_turns
 
-    return string[:-1]
 
-def get_all_users(current_user_id):
-    """Get all users from the database except the current user"""
-    response = supabase.table('users').select('user_id,first_name,last_name').neq('user_id', current_user_id).execute()
-    return response.data
+def get_transac_hist(user_id):
+    """Recent transaction history for the agent prompt"""
+    return get_history_context(user_id).text()
 
-def get_user_wallet(user_id):
-    """Get a user's wallet information"""
-    response = supabase.table('wallets').select('*').eq('user_id', user_id).execute()
-    if response.data:
-        return response.data[0]
-    return None
+def get_all_users(current_user_id, name=""):
+    """Users other than the current one: closest matches to name, or a short list"""
+    name = name.strip().strip('"\'')
+    if name and name.lower() not in ('all', 'none', 'everyone'):
+        return resolve_user(name, exclude_user_id=current_user_id)
+    return list_users_compact(exclude_user_id=current_user_id)
 
 def parse_transfer_input(x, current_user_id):
     """Parse the transfer input, with robust error handling"""
@@ -98,7 +105,7 @@ def prepare_transfer(sender_id, recipient_id, amount, description="Quick Transfe
             amount = float(amount)
             
         # Check if sender has enough funds
-        sender_wallet = get_user_wallet(sender_id)
+        sender_wallet = db.get_wallet(sender_id)
         if not sender_wallet:
             return {"success": False, "error": "Sender wallet not found"}
         
@@ -106,15 +113,15 @@ def prepare_transfer(sender_id, recipient_id, amount, description="Quick Transfe
             return {"success": False, "error": f"Insufficient funds. Your balance is ${sender_wallet['debit_balance']}"}
         
         # Check if recipient exists
-        recipient_wallet = get_user_wallet(recipient_id)
+        recipient_wallet = db.get_wallet(recipient_id)
         if not recipient_wallet:
             return {"success": False, "error": "Recipient wallet not found"}
         
         # Get recipient name for better response
-        recipient_info = supabase.table('users').select('first_name,last_name').eq('user_id', recipient_id).execute()
+        recipient_info = db.get_user(recipient_id, 'first_name,last_name')
         recipient_name = "the recipient"
-        if recipient_info.data:
-            recipient_name = f"{recipient_info.data[0]['first_name']} {recipient_info.data[0]['last_name']}"
+        if recipient_info:
+            recipient_name = f"{recipient_info['first_name']} {recipient_info['last_name']}"
         
         # Generate a transfer ID
         transfer_id = str(uuid.uuid4())
@@ -147,63 +154,28 @@ def execute_transfer(transfer):
         description = transfer["description"]
         recipient_name = transfer["recipient_name"]
         
-        # Check again if sender has enough funds (balance might have changed)
-        sender_wallet = get_user_wallet(sender_id)
-        if not sender_wallet:
-            return {"success": False, "error": "Sender wallet not found"}
-        
-        if sender_wallet['debit_balance'] < amount:
-            return {"success": False, "error": f"Insufficient funds. Your balance is ${sender_wallet['debit_balance']}"}
-        
-        # Check if recipient exists (might have been deleted)
-        recipient_wallet = get_user_wallet(recipient_id)
-        if not recipient_wallet:
-            return {"success": False, "error": "Recipient wallet not found"}
-        
-        # Update sender's wallet
-        supabase.table('wallets').update({'debit_balance': sender_wallet['debit_balance'] - amount}).eq('user_id', sender_id).execute()
-        
-        # Update recipient's wallet
-        supabase.table('wallets').update({'debit_balance': recipient_wallet['debit_balance'] + amount}).eq('user_id', recipient_id).execute()
-        
-        # Create sender transaction (expense)
-        sender_transaction = {
-            'user_id': sender_id,
-            'description': description,
-            'amount': -amount,
-            'category': 'transfer',
-            'payment_method': 'debit',
-            'recipient': recipient_id,
-            'note': f'Transfer to {recipient_name}',
-            'is_fraud': False
-        }
-        
-        sender_response = supabase.table('transactions').insert(sender_transaction).execute()
-        
-        # Create recipient transaction (income)
-        recipient_transaction = {
-            'user_id': recipient_id,
-            'description': description,
-            'amount': amount,
-            'category': 'transfer',
-            'payment_method': 'debit',
-            'recipient': sender_id,
-            'note': f'Transfer from user {sender_id}',
-            'is_fraud': False
-        }
+        # Balance and recipient are re-checked inside the atomic transfer
+        result = db.transfer_funds(
+            sender_id=sender_id,
+            recipient_id=recipient_id,
+            amount=amount,
+            description=description,
+            sender_note=f'Transfer to {recipient_name}',
+            recipient_note=f'Transfer from user {sender_id}'
+        )
         
-        recipient_response = supabase.table('transactions').insert(recipient_transaction).execute()
+        if not result.get("success"):
+            error = result.get("error", "Transfer failed")
+            if "balance" in result:
+                error = f"{error}. Your balance is ${result['balance']}"
+            return {"success": False, "error": error, "message": error}
         
         return {
             "success": True, 
-            "message": f"Successfully transferred ${amount:.2f} to {recipient_name}. Your new balance is ${sender_wallet['debit_balance'] - amount:.2f}."
+            "message": f"Successfully transferred ${amount:.2f} to {recipient_name}. Your new balance is ${result['sender_balance']:.2f}."
         }
     except Exception as e:
-        # Rollback if there's an error
-        if 'sender_wallet' in locals() and 'recipient_wallet' in locals():
-            supabase.table('wallets').update({'debit_balance': sender_wallet['debit_balance']}).eq('user_id', sender_id).execute()
-            supabase.table('wallets').update({'debit_balance': recipient_wallet['debit_balance']}).eq('user_id', recipient_id).execute()
-        return {"success": False, "error": str(e)}
+        return {"success": False, "error": str(e), "message": f"Transfer failed: {str(e)}"}
 
 def prepare_transfer_wrapper(input_str, user_id, conversation_data):
     """Wrapper for prepare_transfer that handles parsing and stores the pending transfer"""
@@ -214,25 +186,42 @@ def prepare_transfer_wrapper(input_str, user_id, conversation_data):
         if "error" in params:
             return params["error"]
         
-        # Prepare the transfer
-        result = prepare_transfer(
-            sender_id=params.get("sender_id"),
+        return stage_transfer(
+            conversation_data,
             recipient_id=params.get("recipient_id"),
             amount=params.get("amount"),
             description=params.get("description", "Quick Transfer")
         )
-        
-        # If successful, store the pending transfer in conversation data
-        if result.get("success") and "transfer" in result:
-            conversation_data["pending_transfer"] = result["transfer"]
-            
-            # Add a clear instruction to the message
-            result["message"] += "\n\nPlease reply with 'yes' to confirm or 'no' to cancel."
-        
-        return result
     except Exception as e:
         return f"Error preparing transfer: {str(e)}"
 
+def stage_transfer(conversation_data, recipient_id, amount, description="Quick Transfer"):
+    """Prepare a transfer from the conversation's user and keep it pending confirmation"""
+    result = prepare_transfer(
+        sender_id=conversation_data["user_id"],
+        recipient_id=recipient_id,
+        amount=amount,
+        description=description
+    )
+
+    # If successful, store the pending transfer in conversation data
+    if result.get("success") and "transfer" in result:
+        conversation_data["pending_transfer"] = result["transfer"]
+
+        # Add a clear instruction to the message
+        result["message"] += "\n\nPlease reply with 'yes' to confirm or 'no' to cancel."
+
+    return result
+
+CONFIRM_WORDS = ["yes", "confirm", "approve", "ok", "sure", "proceed", "go ahead"]
+CANCEL_WORDS = ["no", "cancel", "reject", "stop", "don't", "dont"]
+# Answer balance / recent transactions / payee lookups without the agent
+INTENT_FAST_PATH = os.getenv('INTENT_FAST_PATH', '1') == '1'
+# Print every agent step to stdout (per-step timings are in tracing either way)
+AGENT_VERBOSE = os.getenv('AGENT_VERBOSE', '0') == '1'
+# 'react': text ReAct prompt; 'tools': native function calling with typed arguments
+AGENT_MODE = os.getenv('AGENT_MODE', 'react')
+
 def confirm_transfer(confirmation, conversation_data):
     """Confirm or cancel a prepared transfer"""
     pending_transfer = conversation_data.get("pending_transfer")
@@ -242,13 +231,13 @@ def confirm_transfer(confirmation, conversation_data):
     
     confirmation = confirmation.lower().strip()
     
-    if confirmation in ["yes", "confirm", "approve", "ok", "sure", "proceed", "go ahead"]:
+    if confirmation in CONFIRM_WORDS:
         # Execute the transfer
         result = execute_transfer(pending_transfer)
         # Clear the pending transfer
         conversation_data["pending_transfer"] = None
         return result["message"]
-    elif confirmation in ["no", "cancel", "reject", "stop", "don't", "dont"]:
+    elif confirmation in CANCEL_WORDS:
         # Clear the pending transfer
         conversation_data["pending_transfer"] = None
         return "Transfer cancelled. Is there anything else I can help you with?"
@@ -256,79 +245,61 @@ def confirm_transfer(confirmation, conversation_data):
         return "Please confirm with 'yes' to proceed or 'no' to cancel the transfer."
 
 def find_user_by_name(name):
-    """Find a user by their name"""
-    name_parts = name.lower().split()
-    
-    # Try to match by first name and last name
-    if len(name_parts) > 1:
-        first_name = name_parts[0]
-        last_name = ' '.join(name_parts[1:])
-        response = supabase.table('users').select('*').ilike('first_name', f"%{first_name}%").ilike('last_name', f"%{last_name}%").execute()
-        if response.data:
-            return response.data
-    
-    # Try to match by first name only
-    response = supabase.table('users').select('*').ilike('first_name', f"%{name_parts[0]}%").execute()
-    if response.data:
-        return response.data
-    
-    # Try to match by last name only
-    if len(name_parts) > 1:
-        response = supabase.table('users').select('*').ilike('last_name', f"%{name_parts[-1]}%").execute()
-        if response.data:
-            return response.data
-    
-    return []
+    """Find the users whose names best match name, tolerating typos"""
+    return resolve_user(name.strip().strip('"\''))
 
-def make_conversation(user_id):
-    context = get_transac_hist(user_id)
-    
-    # Initialize conversation data
+def conversation_state(conversation_data):
+    """The durable, JSON-serializable part of a conversation"""
+    return {
+        **chat_memory.state(conversation_data),
+        "pending_transfer": conversation_data.get("pending_transfer"),
+        "context_watermark": conversation_data.get("context_watermark"),
+    }
+
+def make_conversation(user_id, state=None):
+    """Build a conversation, optionally restoring a saved conversation_state
+
+    A conversation is plain data; the agent that runs it is shared by the
+    whole process (see get_agent).
+    """
+    history = get_history_context(user_id)
+    state = state or {}
     conversation_data = {
         "user_id": user_id,
-        "context": context,
-        "chat_history": [],
-        "pending_transfer": None,  # Will store prepared transfers
-        "agent_scratchpad": ""
+        "context": history.text(),
+        # created_at of the newest transaction included in context
+        "context_watermark": history.watermark,
+        "pending_transfer": state.get("pending_transfer"),  # Will store prepared transfers
     }
-    
-    # Define tools with closures to capture the current user_id and conversation_data
-    tools = [
-        Tool(
-            name="get_users",
-            func=lambda x: get_all_users(user_id),
-            description="Get a list of all users in the system. Returns user_id, first_name, and last_name for each user."
-        ),
-        Tool(
-            name="get_wallet",
-            func=lambda x: get_user_wallet(x if x != "me" else user_id),
-            description="Get wallet information for a specific user by providing their user_id. Use 'me' to get your own wallet."
-        ),
-        Tool(
-            name="find_user",
-            func=lambda x: find_user_by_name(x),
-            description="Find a user by their name (first name, last name, or both)."
-        ),
-        Tool(
-            name="prepare_transfer",
-            func=lambda x: prepare_transfer_wrapper(x, user_id, conversation_data),
-            description="Prepare a transfer to another user (but don't execute it). Provide a JSON with recipient_id, amount, and optional description."
-        ),
-        Tool(
-            name="confirm_transfer",
-            func=lambda x: confirm_transfer(x, conversation_data),
-            description="Confirm or cancel a prepared transfer. Pass 'yes' to confirm or 'no' to cancel."
-        )
-    ]
-    
-    # Define the system prompt
-    system_template = """You are a helpful AI assistant in a bank app. You are an expert in finance and accounting. 
+    # Recent {"role": "human" | "ai", "content": str} messages and the summary of older ones
+    chat_memory.restore(conversation_data, state)
+    return conversation_data
+
+# The conversation an agent run is serving; tools read the user and state from it
+_current_conversation = contextvars.ContextVar('conversation')
+
+@contextmanager
+def serving(conversation_data):
+    """Bind conversation_data to the agent tools run in this context"""
+    token = _current_conversation.set(conversation_data)
+    try:
+        yield
+    finally:
+        _current_conversation.reset(token)
+
+def _conversation():
+    return _current_conversation.get()
+
+SYSTEM_TEMPLATE = """You are a helpful AI assistant in a bank app. You are an expert in finance and accounting. 
     You reply as concisely as possible.
     
     Your user's ID is: {user_id}
     
     User transaction history:
     {context}
+
+    Conversation so far:
+    {chat_history}
     
     You have access to the following tools:
     {tools}
@@ -376,93 +347,324 @@ def make_conversation(user_id):
     {agent_scratchpad}
     """
 
+TOOL_CALLING_TEMPLATE = """You are a helpful AI assistant in a bank app. You are an expert in finance and accounting.
+You reply as concisely as possible.
+
+Your user's ID is: {user_id}
+
+User transaction history:
+{context}
+
+Conversation so far:
+{chat_history}
+
+MONEY TRANSFERS REQUIRE TWO STEPS:
+1. First call prepare_transfer to check if the transfer is valid
+2. Then ask the user to confirm the transfer
+3. Only after confirmation, call confirm_transfer with the user's response
+
+When a user mentions a name, call find_user to look them up; if nothing matches, call get_users and
+ask the user to pick a recipient. Never ask the user for a user_id.
+
+Tool calls that do not depend on each other (e.g. find_user for every name mentioned, or your own
+wallet alongside a lookup) should be made together in one step.
+
+Remember to be helpful, concise, and security-conscious.
+"""
+
+_agents = {}
+_agent_lock = threading.Lock()
+
+def _get_users(name: str = "") -> list:
+    """List other users. Pass a name to get the closest matches, or leave it empty for a short list. Returns at most 5 users with user_id and name."""
+    return get_all_users(_conversation()["user_id"], name)
+
+def _get_wallet(user_id: str = "me") -> dict:
+    """Get the wallet of the user with this user_id; 'me' is the current user."""
+    return db.get_wallet(_conversation()["user_id"] if user_id == "me" else user_id)
+
+def _find_user(name: str) -> list:
+    """Find a user by first name, last name or both (typos allowed). Returns the best matches with user_id, name and a match score from 0 to 1."""
+    return find_user_by_name(name)
+
+def _prepare_transfer(recipient_id: str, amount: float, description: str = "Quick Transfer") -> dict:
+    """Prepare (but don't execute) a transfer of amount dollars from the current user to recipient_id."""
+    return stage_transfer(_conversation(), recipient_id, amount, description)
+
+def _confirm_transfer(confirmation: str) -> str:
+    """Confirm or cancel the prepared transfer: 'yes' to confirm, 'no' to cancel."""
+    return confirm_transfer(confirmation, _conversation())
+
+def _build_tool_calling_agent(llm):
+    """Typed tools bound to the model as functions; one step may call several"""
+    StructuredTool, AgentExecutor, create_tool_calling_agent = clients.get('tool_agent_framework')
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+    tools = [
+        StructuredTool.from_function(func, name=name)
+        for name, func in (("get_users", _get_users), ("get_wallet", _get_wallet), ("find_user", _find_user),
+                           ("prepare_transfer", _prepare_transfer), ("confirm_transfer", _confirm_transfer))
+    ]
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", TOOL_CALLING_TEMPLATE),
+        ("human", "{input}"),
+        MessagesPlaceholder("agent_scratchpad"),
+    ])
+    agent = create_tool_calling_agent(llm=llm, tools=tools, prompt=prompt)
+    return {
+        "llm": llm,
+        "executor": AgentExecutor(agent=agent, tools=tools, verbose=AGENT_VERBOSE, handle_parsing_errors=True),
+        "tools": "\n\n".join([f"{tool.name}: {tool.description}" for tool in tools]),
+        "tool_names": ", ".join([tool.name for tool in tools]),
+        # The final answer is the model's whole text reply
+        "final_marker": None,
+    }
+
+def _build_agent(llm):
+    """Tools, prompt, ReAct runnable and executor; nothing in them is per user"""
+    Tool, AgentExecutor, create_react_agent = clients.get('agent_framework')
+    from langchain_core.prompts import ChatPromptTemplate
+
+    tools = [
+        Tool(
+            name="get_users",
+            func=lambda x: get_all_users(_conversation()["user_id"], x),
+            description="List other users. Pass a name to get the closest matches, or 'all' for a short list. Returns at most 5 users with user_id and name."
+        ),
+        Tool(
+            name="get_wallet",
+            func=lambda x: db.get_wallet(x if x != "me" else _conversation()["user_id"]),
+            description="Get wallet information for a specific user by providing their user_id. Use 'me' to get your own wallet."
+        ),
+        Tool(
+            name="find_user",
+            func=lambda x: find_user_by_name(x),
+            description="Find a user by their name (first name, last name, or both, typos allowed). Returns the best matches with user_id, name and a match score from 0 to 1."
+        ),
+        Tool(
+            name="prepare_transfer",
+            func=lambda x: prepare_transfer_wrapper(x, _conversation()["user_id"], _conversation()),
+            description="Prepare a transfer to another user (but don't execute it). Provide a JSON with recipient_id, amount, and optional description."
+        ),
+        Tool(
+            name="confirm_transfer",
+            func=lambda x: confirm_transfer(x, _conversation()),
+            description="Confirm or cancel a prepared transfer. Pass 'yes' to confirm or 'no' to cancel."
+        )
+    ]
+
     # Create the prompt with system and human messages
     prompt = ChatPromptTemplate.from_messages([
-        ("system", system_template),
+        ("system", SYSTEM_TEMPLATE),
         ("human", "{input}"),  # Ensure the user's input is included as a human message
     ])
 
-    # Get tool names for the prompt
-    tool_names = ", ".join([tool.name for tool in tools])
-
-    # Create the agent
-    agent = create_react_agent(
-        llm=chat_model,
-        tools=tools,
-        prompt=prompt
-    )
+    agent = create_react_agent(llm=llm, tools=tools, prompt=prompt)
+    return {
+        "llm": llm,
+        "executor": AgentExecutor(
+            agent=agent,
+            tools=tools,
+            verbose=AGENT_VERBOSE,
+            handle_parsing_errors=True,
+        ),
+        "tools": "\n\n".join([f"{tool.name}: {tool.description}" for tool in tools]),
+        "tool_names": ", ".join([tool.name for tool in tools]),
+        "final_marker": FINAL_ANSWER,
+    }
 
-    # Create the agent executor
-    agent_executor = AgentExecutor(
-        agent=agent,
-        tools=tools,
-        verbose=True,
-        handle_parsing_errors=True,
-    )
+AGENT_BUILDERS = {'react': _build_agent, 'tools': _build_tool_calling_agent}
 
-    # Store the agent executor and tools in conversation data
-    conversation_data["agent_executor"] = agent_executor
-    conversation_data["tools"] = tools
-    conversation_data["tool_names"] = tool_names
-    
-    return conversation_data
+def get_agent(mode=None):
+    """The process-wide agent for mode (default AGENT_MODE), rebuilt if the agent model is swapped"""
+    mode = mode or AGENT_MODE
+    llm = clients.get('agent_model')
+    agent = _agents.get(mode)
+    if agent is None or agent["llm"] is not llm:
+        with _agent_lock:
+            agent = _agents.get(mode)
+            if agent is None or agent["llm"] is not llm:
+                agent = _agents[mode] = AGENT_BUILDERS[mode](llm)
+    return agent
 
-def chat(conversation_data, message):
-    agent_executor = conversation_data["agent_executor"]
-    chat_history = conversation_data["chat_history"]
-    context = conversation_data["context"]
-    tools = conversation_data["tools"]
-    tool_names = conversation_data["tool_names"]
-    user_id = conversation_data["user_id"]
-    agent_scratchpad = conversation_data.get("agent_scratchpad", "")
-    
+def _quick_reply(conversation_data, message):
+    """Answer transfer confirmations and simple lookups without running the agent"""
     # Check if there's a pending transfer that needs confirmation
     pending_transfer = conversation_data.get("pending_transfer")
     
     # If there's a pending transfer and the user's message looks like a confirmation
-    if pending_transfer and message.lower() in ["yes", "confirm", "approve", "ok", "sure", "proceed", "go ahead"]:
+    if pending_transfer and message.lower() in CONFIRM_WORDS:
         # Execute the transfer directly
         result = execute_transfer(pending_transfer)
         # Clear the pending transfer
         conversation_data["pending_transfer"] = None
+        intents.record('confirmation')
         return result["message"]
     
     # If there's a pending transfer and the user's message looks like a rejection
-    if pending_transfer and message.lower() in ["no", "cancel", "reject", "stop", "don't", "dont"]:
+    if pending_transfer and message.lower() in CANCEL_WORDS:
         # Clear the pending transfer
         conversation_data["pending_transfer"] = None
+        intents.record('confirmation')
         return "Transfer cancelled. Is there anything else I can help you with?"
 
-    # Format chat history as a string
-    formatted_chat_history = ""
-    for msg in chat_history:
-        if isinstance(msg, HumanMessage):
-            formatted_chat_history += f"Human: {msg.content}\n"
-        elif isinstance(msg, AIMessage):
-            formatted_chat_history += f"Assistant: {msg.content}\n"
+    routed = intents.route(message) if INTENT_FAST_PATH else None
+    if routed:
+        intent, params = routed
+        reply = intents.answer(intent, params, conversation_data["user_id"])
+        _record_turn(conversation_data, message, {"output": reply})
+        intents.record(intent)
+        return reply
+
+    intents.record('agent')
+    return None
+
+def _agent_inputs(conversation_data, message):
+    """Build the AgentExecutor inputs for one turn"""
+    user_id = conversation_data["user_id"]
+    agent = get_agent()
+
+    # Pick up transactions made since the last turn (e.g. a transfer just executed)
+    history = get_history_context(user_id)
+    context = conversation_data["context"] = history.text()
+    conversation_data["context_watermark"] = history.watermark
 
     # Combine all inputs into a single dictionary
-    inputs = {
+    return {
         "input": message,  # The user's current message
-        "chat_history": formatted_chat_history,
+        "chat_history": chat_memory.history_text(conversation_data),
         "context": context,
-        "tools": "\n\n".join([f"{tool.name}: {tool.description}" for tool in tools]),
-        "tool_names": tool_names,
+        "tools": agent["tools"],
+        "tool_names": agent["tool_names"],
         "user_id": user_id,
-        "agent_scratchpad": agent_scratchpad
     }
 
-    # Run the agent
-    response = agent_executor.invoke(inputs)
+def _record_turn(conversation_data, message, response):
+    """Add the turn to the conversation's memory after the agent has answered"""
+    chat_memory.record(conversation_data, message, response["output"])
 
-    # Update chat history
-    chat_history.append(HumanMessage(content=message))
-    chat_history.append(AIMessage(content=response["output"]))
-    
-    # Update scratchpad with intermediate steps
-    conversation_data["agent_scratchpad"] = response.get("intermediate_steps", "")
-    
-    return response["output"]
+def chat(conversation_data, message):
+    with tracing.trace('chat', user_id=conversation_data["user_id"]) as turn:
+        reply = _quick_reply(conversation_data, message)
+        if reply is not None:
+            return reply
+
+        # Run the agent
+        with agent_turn(), serving(conversation_data):
+            response = get_agent()["executor"].invoke(_agent_inputs(conversation_data, message), config=turn.config())
+        _record_turn(conversation_data, message, response)
+
+        return response["output"]
+
+def chat_stream(conversation_data, message, include_thoughts=False):
+    """Like chat(), but yield (event, data) pairs while the agent runs
+
+    Events are tool_start, tool_end, thought (only with include_thoughts),
+    token, reset (drop the tokens so far), navigate and finally done, whose
+    data matches the JSON returned by the non-streaming endpoint. An agent
+    failure ends the stream with error.
+    """
+    events = queue.Queue()
+    handler = StreamingCallbackHandler(lambda event, data: events.put((event, data)), include_thoughts)
+    turn = tracing.Trace('chat', user_id=conversation_data["user_id"], stream=True)
+    outcome = {}
+    try:
+        with tracing.bound(turn):
+            reply = _quick_reply(conversation_data, message)
+        if reply is not None:
+            yield from handler.finish(reply)
+            return
+
+        with tracing.bound(turn):
+            inputs = _agent_inputs(conversation_data, message)
+        handler.marker = get_agent()["final_marker"]
+
+        def run():
+            try:
+                with agent_turn(), serving(conversation_data), tracing.bound(turn):
+                    outcome["response"] = get_agent()["executor"].invoke(inputs, config=turn.config([handler]))
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                events.put(None)
+
+        # In this request's context, so its route labels the agent's upstream calls
+        threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            yield event
+
+        if "error" in outcome:
+            yield ("error", {"error": str(outcome["error"])})
+            return
+
+        _record_turn(conversation_data, message, outcome["response"])
+        yield from handler.finish(outcome["response"]["output"])
+    finally:
+        tracing.finish(turn, outcome.get("error"))
+
+async def achat(conversation_data, message):
+    """Async chat(): the LLM runs on the event loop, data access on the db executor"""
+    with tracing.trace('chat', user_id=conversation_data["user_id"]) as turn:
+        reply = await db.run_in_executor(_quick_reply, conversation_data, message)
+        if reply is not None:
+            return reply
+
+        inputs = await db.run_in_executor(_agent_inputs, conversation_data, message)
+        with agent_turn(), serving(conversation_data):
+            response = await get_agent()["executor"].ainvoke(inputs, config=turn.config())
+        _record_turn(conversation_data, message, response)
+
+        return response["output"]
+
+async def achat_stream(conversation_data, message, include_thoughts=False):
+    """Async chat_stream(): yields the same (event, data) pairs"""
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    handler = StreamingCallbackHandler(
+        lambda event, data: loop.call_soon_threadsafe(events.put_nowait, (event, data)),
+        include_thoughts
+    )
+    turn = tracing.Trace('chat', user_id=conversation_data["user_id"], stream=True)
+    error = None
+    try:
+        with tracing.bound(turn):
+            reply = await db.run_in_executor(_quick_reply, conversation_data, message)
+        if reply is not None:
+            for event in handler.finish(reply):
+                yield event
+            return
+
+        with tracing.bound(turn):
+            inputs = await db.run_in_executor(_agent_inputs, conversation_data, message)
+        handler.marker = get_agent()["final_marker"]
+
+        async def run():
+            with agent_turn(), serving(conversation_data), tracing.bound(turn):
+                return await get_agent()["executor"].ainvoke(inputs, config=turn.config([handler]))
+
+        task = asyncio.ensure_future(run())
+        task.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, None))
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+
+        try:
+            response = task.result()
+        except Exception as e:
+            error = e
+            yield ("error", {"error": str(e)})
+            return
+
+        _record_turn(conversation_data, message, response)
+        for event in handler.finish(response["output"]):
+            yield event
+    finally:
+        tracing.finish(turn, error)
 
 def chat_test():
     print("\nGemini Chatbot (type 'exit' to quit)")
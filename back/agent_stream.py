@@ -0,0 +1,142 @@
+"""Server-sent event support for the chat agent
+
+``StreamingCallbackHandler`` turns LangChain callbacks from a running
+``AgentExecutor`` into ``(event, data)`` pairs: tool start/finish, optional
+intermediate thoughts, and the tokens of the final answer as the model
+produces them. ReAct agents write the answer after ``Final Answer:``;
+tool-calling agents (``marker=None``) answer with their whole text reply.
+Their text is streamed as it arrives, but a call may turn out to end in
+tool calls, making its text a preamble ("Let me look that up") rather than
+the answer: a ``reset`` event then tells the client to drop the tokens so
+far. A trailing ``|NAVIGATE|route`` directive is held back from the token
+stream and reported as its own ``navigate`` event.
+"""
+import json
+from langchain_core.callbacks import BaseCallbackHandler
+
+FINAL_ANSWER = "Final Answer:"
+NAVIGATE = "|NAVIGATE|"
+
+
+def split_navigation(reply):
+    """Split an agent reply into (message_text, route or None)"""
+    message_text, found, route = reply.partition(NAVIGATE)
+    if not found:
+        return reply, None
+    return message_text, route.strip()
+
+
+def _has_tool_calls(response):
+    """Whether an LLMResult's message asks for tool calls"""
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, 'message', None)
+            if message is not None and (getattr(message, 'tool_calls', None) or
+                                        getattr(message, 'tool_call_chunks', None) or
+                                        message.additional_kwargs.get('function_call')):
+                return True
+    return False
+
+
+def reply_payload(reply):
+    """The JSON body the agent endpoints return for a reply"""
+    message_text, route = split_navigation(reply)
+    if route is not None:
+        return {"response": message_text, "navigate": True, "route": route}
+    return {"response": reply, "navigate": False}
+
+
+def format_sse(event, data):
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class StreamingCallbackHandler(BaseCallbackHandler):
+    """Forward agent progress to ``emit(event, data)`` while it runs"""
+
+    # Called directly from the event loop in async runs; emit must be thread-safe
+    run_inline = True
+
+    def __init__(self, emit, include_thoughts=False, marker=FINAL_ANSWER):
+        self.emit = emit
+        self.include_thoughts = include_thoughts
+        self.marker = marker
+        self.last_thought = None
+        self.tool_names = {}
+        self.streamed = ""
+        self._reset()
+
+    def _reset(self):
+        self.buffer = ""
+        self.sent = None  # offset into buffer of the first unsent final-answer char
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._reset()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._reset()
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.buffer += token
+        if self.sent is None:
+            if self.marker is None:
+                self.sent = 0
+            else:
+                index = self.buffer.find(self.marker)
+                if index == -1:
+                    return
+                self.sent = index + len(self.marker)
+        # Anything from a '|' on might be a navigation directive; hold it until the end
+        hold = self.buffer.find("|", self.sent)
+        limit = len(self.buffer) if hold == -1 else hold
+        text = self.buffer[self.sent:limit]
+        if not self.streamed:
+            text = text.lstrip()
+        if text:
+            self.streamed += text
+            self.emit("token", {"text": text})
+        self.sent = limit
+
+    def on_llm_end(self, response, **kwargs):
+        if self.marker is None and self.streamed and _has_tool_calls(response):
+            # The text was a preamble to tool calls, not the answer
+            self.streamed = ""
+            self.emit("reset", {})
+
+    def on_agent_action(self, action, **kwargs):
+        if self.include_thoughts:
+            if self.marker is None:
+                # Text the model wrote alongside its tool calls, shared by parallel calls
+                thought = " ".join(message.content for message in getattr(action, "message_log", [])
+                                   if isinstance(message.content, str)).strip()
+            else:
+                thought = action.log.split("Action:")[0].replace("Thought:", "").strip()
+            if thought and thought != self.last_thought:
+                self.last_thought = thought
+                self.emit("thought", {"text": thought})
+
+    def on_tool_start(self, serialized, input_str, run_id=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name")
+        self.tool_names[run_id] = name
+        self.emit("tool_start", {"tool": name, "input": input_str})
+
+    def on_tool_end(self, output, run_id=None, **kwargs):
+        self.emit("tool_end", {"tool": self.tool_names.pop(run_id, None), "output": str(output)[:500]})
+
+    def on_tool_error(self, error, run_id=None, **kwargs):
+        self.emit("tool_end", {"tool": self.tool_names.pop(run_id, None), "error": str(error)})
+
+    def finish(self, reply):
+        """Events that close the stream once the agent has produced ``reply``"""
+        message_text, route = split_navigation(reply)
+        events = []
+        # Flush whatever the token stream has not delivered yet (or everything,
+        # if the model did not stream)
+        if message_text.startswith(self.streamed):
+            rest = message_text[len(self.streamed):]
+            if rest:
+                events.append(("token", {"text": rest}))
+        if route:
+            events.append(("navigate", {"route": route}))
+        events.append(("done", reply_payload(reply)))
+        return events
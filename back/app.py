@@ -1,34 +1,46 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
-from supabase import create_client
 import os
 from dotenv import load_dotenv
 import random
 import datetime
-from agent import chat, make_conversation
-from langchain.schema import SystemMessage
-from pinecone import Pinecone, ServerlessSpec
-from finance_summary_agent import generate_financial_summary, generate_summary_by_clerk_id
-import pickle
+from agent import chat, chat_stream, make_conversation, conversation_state, active_turns, AGENT_MODE
+from agent_stream import reply_payload, format_sse
+from conversation_store import ConversationStore, DEFAULT_PATH
+from finance_summary_agent import generate_financial_summary, generate_summary_by_clerk_id, get_metrics_by_clerk_id
+from financial_metrics import get_financial_metrics
+from transaction_pages import list_transaction_page
+from transaction_import import import_stream, detect_format, BATCH_SIZE, MAX_BATCH_SIZE
+import db
+import clients
+import user_index
+import notes_worker
+import intents
+import tracing
+import metrics
+import vector_index
 
 load_dotenv()
 
 app = Flask(__name__)
 # Configure CORS with explicit parameters
 CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000", "methods": ["GET", "POST", "PUT", "DELETE"], "allow_headers": ["Content-Type"]}})
+# Per-route latency, status and upstream call metrics, served at /metrics
+metrics.init_app(app)
 
-# Initialize Supabase client
-supabase_url = os.getenv('SUPABASE_URL')
-supabase_key = os.getenv('ANON_SUPABASE_KEY')
-supabase = create_client(supabase_url, supabase_key)
 
+# Live agent conversations: bounded in memory, durable state shared on disk
+conversations = ConversationStore(
+    build=make_conversation,
+    dump=conversation_state,
+    path=os.getenv('CONVERSATION_STORE_PATH', DEFAULT_PATH),
+    max_entries=int(os.getenv('CONVERSATION_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('CONVERSATION_TTL_SECONDS', '1800'))
+)
 
-# ONLY SLIGHT BS
-pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
-
-
-# TRUE BULLSHIT
-conversations = {}
+# Notes are taken in the background, never while an agent turn is running
+if notes_worker.ENABLED:
+    notes_worker.start(busy=lambda: active_turns() > 0)
 
 
 
@@ -84,24 +96,73 @@ def generate_cvv():
     """Generate a random CVV"""
     return str(random.randint(100, 999))
 
+def transfer_error_status(result):
+    """HTTP status for a failed db.transfer_funds result"""
+    if result.get('error', '').endswith('not found'):
+        return 404
+    return 400
+
+# LLM clients the routes of this app use; built on first use or by /api/ready?warm=1
+APP_CLIENTS = ('agent_model', 'summary_model', 'tool_agent_framework' if AGENT_MODE == 'tools' else 'agent_framework')
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics_text():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Liveness: the process is up and serving"""
+    return jsonify({"status": "ok"})
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness: the database answers; with ?warm=1 the LLM clients are built first"""
+    checks = {}
+    if request.args.get('warm') in ('1', 'true'):
+        checks.update(clients.warm(APP_CLIENTS))
+    started = datetime.datetime.now()
+    try:
+        db.get_backend().select('users', 'user_id', limit=1)
+        checks["database"] = {"ok": True}
+    except Exception as e:
+        checks["database"] = {"ok": False, "error": str(e)}
+    checks["database"]["ms"] = round((datetime.datetime.now() - started).total_seconds() * 1000, 1)
+    ok = all(check["ok"] for check in checks.values())
+    return jsonify({"ready": ok, "checks": checks, "clients": clients.status()}), 200 if ok else 503
+
+@app.route('/api/agent/intents', methods=['GET'])
+def intent_stats():
+    """Chat messages answered by the intent fast path vs the agent"""
+    return jsonify(intents.stats())
+
+@app.route('/api/traces', methods=['GET'])
+def get_traces():
+    """Most recent agent turn and summary traces, newest first"""
+    limit = max(1, min(request.args.get('limit', 20, type=int), 200))
+    return jsonify(tracing.recent(limit, request.args.get('kind')))
+
+@app.route('/api/traces/stats', methods=['GET'])
+def get_trace_stats():
+    """p50/p95/p99 latency per step type over the buffered traces"""
+    return jsonify(tracing.stats(request.args.get('kind')))
+
 @app.route('/api/data', methods=['GET'])
 def get_data():
     # Fetch data from Supabase
-    response = supabase.table('users').select('*').execute()
-    return jsonify(response.data)
+    return jsonify(db.list_users())
 
 @app.route('/api/users', methods=['GET'])
 def get_users():
     # Fetch all users from Supabase
-    response = supabase.table('users').select('*').execute()
-    return jsonify(response.data)
+    return jsonify(db.list_users())
 
 @app.route('/api/users/<user_id>', methods=['GET'])
 def get_user(user_id):
     # Fetch specific user from Supabase
-    response = supabase.table('users').select('*').eq('id', user_id).execute()
-    if response.data:
-        return jsonify(response.data[0])
+    user = db.get_user(user_id)
+    if user:
+        return jsonify(user)
     return jsonify({"error": "User not found"}), 404
 
 @app.route('/api/users', methods=['POST'])
@@ -110,13 +171,11 @@ def create_user():
     user_data = request.json
     
     # Insert user data
-    user_response = supabase.table('users').insert(user_data).execute()
+    created_user = db.create_user(user_data)
     
-    if not user_response.data:
+    if not created_user:
         return jsonify({"error": "Failed to create user"}), 500
     
-    created_user = user_response.data[0]
-    
     # Generate card details for wallet
     debit_card = {
         "card_number": generate_card_number('debit'),
@@ -148,13 +207,11 @@ def create_user():
     }
     
     # Insert wallet data
-    wallet_response = supabase.table('wallets').insert(wallet_data).execute()
+    created_wallet = db.create_wallet(wallet_data)
     
-    if not wallet_response.data:
+    if not created_wallet:
         return jsonify({"error": "User created but failed to create wallet", "user": created_user}), 500
     
-    created_wallet = wallet_response.data[0]
-    
     # Return both user and wallet data
     return jsonify({
         "user": created_user,
@@ -165,8 +222,7 @@ def create_user():
 def update_user(user_id):
     # Update user in Supabase
     user_data = request.json
-    response = supabase.table('users').update(user_data).eq('id', user_id).execute()
-    return jsonify(response.data[0])
+    return jsonify(db.update_user(user_id, user_data))
 
 @app.route('/api/transactions', methods=['POST'])
 def create_transaction():
@@ -175,75 +231,30 @@ def create_transaction():
     recipient_id = transaction_data.get('recipient_id')
     amount = transaction_data.get('amount')
 
-    # Debug logging
-    print(f"Transaction data: {transaction_data}")
-    print(f"User ID: {user_id}, Recipient ID: {recipient_id}, Amount: {amount}")
-
     if not user_id or not recipient_id or not amount:
         return jsonify({"error": "Missing required fields"}), 400
 
-    # Deduct amount from sender's wallet
-    sender_wallet_response = supabase.table('wallets').select('*').eq('user_id', user_id).execute()
-    if not sender_wallet_response.data:
-        return jsonify({"error": "Sender wallet not found"}), 404
-
-    sender_wallet = sender_wallet_response.data[0]
-    if sender_wallet['debit_balance'] < amount:
-        return jsonify({"error": "Insufficient funds"}), 400
-
-    # Update sender's wallet
-    supabase.table('wallets').update({'debit_balance': sender_wallet['debit_balance'] - amount}).eq('user_id', user_id).execute()
-
-    # Add amount to recipient's wallet
-    recipient_wallet_response = supabase.table('wallets').select('*').eq('user_id', recipient_id).execute()
-    if not recipient_wallet_response.data:
-        return jsonify({"error": "Recipient wallet not found"}), 404
-
-    recipient_wallet = recipient_wallet_response.data[0]
-    supabase.table('wallets').update({'debit_balance': recipient_wallet['debit_balance'] + amount}).eq('user_id', recipient_id).execute()
-
-    # Create transaction for sender (expense)
-    sender_transaction = {
-        'user_id': user_id,
-        'description': transaction_data.get('description', 'Transfer to recipient'),
-        'amount': -amount,
-        'category': transaction_data.get('category', 'transfer'),
-        'payment_method': transaction_data.get('payment_method', 'debit'),
-        'recipient': recipient_id,
-        'note': 'Transfer to user {recipient_id}',
-        'is_fraud': False
-    }
-    
-    sender_response = supabase.table('transactions').insert(sender_transaction).execute()
-    
-    if not sender_response.data:
-        # Rollback the wallet changes if transaction creation fails
-        supabase.table('wallets').update({'debit_balance': sender_wallet['debit_balance']}).eq('user_id', user_id).execute()
-        supabase.table('wallets').update({'debit_balance': recipient_wallet['debit_balance']}).eq('user_id', recipient_id).execute()
-        return jsonify({"error": "Failed to create sender transaction"}), 500
-
-    # Create transaction for recipient (income)
-    recipient_transaction = {
-        'user_id': recipient_id,
-        'description': transaction_data.get('description', 'Transfer from sender'),
-        'amount': amount,
-        'category': transaction_data.get('category', 'transfer'),
-        'payment_method': transaction_data.get('payment_method', 'debit'),
-        'recipient': user_id,
-        'note': 'Transfer from user {user_id}',
-        'is_fraud': False
-    }
-    
-    recipient_response = supabase.table('transactions').insert(recipient_transaction).execute()
-    
-    if not recipient_response.data:
-        # Log the error but don't rollback since the sender transaction was successful
-        print("Failed to create recipient transaction")
+    # Move the money and record both sides in one atomic round trip
+    result = db.transfer_funds(
+        sender_id=user_id,
+        recipient_id=recipient_id,
+        amount=amount,
+        description=transaction_data.get('description', 'Transfer'),
+        sender_description=transaction_data.get('description', 'Transfer to recipient'),
+        recipient_description=transaction_data.get('description', 'Transfer from sender'),
+        sender_note=f'Transfer to user {recipient_id}',
+        recipient_note=f'Transfer from user {user_id}',
+        category=transaction_data.get('category', 'transfer'),
+        payment_method=transaction_data.get('payment_method', 'debit')
+    )
+
+    if not result.get('success'):
+        return jsonify({"error": result.get('error')}), transfer_error_status(result)
 
     return jsonify({
         "message": "Transaction successful",
-        "sender_transaction": sender_response.data[0] if sender_response.data else None,
-        "recipient_transaction": recipient_response.data[0] if recipient_response.data else None
+        "sender_transaction": result['sender_transaction'],
+        "recipient_transaction": result['recipient_transaction']
     })
 
 @app.route('/api/check-user', methods=['POST'])
@@ -253,25 +264,22 @@ def check_user():
     first_name = user_data.get('firstName')
     last_name = user_data.get('lastName')
     
-    response = supabase.table('users').select('*').eq('first_name', first_name).eq('last_name', last_name).execute()
+    user = db.get_user_by_name(first_name, last_name)
     
-    if response.data:
-        return jsonify({"exists": True, "user": response.data[0]})
+    if user:
+        return jsonify({"exists": True, "user": user})
     return jsonify({"exists": False})
 
 @app.route('/api/check-user-by-clerk/<clerk_id>', methods=['GET'])
 def check_user_by_clerk(clerk_id):
     # Check if user exists by Clerk ID
-    user_response = supabase.table('users').select('*').eq('clerk_id', clerk_id).execute()
+    user = db.get_user_by_clerk_id(clerk_id)
     
-    if not user_response.data:
+    if not user:
         return jsonify({"exists": False})
     
-    user = user_response.data[0]
-    
     # Get the user's wallet
-    wallet_response = supabase.table('wallets').select('*').eq('user_id', user['user_id']).execute()
-    wallet = wallet_response.data[0] if wallet_response.data else None
+    wallet = db.get_wallet(user['user_id'])
     
     return jsonify({
         "exists": True, 
@@ -282,54 +290,96 @@ def check_user_by_clerk(clerk_id):
 @app.route('/api/wallets/<user_id>', methods=['GET'])
 def get_user_wallet(user_id):
     # Get a user's wallet
-    response = supabase.table('wallets').select('*').eq('user_id', user_id).execute()
+    wallet = db.get_wallet(user_id)
     
-    if response.data:
-        return jsonify(response.data[0])
+    if wallet:
+        return jsonify(wallet)
     return jsonify({"error": "Wallet not found"}), 404
 
 @app.route('/api/agent/<user_id>', methods=['POST'])
 def get_chat_response(user_id):
     """Get a response from the AI agent"""
-    global conversations
-    
     data = request.json
     message = data.get('content', '')
     
-    # Get or create conversation
-    if user_id not in conversations:
-        conversations[user_id] = make_conversation(user_id)
-    
-    conversation = conversations[user_id]
+    # Get or rebuild the conversation
+    conversation = conversations.get(user_id)
     
     # Get response from agent
     reply = chat(conversation, message)
+    conversations.save(user_id, conversation)
     
-    # Check if the response contains a navigation command
-    if "|NAVIGATE|" in reply:
-        message_text, route = reply.split("|NAVIGATE|")
-        return jsonify({"response": message_text, "navigate": True, "route": route})
-    
-    return jsonify({"response": reply, "navigate": False})
+    # Split off a navigation command if the response contains one
+    return jsonify(reply_payload(reply))
+
+@app.route('/api/agent/<user_id>/stream', methods=['POST'])
+def stream_chat_response(user_id):
+    """Stream the AI agent's response as server-sent events"""
+    data = request.json
+    message = data.get('content', '')
+    include_thoughts = bool(data.get('thoughts', False))
+    
+    conversation = conversations.get(user_id)
+    
+    def generate():
+        try:
+            for event, payload in chat_stream(conversation, message, include_thoughts):
+                yield format_sse(event, payload)
+        finally:
+            conversations.save(user_id, conversation)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
   
   
 @app.route('/api/transactions/<user_id>', methods=['GET'])
 def get_user_transactions(user_id):
     # Get a user's transactions
-    response = supabase.table('transactions').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+    transactions = db.list_transactions(user_id)
     
-    if response.data:
+    if transactions:
         # Add a transaction_type field based on whether the user is the recipient
-        for transaction in response.data:
+        for transaction in transactions:
             # If the user is the recipient, it's income, otherwise it's an expense
             if transaction.get('recipient') != user_id:
                 transaction['transaction_type'] = 'expense'
             else:
                 transaction['transaction_type'] = 'income'
         
-        return jsonify(response.data)
+        return jsonify(transactions)
     return jsonify([])
 
+@app.route('/api/transactions/<user_id>/page', methods=['GET'])
+def get_user_transactions_page(user_id):
+    """One filtered page of a user's transactions; see transaction_pages"""
+    try:
+        return jsonify(list_transaction_page(user_id, request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/transactions/<user_id>/import', methods=['POST'])
+def import_user_transactions(user_id):
+    """Bulk import a CSV or JSONL statement; see transaction_import"""
+    upload = request.files.get('file')
+    try:
+        fmt = detect_format(
+            upload.filename if upload else None,
+            upload.mimetype if upload else request.mimetype,
+            request.args.get('format'),
+        )
+        batch_size = max(1, min(int(request.args.get('batch_size', BATCH_SIZE)), MAX_BATCH_SIZE))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    adjust_balance = request.args.get('adjust_balance', 'true').lower() not in ('false', '0', 'no')
+    
+    report = import_stream(user_id, upload.stream if upload else request.stream, fmt, batch_size, adjust_balance)
+    if "error" in report and not report["imported"]:
+        return jsonify(report), 404 if report["error"] == "Wallet not found" else 400
+    return jsonify(report)
+
 @app.route('/api/transactions/transfer', methods=['POST'])
 def transfer_between_users():
     transfer_data = request.json
@@ -342,67 +392,27 @@ def transfer_between_users():
     if not sender_id or not recipient_id or not amount:
         return jsonify({"error": "Missing required fields (sender_id, recipient_id, amount)"}), 400
     
-    # Check sender's wallet
-    sender_wallet_response = supabase.table('wallets').select('*').eq('user_id', sender_id).execute()
-    if not sender_wallet_response.data:
-        return jsonify({"error": "Sender wallet not found"}), 404
-    
-    sender_wallet = sender_wallet_response.data[0]
-    
-    # Check balance
-    if sender_wallet['debit_balance'] < amount:
-        return jsonify({"error": "Insufficient funds", "balance": sender_wallet['debit_balance'], "amount": amount}), 400
-    
-    # Check recipient's wallet
-    recipient_wallet_response = supabase.table('wallets').select('*').eq('user_id', recipient_id).execute()
-    if not recipient_wallet_response.data:
-        return jsonify({"error": "Recipient wallet not found"}), 404
-    
-    recipient_wallet = recipient_wallet_response.data[0]
-    
-    # Deduct amount from sender's wallet
-    supabase.table('wallets').update({
-        'debit_balance': sender_wallet['debit_balance'] - amount
-    }).eq('user_id', sender_id).execute()
-    
-    # Add amount to recipient's wallet
-    supabase.table('wallets').update({
-        'debit_balance': recipient_wallet['debit_balance'] + amount
-    }).eq('user_id', recipient_id).execute()
-    
-    # Create transaction record for sender
-    sender_transaction = {
-        'user_id': sender_id,
-        'description': description,
-        'amount': -amount,  # Negative amount (outgoing)
-        'category': 'transfer',
-        'payment_method': 'debit',
-        'recipient': recipient_id,
-        'note': f'Sent: {description}',
-        'is_fraud': False
-    }
-    
-    sender_response = supabase.table('transactions').insert(sender_transaction).execute()
-    
-    # Create transaction record for recipient
-    recipient_transaction = {
-        'user_id': recipient_id,
-        'description': description,
-        'amount': amount,  # Positive amount (incoming)
-        'category': 'transfer',
-        'payment_method': 'debit',
-        'recipient': sender_id,
-        'note': f'Received: {description}',
-        'is_fraud': False
-    }
-    
-    recipient_response = supabase.table('transactions').insert(recipient_transaction).execute()
+    # Move the money and record both sides in one atomic round trip
+    result = db.transfer_funds(
+        sender_id=sender_id,
+        recipient_id=recipient_id,
+        amount=amount,
+        description=description,
+        sender_note=f'Sent: {description}',
+        recipient_note=f'Received: {description}'
+    )
+    
+    if not result.get('success'):
+        error = {"error": result.get('error')}
+        if 'balance' in result:
+            error.update({"balance": result['balance'], "amount": amount})
+        return jsonify(error), transfer_error_status(result)
     
     return jsonify({
         "success": True,
         "message": "Transfer successful",
-        "sender_transaction": sender_response.data[0] if sender_response.data else None,
-        "recipient_transaction": recipient_response.data[0] if recipient_response.data else None
+        "sender_transaction": result['sender_transaction'],
+        "recipient_transaction": result['recipient_transaction']
     })
 
 @app.route('/api/users/search', methods=['POST'])
@@ -413,35 +423,19 @@ def search_users():
     if not name:
         return jsonify({"error": "Please enter a name to search for"}), 400
     
-    # Search by name parts (case insensitive)
-    name_parts = name.lower().split()
-    
-    # Get all users
-    response = supabase.table('users').select('*').execute()
-    users = response.data
-    
-    # Filter by name
-    matching_users = []
-    for user in users:
-        full_name = f"{user.get('first_name', '')} {user.get('last_name', '')}".lower()
-        
-        if any(part in full_name for part in name_parts):
-            matching_users.append({
-                'user_id': user.get('user_id'),
-                'first_name': user.get('first_name'),
-                'last_name': user.get('last_name'),
-                'email': user.get('email')
-            })
-    
-    return jsonify(matching_users)
+    # Ranked, case-insensitive match of any name part against the in-memory index
+    try:
+        return jsonify(user_index.search_users(name, search_data.get('limit', user_index.SEARCH_LIMIT)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route('/api/budgets/<user_id>', methods=['GET'])
 def get_user_budgets(user_id):
     """Get all budgets for a specific user"""
-    response = supabase.table('budget_plans').select('*').eq('user_id', user_id).execute()
+    budgets = db.list_budgets(user_id)
     
-    if response.data:
-        return jsonify(response.data)
+    if budgets:
+        return jsonify(budgets)
     return jsonify([])
 
 @app.route('/api/budgets', methods=['POST'])
@@ -460,15 +454,15 @@ def create_budget():
         return jsonify({"error": "Period must be either 'monthly' or 'weekly'"}), 400
     
     # Insert the budget plan
-    response = supabase.table('budget_plans').insert(budget_data).execute()
+    budget = db.create_budget(budget_data)
     
-    if not response.data:
+    if not budget:
         return jsonify({"error": "Failed to create budget plan"}), 500
     
     return jsonify({
         "success": True,
         "message": "Budget plan created successfully",
-        "budget": response.data[0]
+        "budget": budget
     })
 
 @app.route('/api/budgets/<budget_id>', methods=['PUT'])
@@ -481,23 +475,23 @@ def update_budget(budget_id):
         del budget_data['id']
     
     # Update the budget plan
-    response = supabase.table('budget_plans').update(budget_data).eq('id', budget_id).execute()
+    budget = db.update_budget(budget_id, budget_data)
     
-    if not response.data:
+    if not budget:
         return jsonify({"error": "Failed to update budget plan or budget not found"}), 404
     
     return jsonify({
         "success": True,
         "message": "Budget plan updated successfully",
-        "budget": response.data[0]
+        "budget": budget
     })
 
 @app.route('/api/budgets/<budget_id>', methods=['DELETE'])
 def delete_budget(budget_id):
     """Delete a budget plan"""
-    response = supabase.table('budget_plans').delete().eq('id', budget_id).execute()
+    deleted = db.delete_budget(budget_id)
     
-    if not response.data:
+    if not deleted:
         return jsonify({"error": "Failed to delete budget plan or budget not found"}), 404
     
     return jsonify({
@@ -509,18 +503,16 @@ def delete_budget(budget_id):
 def get_user_budgets_by_clerk(clerk_id):
     """Get all budgets for a user by their Clerk ID"""
     # First find the user by clerk_id
-    user_response = supabase.table('users').select('user_id').eq('clerk_id', clerk_id).execute()
+    user_id = db.get_user_id_by_clerk_id(clerk_id)
     
-    if not user_response.data:
+    if not user_id:
         return jsonify([])  # User not found
     
-    user_id = user_response.data[0]['user_id']
-    
     # Then get their budgets
-    budget_response = supabase.table('budget_plans').select('*').eq('user_id', user_id).execute()
+    budgets = db.list_budgets(user_id)
     
-    if budget_response.data:
-        return jsonify(budget_response.data)
+    if budgets:
+        return jsonify(budgets)
     return jsonify([])
 
 @app.route('/api/finance/summary/<user_id>', methods=['GET'])
@@ -535,6 +527,38 @@ def get_financial_summary_by_clerk(clerk_id):
     summary = generate_summary_by_clerk_id(clerk_id)
     return jsonify(summary)
 
+@app.route('/api/finance/metrics/<user_id>', methods=['GET'])
+def get_metrics(user_id):
+    """Income, expense, budget and month-over-month metrics for a user"""
+    return jsonify(get_financial_metrics(user_id))
+
+@app.route('/api/finance/metrics/clerk/<clerk_id>', methods=['GET'])
+def get_metrics_by_clerk(clerk_id):
+    """Financial metrics using Clerk ID"""
+    metrics = get_metrics_by_clerk_id(clerk_id)
+    if "error" in metrics:
+        return jsonify(metrics), 404
+    return jsonify(metrics)
+
+@app.route('/api/notes/<user_id>', methods=['GET'])
+def get_user_notes(user_id):
+    """The notes the background worker keeps on a user"""
+    state = notes_worker.get_notes(user_id)
+    return jsonify({
+        "notes": state["notes"],
+        "version": state["version"],
+        "through": state["watermark"][0] if state["watermark"] else None,
+    })
+
+@app.route('/api/notes/<user_id>/search', methods=['GET'])
+def search_user_notes(user_id):
+    """The user's notes most relevant to ?q=, diversified with MMR"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    k = max(1, min(request.args.get('k', 4, type=int), 20))
+    return jsonify(vector_index.search_notes(user_id, query, k=k))
+
 @app.route('/api/simulate-transaction', methods=['POST'])
 def simulate_transaction():
     """Simulate a transaction for testing purposes"""
@@ -549,50 +573,36 @@ def simulate_transaction():
     
     try:
         # First, get the user_id from clerk_id
-        user_response = supabase.table('users').select('user_id').eq('clerk_id', clerk_id).execute()
+        user_id = db.get_user_id_by_clerk_id(clerk_id)
         
-        if not user_response.data:
+        if not user_id:
             return jsonify({"error": "User not found"}), 404
         
-        user_id = user_response.data[0]['user_id']
-        
-        # Get user's wallet
-        wallet_response = supabase.table('wallets').select('*').eq('user_id', user_id).execute()
-        
-        if not wallet_response.data:
-            return jsonify({"error": "Wallet not found"}), 404
-        
-        wallet = wallet_response.data[0]
-        
         # Create a new transaction
         transaction_data = {
-            "user_id": user_id,
             "description": description,
             "amount": -float(amount),  # Negative for purchases
             "recipient": merchant,
             "category": "Shopping",
             "payment_method": "debit_card",
+            "transaction_type": "expense",
             "note": f"Purchase from {merchant}",
             "is_fraud": False
         }
         
-        # Insert the transaction
-        transaction_response = supabase.table('transactions').insert(transaction_data).execute()
-        
-        if not transaction_response.data:
-            return jsonify({"error": "Failed to create transaction"}), 500
-        
-        # Update wallet balance
-        new_balance = float(wallet.get('debit_balance', 0)) + float(transaction_data['amount'])
+        # Insert the transaction and adjust the balance atomically in one call,
+        # rather than writing back a balance computed from a (possibly cached) read
+        result = db.import_transactions(user_id, [transaction_data])
         
-        wallet_update_response = supabase.table('wallets').update({"debit_balance": new_balance}).eq('user_id', user_id).execute()
+        if not result.get("success"):
+            return jsonify({"error": result.get("error", "Failed to create transaction")}), 404
         
-        if not wallet_update_response.data:
-            return jsonify({"error": "Failed to update wallet balance"}), 500
+        transaction = result["transactions"][0]
+        new_balance = result["balance"]
         
         return jsonify({
             "success": True,
-            "transaction": transaction_response.data[0],
+            "transaction": transaction,
             "new_balance": new_balance
         })
         
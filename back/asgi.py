@@ -0,0 +1,222 @@
+"""ASGI entry point for async serving: ``uvicorn asgi:application``
+
+The Flask app keeps one worker thread busy for the whole Gemini latency of an
+agent or summary request. Here the slow LLM routes are served natively on the
+event loop (``ainvoke``), with their data-access calls on the bounded db
+executor, so a single process can hold hundreds of chats open. Every other
+route is passed through to the unchanged Flask app on a bounded thread pool
+(``WSGI_THREADS``), so cheap wallet/transaction reads never queue behind an
+LLM call.
+"""
+import os
+import re
+import sys
+import json
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import db
+import metrics
+from app import app, conversations
+from agent import achat, achat_stream
+from agent_stream import reply_payload, format_sse
+from finance_summary_agent import agenerate_financial_summary, agenerate_summary_by_clerk_id
+
+# Same headers app.after_request adds to Flask responses
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'http://localhost:3000'),
+    (b'access-control-allow-headers', b'Content-Type,Authorization'),
+    (b'access-control-allow-methods', b'GET,PUT,POST,DELETE'),
+]
+
+WSGI_SPOOL_BYTES = int(os.getenv('WSGI_SPOOL_BYTES', str(1024 * 1024)))
+
+wsgi_executor = ThreadPoolExecutor(max_workers=int(os.getenv('WSGI_THREADS', '32')), thread_name_prefix='wsgi')
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def spool_body(receive):
+    """The request body in a file that spills to disk past WSGI_SPOOL_BYTES, for large uploads"""
+    body = tempfile.SpooledTemporaryFile(max_size=WSGI_SPOOL_BYTES)
+    loop = asyncio.get_running_loop()
+    size = 0
+    try:
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > WSGI_SPOOL_BYTES:
+                # The rollover and every write after it go to disk: keep them off the event loop
+                await loop.run_in_executor(wsgi_executor, body.write, chunk)
+            else:
+                body.write(chunk)
+            if not message.get('more_body'):
+                body.seek(0)
+                return body
+    except BaseException:
+        body.close()
+        raise
+
+
+async def read_json(receive):
+    body = await read_body(receive)
+    return json.loads(body) if body else {}
+
+
+async def send_json(send, data, status=200):
+    body = json.dumps(data, default=str).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())] + CORS_HEADERS,
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def agent_reply(scope, receive, send, user_id):
+    data = await read_json(receive)
+    conversation = await db.run_in_executor(conversations.get, user_id)
+    reply = await achat(conversation, data.get('content', ''))
+    await db.run_in_executor(conversations.save, user_id, conversation)
+    await send_json(send, reply_payload(reply))
+
+
+async def agent_stream(scope, receive, send, user_id):
+    data = await read_json(receive)
+    conversation = await db.run_in_executor(conversations.get, user_id)
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no')] + CORS_HEADERS,
+    })
+    try:
+        async for event, payload in achat_stream(conversation, data.get('content', ''), bool(data.get('thoughts', False))):
+            await send({'type': 'http.response.body', 'body': format_sse(event, payload).encode(), 'more_body': True})
+    finally:
+        await db.run_in_executor(conversations.save, user_id, conversation)
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def financial_summary(scope, receive, send, user_id):
+    await send_json(send, await agenerate_financial_summary(user_id))
+
+
+async def financial_summary_by_clerk(scope, receive, send, clerk_id):
+    await send_json(send, await agenerate_summary_by_clerk_id(clerk_id))
+
+
+# (method, path pattern, route template as Flask names it, handler) for routes served natively on the event loop
+ASYNC_ROUTES = [
+    ('POST', re.compile(r'^/api/agent/(?P<user_id>[^/]+)$'), '/api/agent/<user_id>', agent_reply),
+    ('POST', re.compile(r'^/api/agent/(?P<user_id>[^/]+)/stream$'), '/api/agent/<user_id>/stream', agent_stream),
+    ('GET', re.compile(r'^/api/finance/summary/clerk/(?P<clerk_id>[^/]+)$'), '/api/finance/summary/clerk/<clerk_id>',
+     financial_summary_by_clerk),
+    ('GET', re.compile(r'^/api/finance/summary/(?P<user_id>[^/]+)$'), '/api/finance/summary/<user_id>',
+     financial_summary),
+]
+
+
+def wsgi_environ(scope, body):
+    """Build a PEP 3333 environ for an ASGI http scope and a file-like body"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def call_wsgi(environ):
+    """Run the Flask app for one request and collect the whole response"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers]
+
+    result = app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+async def wsgi_passthrough(scope, receive, send):
+    request_body = await spool_body(receive)
+    loop = asyncio.get_running_loop()
+    try:
+        status, headers, body = await loop.run_in_executor(wsgi_executor, call_wsgi, wsgi_environ(scope, request_body))
+    finally:
+        request_body.close()
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            wsgi_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    for method, pattern, route, handler in ASYNC_ROUTES:
+        match = pattern.match(scope['path'])
+        if match and scope['method'] == method:
+            started = metrics.start_request(method, route)
+            status = {'code': 500, 'started': False}
+
+            async def send_recording(message):
+                if message['type'] == 'http.response.start':
+                    status['code'] = message['status']
+                    status['started'] = True
+                await send(message)
+
+            try:
+                return await handler(scope, receive, send_recording, **match.groupdict())
+            except Exception as e:
+                print(f"Error handling {scope['method']} {scope['path']}: {e}")
+                if not status['started']:
+                    return await send_json(send_recording, {"error": str(e)}, status=500)
+                # Headers are out (a stream): report the error in the stream and end it
+                error = format_sse('error', {"error": str(e)}).encode()
+                return await send({'type': 'http.response.body', 'body': error})
+            finally:
+                metrics.end_request(started, status['code'])
+    return await wsgi_passthrough(scope, receive, send)
@@ -0,0 +1,87 @@
+"""LLM calls and latency per chat turn: text ReAct agent vs native tool calling
+
+Usage: python bench_agent_modes.py [--users N] [--llm-ms MS]
+
+Each user replays the same conversation in both agent modes (AGENT_MODE
+react and tools). The model is a fake that takes --llm-ms per call and
+replays, per mode, what the model said on each step of these turns: a free
+text transfer input that parse_transfer_input rejects, a ReAct reply missing
+its "Action:" line, and two lookups that a tool-calling model makes in one
+step. The intent fast path is off so every turn reaches the agent, except the
+"yes" that confirms a prepared transfer.
+"""
+import argparse
+from bench_utils import offline_environment, fake_chat_model, fake_tool_calling_model, seed, percentile, Timer
+
+
+def conversation(me, payee, other):
+    """[(message, react steps, tool-calling steps)] for one user"""
+    payee_name = f"{payee['first_name']} {payee['last_name']}"
+    return [
+        ("How much is in my account?",
+         ["Thought: I need the user's wallet.\nAction: get_wallet\nAction Input: me",
+          "Thought: I know what to tell the user.\nFinal Answer: You have $1,000.00 in your debit account."],
+         [[("get_wallet", {"user_id": "me"})],
+          "You have $1,000.00 in your debit account."]),
+        (f"Send {payee['first_name']} 20 dollars for lunch",
+         [f"Thought: I need to find {payee['first_name']}.\nAction: find_user\nAction Input: {payee['first_name']}",
+          f"Thought: Found them.\nAction: prepare_transfer\nAction Input: recipient: {payee_name}, amount: $20",
+          f"Thought: The input must be JSON.\nAction: prepare_transfer\nAction Input: "
+          f'{{"recipient_id": "{payee["user_id"]}", "amount": 20, "description": "Lunch"}}',
+          f"Thought: I know what to tell the user.\nFinal Answer: Ready to send $20.00 to {payee_name}. Confirm?"],
+         [[("find_user", {"name": payee['first_name']})],
+          [("prepare_transfer", {"recipient_id": payee['user_id'], "amount": 20, "description": "Lunch"})],
+          f"Ready to send $20.00 to {payee_name}. Confirm?"]),
+        ("yes", [], []),
+        (f"Are {other['first_name']} and {payee['first_name']} both on the app?",
+         [f"Thought: Look up the first name.\nAction: find_user\nAction Input: {other['first_name']}",
+          f"Thought: Now the second.\nAction: find_user\nAction Input: {payee['first_name']}",
+          "Thought: I know what to tell the user.\nFinal Answer: Yes, both of them are."],
+         [[("find_user", {"name": other['first_name']}), ("find_user", {"name": payee['first_name']})],
+          "Yes, both of them are."]),
+        ("What's my balance after that?",
+         ["I should check the wallet again.\nget_wallet me",
+          "Thought: I need the user's wallet.\nAction: get_wallet\nAction Input: me",
+          "Thought: I know what to tell the user.\nFinal Answer: You now have $980.00."],
+         [[("get_wallet", {"user_id": "me"})],
+          "You now have $980.00."]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--llm-ms', type=float, default=300.0)
+    args = parser.parse_args()
+
+    offline_environment(INTENT_FAST_PATH='0')
+    import clients
+    import agent
+
+    users = seed(n_users=max(args.users, 3), transactions_per_user=20)
+    latency = args.llm_ms / 1000
+
+    print(f"{'mode':<6} {'turns':>6} {'LLM calls':>10} {'per turn':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode in ("react", "tools"):
+        agent.AGENT_MODE = mode
+        latencies, calls = [], 0
+        for i in range(args.users):
+            me, payee, other = (users[(i + k) % len(users)] for k in range(3))
+            turns = conversation(me, payee, other)
+            steps = [step for _, react, tools in turns for step in (react if mode == "react" else tools)]
+            model = fake_chat_model(steps, latency) if mode == "react" else fake_tool_calling_model(steps, latency)
+            clients.override('agent_model', model)
+            agent.get_agent()
+            state = agent.make_conversation(me['user_id'])
+            for message, _, _ in turns:
+                with Timer() as timer:
+                    agent.chat(state, message)
+                latencies.append(timer.ms)
+            assert state["pending_transfer"] is None, "the transfer was not confirmed"
+            calls += model.calls
+        print(f"{mode:<6} {len(latencies):>6} {calls:>10} {calls / len(latencies):>9.2f} "
+              f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Concurrency of the Flask (WSGI) app versus the async entry point (asgi.py)
+
+Usage: python bench_concurrency.py [--chats N] [--reads N] [--threads N]
+                                   [--llm-ms MS] [--db-ms MS]
+
+Latencies are measured from the start of the burst, so they include time spent
+queued for a worker. Upstreams are fakes with fixed latency: every database call sleeps --db-ms
+and every LLM call --llm-ms. Both modes get the same burst of concurrent agent
+chats and cheap wallet reads. The WSGI mode serves them from --threads worker
+threads, like gunicorn with that many sync workers; the ASGI mode serves the
+LLM routes on the event loop and bridges the rest to a pool of the same size.
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bench_utils import offline_environment, fake_chat_model, seed, percentile, Timer
+
+AGENT_RESPONSE = "Thought: I know what to tell the user.\nFinal Answer: You are doing fine."
+
+
+def requests_for(users, chats, reads):
+    """Interleaved (kind, method, path, body) requests"""
+    batch = []
+    for i in range(max(chats, reads)):
+        user = users[i % len(users)]
+        if i < chats:
+            batch.append(("chat", "POST", f"/api/agent/{user['user_id']}", {"content": "How am I doing?"}))
+        if i < reads:
+            batch.append(("read", "GET", f"/api/wallets/{user['user_id']}", None))
+    return batch
+
+
+def run_wsgi(app, batch, threads):
+    start = time.perf_counter()
+
+    def one(request):
+        kind, method, path, body = request
+        response = app.test_client().open(path, method=method, json=body)
+        assert response.status_code == 200, (path, response.status_code)
+        # Latency from the start of the burst, so time spent queued counts
+        return kind, (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(one, batch))
+
+
+async def call_asgi(application, method, path, body):
+    payload = json.dumps(body).encode() if body is not None else b''
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'root_path': '',
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())],
+        'http_version': '1.1', 'scheme': 'http', 'server': ('localhost', 5000), 'client': ('127.0.0.1', 0),
+    }
+    sent = False
+    status = {}
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)
+        sent = True
+        return {'type': 'http.request', 'body': payload, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status['code'] = message['status']
+
+    await application(scope, receive, send)
+    return status['code']
+
+
+def run_asgi(application, batch):
+    start = time.perf_counter()
+
+    async def one(request):
+        kind, method, path, body = request
+        code = await call_asgi(application, method, path, body)
+        assert code == 200, (path, code)
+        return kind, (time.perf_counter() - start) * 1000
+
+    async def all_requests():
+        return await asyncio.gather(*(one(request) for request in batch))
+
+    return asyncio.run(all_requests())
+
+
+def report(mode, results, wall_ms):
+    print(f"\n{mode}: {len(results)} requests in {wall_ms:.0f} ms ({len(results) / wall_ms * 1000:.1f} req/s)")
+    for kind in ("chat", "read"):
+        latencies = [ms for k, ms in results if k == kind]
+        if latencies:
+            print(f"  {kind:<5} n={len(latencies):<4} p50={percentile(latencies, 50):8.1f} ms"
+                  f"  p95={percentile(latencies, 95):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--reads', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--llm-ms', type=float, default=500)
+    parser.add_argument('--db-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    offline_environment(WSGI_THREADS=str(args.threads), DB_EXECUTOR_WORKERS=str(args.threads))
+    import db
+    import clients
+    from app import app, conversations
+    from asgi import application
+
+    users = seed(n_users=50, transactions_per_user=20)
+    clients.override('agent_model', fake_chat_model([AGENT_RESPONSE], latency=args.llm_ms / 1000))
+    # Build every conversation up front so both modes measure chat turns, not setup
+    for user in users:
+        conversations.get(user['user_id'])
+    db.get_backend().latency = args.db_ms / 1000
+
+    batch = requests_for(users, args.chats, args.reads)
+    with Timer() as timer:
+        results = run_wsgi(app, batch, args.threads)
+    report(f"WSGI ({args.threads} threads)", results, timer.ms)
+
+    with Timer() as timer:
+        results = run_asgi(application, batch)
+    report(f"ASGI (event loop, {args.threads}-thread pools)", results, timer.ms)
+
+
+if __name__ == "__main__":
+    main()
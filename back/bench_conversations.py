@@ -0,0 +1,79 @@
+"""Memory per conversation and first-message latency: per-user agents vs the shared agent
+
+Usage: python bench_conversations.py [--users N] [--conversations N] [--first-messages N]
+
+"per-user" gives every conversation its own tools, prompt, ReAct runnable and
+AgentExecutor, as make_conversation used to; "shared" is the plain-data
+conversation run by the process-wide agent. Memory is what tracemalloc sees
+allocated and still alive after building --conversations conversations,
+scaled to 10k. First-message latency is building a conversation and answering
+one message with a zero-latency fake LLM, so it is all construction and
+framework overhead. History contexts are warmed first in both modes.
+"""
+import argparse
+import tracemalloc
+from bench_utils import offline_environment, fake_chat_model, seed, percentile, Timer
+
+AGENT_RESPONSE = "Thought: I know what to tell the user.\nFinal Answer: You are doing fine."
+
+
+def build(mode, user_id):
+    import agent
+    import clients
+
+    conversation = agent.make_conversation(user_id)
+    if mode == "per-user":
+        conversation["agent"] = agent._build_agent(clients.get('agent_model'))
+    return conversation
+
+
+def first_message(mode, conversation, message):
+    import agent
+
+    if mode == "per-user":
+        # What chat() did with a conversation-owned executor
+        inputs = agent._agent_inputs(conversation, message)
+        with agent.serving(conversation):
+            return conversation["agent"]["executor"].invoke(inputs)["output"]
+    return agent.chat(conversation, message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--conversations', type=int, default=1000)
+    parser.add_argument('--first-messages', type=int, default=200)
+    args = parser.parse_args()
+
+    offline_environment(INTENT_FAST_PATH='0')
+    import clients
+    import agent
+    from history_context import get_history_context
+
+    users = seed(n_users=args.users, transactions_per_user=30)
+    clients.override('agent_model', fake_chat_model([AGENT_RESPONSE]))
+    for user in users:
+        get_history_context(user['user_id'])
+    # Build the shared agent and import the framework outside the measurements
+    agent.get_agent()
+
+    print(f"{'mode':<9} {'MB per 10k':>11} {'KB each':>8} {'first msg p50':>14} {'p95':>8}")
+    for mode in ("per-user", "shared"):
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        conversations = [build(mode, users[i % len(users)]['user_id']) for i in range(args.conversations)]
+        used = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        del conversations
+
+        latencies = []
+        for i in range(args.first_messages):
+            with Timer() as timer:
+                first_message(mode, build(mode, users[i % len(users)]['user_id']), "How am I doing?")
+            latencies.append(timer.ms)
+        print(f"{mode:<9} {used / args.conversations * 10000 / 2 ** 20:>11.1f} {used / args.conversations / 1024:>8.1f} "
+              f"{percentile(latencies, 50):>11.2f} ms {percentile(latencies, 95):>5.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Embedding requests to (re-)index notes, with and without the embedding cache
+
+Usage: python bench_embeddings.py [--users N] [--notes N] [--request-ms MS]
+
+A fake embedding model sleeps --request-ms per request and counts the texts
+it is sent. Each user's notes are indexed into a fresh vector index three
+times: a cold start, a full re-index (e.g. after losing the index
+snapshot), and a re-index after every user's notes were rewritten with one
+note changed and the rest shifted by a position, as update_notes does.
+"""
+import time
+import argparse
+import numpy as np
+from bench_utils import offline_environment, Timer
+
+
+class FakeEmbeddings:
+    """One request per call, deterministic vectors from the text hash"""
+
+    def __init__(self, latency, dim=768):
+        self.latency = latency
+        self.dim = dim
+        self.requests = 0
+        self.texts = 0
+
+    def _vector(self, text):
+        return np.random.default_rng(abs(hash(text)) % (2 ** 32)).standard_normal(self.dim).tolist()
+
+    def embed_documents(self, texts):
+        self.requests += 1
+        self.texts += len(texts)
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def index_all(notes, embed):
+    from vector_index import LocalVectorIndex, index_notes
+
+    index = LocalVectorIndex()
+    for user_id, user_notes in notes.items():
+        index_notes(user_id, user_notes, index, embed)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--notes', type=int, default=20)
+    parser.add_argument('--request-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    offline_environment()
+    from embedding_cache import CachedEmbeddings
+
+    notes = {f"user-{u}": [f"User {u} note {i}: spends about ${i * 7} a week on category {i % 5}"
+                           for i in range(args.notes)] for u in range(args.users)}
+    rewritten = {user_id: [f"{user_notes[0]} (revised)"] + [f"Summary for {user_id}"] + user_notes[1:]
+                 for user_id, user_notes in notes.items()}
+    runs = [("cold", notes), ("re-index", notes), ("rewritten", rewritten)]
+
+    print(f"{'run':<11} {'cache':<6} {'requests':>9} {'texts':>7} {'hit rate':>9} {'seconds':>8}")
+    for cached in (False, True):
+        model = FakeEmbeddings(args.request_ms / 1000)
+        cache = CachedEmbeddings(model, 'fake', path=':memory:') if cached else None
+        for name, run_notes in runs:
+            requests, texts = model.requests, model.texts
+            before = cache.stats() if cache else None
+            with Timer() as timer:
+                index_all(run_notes, cache.embed_documents if cache else model.embed_documents)
+            hit_rate = "-"
+            if cache:
+                after = cache.stats()
+                lookups = after["hits"] + after["misses"] - before["hits"] - before["misses"]
+                hit_rate = f"{(after['hits'] - before['hits']) / lookups:.2f}" if lookups else "-"
+            print(f"{name:<11} {'on' if cached else 'off':<6} {model.requests - requests:>9} "
+                  f"{model.texts - texts:>7} {hit_rate:>9} {timer.ms / 1000:>8.2f}")
+        if cache:
+            stats = cache.stats()
+            print(f"cache: {stats['entries']} vectors, {stats['chars_saved']} characters not re-sent, "
+                  f"{stats['chars_embedded']} embedded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Bulk statement import vs creating transactions one at a time
+
+Usage: python bench_import.py [--rows N] [--batch-size N] [--latency MS]
+
+The per-row baseline follows simulate_transaction: read the wallet, insert
+the transaction, write the new balance. The bulk path posts the same rows as
+one CSV upload to /api/transactions/<user_id>/import.
+"""
+import io
+import csv
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+from bench_utils import offline_environment, seed, Timer, CATEGORIES
+
+
+def statement(n_rows, seed_value=0):
+    """A CSV bank statement with n_rows rows, as bytes"""
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["Date", "Description", "Amount", "Category", "Merchant", "Memo"])
+    for i in range(n_rows):
+        category = rng.choice(CATEGORIES)
+        amount = round(rng.uniform(5, 200), 2)
+        writer.writerow([
+            (now - timedelta(days=rng.uniform(0, 365))).date().isoformat(),
+            f"{category} #{i}",
+            f"{amount:.2f}" if category == "Salary" else f"({amount:.2f})",
+            category,
+            "Merchant",
+            "Imported",
+        ])
+    return out.getvalue().encode()
+
+
+def per_row(user_id, rows):
+    import db
+
+    for row in rows:
+        wallet = db.get_wallet(user_id)
+        db.create_transaction(dict(row, user_id=user_id))
+        db.update_wallet(user_id, {"debit_balance": float(wallet['debit_balance']) + row['amount']})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=1.0, help="simulated ms per database call")
+    args = parser.parse_args()
+
+    offline_environment()
+    import db
+    from app import app
+    from transaction_import import iter_records, normalize_row
+
+    backend = db.get_backend()
+    users = seed(n_users=2, transactions_per_user=0, budgets_per_user=0)
+    backend.latency = args.latency / 1000
+    body = statement(args.rows)
+
+    # The per-row path is slow by design; time a sample and extrapolate
+    sample = [normalize_row(record) for _, record in iter_records(io.BytesIO(body), 'csv')][:min(args.rows, 500)]
+    before = backend.round_trips
+    with Timer() as timer:
+        per_row(users[1]['user_id'], sample)
+    per_row_trips = (backend.round_trips - before) / len(sample)
+    per_row_rate = len(sample) / (timer.ms / 1000)
+
+    client = app.test_client()
+    before = backend.round_trips
+    with Timer() as timer:
+        response = client.post(
+            f"/api/transactions/{users[0]['user_id']}/import?batch_size={args.batch_size}",
+            data={"file": (io.BytesIO(body), "statement.csv")},
+            content_type="multipart/form-data",
+        )
+    report = response.get_json()
+    assert response.status_code == 200 and report["failed"] == 0, report
+    bulk_trips = (backend.round_trips - before) / args.rows
+
+    print(f"{'path':<10} {'rows/s':>10} {'trips/row':>10}")
+    print(f"{'per-row':<10} {per_row_rate:>10.0f} {per_row_trips:>10.3f}")
+    print(f"{'bulk':<10} {args.rows / (timer.ms / 1000):>10.0f} {bulk_trips:>10.3f}")
+    print(f"imported {report['imported']} rows in {report['batches']} batches, net {report['net_amount']}, "
+          f"balance {report['balance']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Chat latency for a realistic message mix with and without the intent fast path
+
+Usage: python bench_intents.py [--users N] [--rounds N] [--llm-ms MS]
+
+The agent model is a fake that takes --llm-ms per call and answers in one
+step, so every message that reaches the agent costs exactly one LLM call (a
+real ReAct turn with tool calls costs several). Each user sends the same mix
+of lookups and open questions --rounds times.
+"""
+import argparse
+from bench_utils import offline_environment, fake_chat_model, seed, percentile, Timer
+
+AGENT_RESPONSE = "Thought: I know what to tell the user.\nFinal Answer: You are doing fine."
+MESSAGES = [
+    "What's my balance?",
+    "show my last 5 transactions",
+    "who can I send money to",
+    "how much money do I have",
+    "my recent purchases",
+    "How am I doing this month?",
+    "Why did my spending go up?",
+    "send $20 to Bob",
+    "Can I afford a vacation in June?",
+    "list users I can pay",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--llm-ms', type=float, default=300.0)
+    args = parser.parse_args()
+
+    offline_environment()
+    import db
+    import clients
+    import agent
+    import intents
+
+    users = seed(n_users=args.users, transactions_per_user=30)
+    clients.override('agent_model', fake_chat_model([AGENT_RESPONSE], latency=args.llm_ms / 1000))
+    clients.override('memory_model', fake_chat_model(["The customer asked about balances and spending."]))
+    conversations = {user['user_id']: agent.make_conversation(user['user_id']) for user in users}
+
+    print(f"{'fast path':<10} {'messages':>9} {'LLM calls':>10} {'round trips':>12} "
+          f"{'fast share':>11} {'p50 ms':>8} {'p95 ms':>8} {'seconds':>8}")
+    for enabled in (False, True):
+        agent.INTENT_FAST_PATH = enabled
+        before = intents.stats()["paths"].get('agent', 0)
+        round_trips = db.get_backend().round_trips
+        latencies = []
+        with Timer() as total:
+            for _ in range(args.rounds):
+                for conversation in conversations.values():
+                    for message in MESSAGES:
+                        with Timer() as timer:
+                            agent.chat(conversation, message)
+                        latencies.append(timer.ms)
+        calls = intents.stats()["paths"].get('agent', 0) - before
+        print(f"{'on' if enabled else 'off':<10} {len(latencies):>9} {calls:>10} "
+              f"{db.get_backend().round_trips - round_trips:>12} {1 - calls / len(latencies):>11.0%} "
+              f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} {total.ms / 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
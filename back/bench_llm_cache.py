@@ -0,0 +1,63 @@
+"""Re-running temperature-0 LLM work with and without the LLM response cache
+
+Usage: python bench_llm_cache.py [--transactions N] [--users N] [--llm-ms MS]
+
+Chat models are fakes that take --llm-ms per call. The notes run pushes a
+transaction history through the make_note chain (prompt | llm) twice, as
+re-processing a history does. The summary run generates every user's
+financial summary twice with the per-user summary cache cleared in between,
+as a restarted or different worker would.
+"""
+import argparse
+from bench_utils import offline_environment, fake_chat_model, seed, Timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=50)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--llm-ms', type=float, default=200.0)
+    args = parser.parse_args()
+
+    offline_environment()
+    import clients
+    import finance_summary_agent
+    from llm_cache import SQLiteLLMCache
+    from notes_worker import format_transaction
+    from utils import make_note
+
+    latency = args.llm_ms / 1000
+    users = seed(n_users=args.users, transactions_per_user=args.transactions, budgets_per_user=2)
+    import db
+    history = [format_transaction(row) for row in db.list_transactions_page(users[0]['user_id'], descending=False,
+                                                                           limit=args.transactions)]
+
+    print(f"{'workload':<10} {'cache':<6} {'pass':<7} {'LLM calls':>10} {'seconds':>8}")
+    for cached in (False, True):
+        cache = SQLiteLLMCache(':memory:') if cached else None
+        notes_model = fake_chat_model(["Noted."], latency=latency)
+        notes_model.cache = cache
+        summary_model = fake_chat_model(["HIGHLIGHT: Steady.\n[SECTION:OVERVIEW]Fine.[/SECTION]"], latency=latency)
+        summary_model.cache = cache
+        clients.override('summary_model', summary_model)
+
+        for run in ("first", "re-run"):
+            before = cache.stats()["misses"] if cache else 0
+            with Timer() as timer:
+                for transaction in history:
+                    make_note(transaction, "No history yet", llm=notes_model)
+            calls = cache.stats()["misses"] - before if cache else len(history)
+            print(f"{'notes':<10} {'on' if cached else 'off':<6} {run:<7} {calls:>10} {timer.ms / 1000:>8.2f}")
+
+        for run in ("first", "re-run"):
+            finance_summary_agent.summary_cache.clear()
+            before = cache.stats()["misses"] if cache else 0
+            with Timer() as timer:
+                for user in users:
+                    finance_summary_agent.generate_financial_summary(user['user_id'])
+            calls = cache.stats()["misses"] - before if cache else len(users)
+            print(f"{'summaries':<10} {'on' if cached else 'off':<6} {run:<7} {calls:>10} {timer.ms / 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Prompt history size and build time over a long chat session, unbounded vs budgeted memory
+
+Usage: python bench_memory.py [--turns N] [--summary-ms MS]
+
+One conversation answers --turns messages through the agent (a fake model
+with no latency). "unbounded" is what chat() used to put in the prompt: every
+message so far, re-concatenated on each turn; "budgeted" is the cached text
+from chat_memory. The memory model is a fake taking --summary-ms per summary;
+it runs off the request path, so it does not show up in turn latency.
+"""
+import argparse
+from bench_utils import offline_environment, fake_chat_model, seed, percentile, Timer
+
+AGENT_RESPONSE = ("Thought: I know what to tell the user.\nFinal Answer: Your spending on food went up 12% this "
+                  "month, mostly from restaurants; groceries stayed flat. You are still under your budget.")
+
+
+def unbounded(history):
+    formatted = ""
+    for message in history:
+        speaker = "Human" if message["role"] == "human" else "Assistant"
+        formatted += f"{speaker}: {message['content']}\n"
+    return formatted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--turns', type=int, default=300)
+    parser.add_argument('--summary-ms', type=float, default=200.0)
+    args = parser.parse_args()
+
+    offline_environment(INTENT_FAST_PATH='0')
+    import clients
+    import agent
+    import chat_memory
+
+    users = seed(n_users=2, transactions_per_user=30)
+    clients.override('agent_model', fake_chat_model([AGENT_RESPONSE]))
+    clients.override('memory_model', fake_chat_model(
+        ["The customer has been reviewing food spending and budgets; no transfers are pending."],
+        latency=args.summary_ms / 1000))
+    conversation = agent.make_conversation(users[0]['user_id'])
+    full_history = []
+
+    print(f"{'turn':>5} {'unbounded tokens':>17} {'budgeted tokens':>16} {'unbounded ms':>13} {'budgeted ms':>12}")
+    turn_ms, summaries_pending = [], 0
+    for turn in range(1, args.turns + 1):
+        message = f"Question {turn}: how did my food spending change compared with last month?"
+        with Timer() as timer:
+            reply = agent.chat(conversation, message)
+        turn_ms.append(timer.ms)
+        full_history += [{"role": "human", "content": message}, {"role": "ai", "content": reply}]
+        summaries_pending += bool(conversation["folding"])
+        if turn in (1, 10, 50, 100, args.turns):
+            with Timer() as old:
+                old_text = unbounded(full_history)
+            with Timer() as new:
+                new_text = chat_memory.history_text(conversation)
+            print(f"{turn:>5} {chat_memory.estimate_tokens(old_text):>17} {chat_memory.estimate_tokens(new_text):>16} "
+                  f"{old.ms:>13.3f} {new.ms:>12.4f}")
+    chat_memory.drain()
+    print(f"turn latency p50 {percentile(turn_ms, 50):.2f} ms, p95 {percentile(turn_ms, 95):.2f} ms; "
+          f"{summaries_pending} turns had a summary in flight; budget {chat_memory.MEMORY_TOKEN_BUDGET} tokens")
+    print("summary:", conversation["summary"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Per-request overhead of the metrics middleware
+
+Usage: python bench_metrics.py [--requests N] [--repeats N] [--upstream-calls N]
+
+Two measurements, each the best of --repeats runs:
+
+- core: metrics.start_request / end_request plus --upstream-calls upstream
+  observations, called directly
+- flask: the same trivial route served through WSGI (prebuilt environs, no
+  test client around it) by an app with and without metrics.init_app; the
+  difference is the middleware cost
+
+Exits non-zero if the Flask overhead exceeds METRICS_BUDGET_US (default 50).
+"""
+import os
+import sys
+import argparse
+import time
+from bench_utils import offline_environment
+
+
+def best_per_request_us(runs, requests, repeats):
+    """Best time per request of each run; runs alternate so machine noise hits them alike"""
+    best = [float('inf')] * len(runs)
+    for _ in range(repeats):
+        for i, run in enumerate(runs):
+            start = time.perf_counter()
+            run(requests)
+            best[i] = min(best[i], (time.perf_counter() - start) / requests * 1e6)
+    return best
+
+
+def make_app(instrumented):
+    from flask import Flask, jsonify
+    import metrics
+
+    app = Flask(f"bench_{instrumented}")
+    if instrumented:
+        metrics.init_app(app)
+
+    @app.route('/api/users/<user_id>')
+    def user(user_id):
+        return jsonify({"user_id": user_id})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--upstream-calls', type=int, default=3)
+    args = parser.parse_args()
+    budget = float(os.getenv('METRICS_BUDGET_US', '50'))
+
+    offline_environment()
+    import metrics
+
+    def core(n):
+        for _ in range(n):
+            started = metrics.start_request('GET', '/api/users/<user_id>')
+            for _ in range(args.upstream_calls):
+                metrics.observe_upstream('supabase', 0.004)
+            metrics.end_request(started, 200)
+
+    from werkzeug.test import EnvironBuilder
+    environs = [EnvironBuilder(path=f'/api/users/user-{i}').get_environ() for i in range(100)]
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def serve(app):
+        def run(n):
+            for i in range(n):
+                response = app(dict(environs[i % 100]), start_response)
+                b"".join(response)
+                response.close()
+        return run
+
+    core_us, = best_per_request_us([core], args.requests, args.repeats)
+    plain_us, instrumented_us = best_per_request_us([serve(make_app(False)), serve(make_app(True))],
+                                                    args.requests, args.repeats)
+    overhead = instrumented_us - plain_us
+
+    print(f"core ({args.upstream_calls} upstream calls): {core_us:6.2f} us per request")
+    print(f"flask without metrics:    {plain_us:6.2f} us per request")
+    print(f"flask with metrics:       {instrumented_us:6.2f} us per request")
+    print(f"middleware overhead:      {overhead:6.2f} us per request (budget {budget:.0f} us)")
+    if overhead > budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""LLM calls to take notes on transaction histories: inline vs batched worker
+
+Usage: python bench_notes.py [--users N] [--transactions N] [--batch-size N] [--llm-ms MS]
+
+The inline baseline is the old pipeline: make_note and update_notes per
+transaction, with the whole notes document in both prompts. The worker
+folds --batch-size transactions into each update. The fake LLM sleeps
+--llm-ms per call; prompt size is counted in characters. A last run
+backfills every user on the worker thread while agent turns are simulated
+and reports how many batches found a turn running when their LLM call began
+(0 unless a turn started in the instant between the check and the call).
+"""
+import time
+import random
+import argparse
+import threading
+from bench_utils import offline_environment, seed, Timer
+
+
+class FakeNotesLLM:
+    """Counts calls and prompt characters; notes grow with the history, capped like real notes"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.prompt_chars = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, transactions, notes):
+        lines = transactions if isinstance(transactions, list) else [transactions]
+        with self.lock:
+            self.calls += 1
+            self.prompt_chars += len("\n".join(lines)) + len("\n".join(notes) if isinstance(notes, list) else notes)
+        time.sleep(self.latency)
+        notes = [] if isinstance(notes, str) else list(notes)
+        return (notes + [f"Observed {len(lines)} transactions, latest: {lines[-1][:60]}"])[-30:]
+
+
+def inline(llm, user_ids):
+    """make_note + update_notes for every transaction, one at a time"""
+    import db
+    from notes_worker import format_transaction
+
+    for user_id in user_ids:
+        notes = "No history yet"
+        rows = db.list_transactions_page(user_id, descending=False, limit=100000)
+        for row in rows:
+            transaction = format_transaction(row)
+            llm(transaction, notes)  # make_note
+            notes = llm(transaction, notes)  # update_notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--transactions', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=25)
+    parser.add_argument('--llm-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    offline_environment()
+    from notes_worker import NotesStore, NotesWorker
+
+    users = seed(n_users=args.users, transactions_per_user=args.transactions, budgets_per_user=0)
+    user_ids = [user['user_id'] for user in users]
+    latency = args.llm_ms / 1000
+
+    print(f"{'pipeline':<10} {'LLM calls':>10} {'prompt chars':>13} {'seconds':>8}")
+    llm = FakeNotesLLM(latency)
+    with Timer() as timer:
+        inline(llm, user_ids)
+    print(f"{'inline':<10} {llm.calls:>10} {llm.prompt_chars:>13} {timer.ms / 1000:>8.2f}")
+
+    llm = FakeNotesLLM(latency)
+    worker = NotesWorker(NotesStore(':memory:'), update=llm, batch_size=args.batch_size)
+    with Timer() as timer:
+        for user_id in user_ids:
+            worker.drain(user_id)
+    print(f"{'batched':<10} {llm.calls:>10} {llm.prompt_chars:>13} {timer.ms / 1000:>8.2f}")
+
+    # Backfill on the worker thread while "agent turns" come and go
+    turns = {"active": 0}
+    started_while_busy = []
+    llm = FakeNotesLLM(latency)
+
+    def update(transactions, notes):
+        if turns["active"]:
+            started_while_busy.append(1)
+        return llm(transactions, notes)
+
+    worker = NotesWorker(NotesStore(':memory:'), update=update, batch_size=args.batch_size,
+                         backfill_interval=0, busy=lambda: turns["active"] > 0).start()
+    worker.backfill(user_ids)
+    rng = random.Random(0)
+    with Timer() as timer:
+        while worker.pending() or worker.stats["transactions"] < len(user_ids) * args.transactions:
+            turns["active"] += 1
+            time.sleep(rng.uniform(1, 5) * latency)
+            turns["active"] -= 1
+            time.sleep(rng.uniform(1, 5) * latency)
+    worker.stop()
+    print(f"backfill with chats: {worker.stats['batches']} batches in {timer.ms / 1000:.2f} s, "
+          f"{len(started_while_busy)} overlapped the start of an agent turn")
+
+
+if __name__ == "__main__":
+    main()
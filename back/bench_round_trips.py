@@ -0,0 +1,78 @@
+"""Round trips and latency per endpoint against the offline SQLite backend
+
+Usage: python bench_round_trips.py [--users N] [--transactions N] [--latency MS]
+
+``--latency`` adds a fixed delay to every database call to model the network
+cost of a Supabase round trip.
+"""
+import argparse
+from bench_utils import offline_environment, fake_chat_model, seed, Timer
+
+SUMMARY_RESPONSE = """HIGHLIGHT: Spending is steady.
+[SECTION:OVERVIEW]Income covers expenses.[/SECTION]
+[SECTION:SPENDING]Food leads spending.[/SECTION]
+[SECTION:BUDGET]Within budget.[/SECTION]
+[SECTION:RECOMMENDATIONS]Keep saving.[/SECTION]
+[SECTION:UNUSUAL]Nothing unusual.[/SECTION]"""
+
+AGENT_RESPONSE = "Thought: I know what to tell the user.\nFinal Answer: You are doing fine."
+
+
+def endpoints(users):
+    """(label, method, path, json) for every endpoint the frontend calls"""
+    alice, bob = users[0], users[1]
+    return [
+        ("list users", "GET", "/api/users", None),
+        ("get user", "GET", f"/api/users/{alice['user_id']}", None),
+        ("check user by clerk", "GET", f"/api/check-user-by-clerk/{alice['clerk_id']}", None),
+        ("get wallet", "GET", f"/api/wallets/{alice['user_id']}", None),
+        ("list transactions", "GET", f"/api/transactions/{alice['user_id']}", None),
+        ("search users", "POST", "/api/users/search", {"name": "ali"}),
+        ("list budgets", "GET", f"/api/budgets/{alice['user_id']}", None),
+        ("budgets by clerk", "GET", f"/api/budgets/by-clerk/{alice['clerk_id']}", None),
+        ("create transaction", "POST", "/api/transactions",
+         {"user_id": alice['user_id'], "recipient_id": bob['user_id'], "amount": 5}),
+        ("transfer", "POST", "/api/transactions/transfer",
+         {"sender_id": alice['user_id'], "recipient_id": bob['user_id'], "amount": 5}),
+        ("simulate transaction", "POST", "/api/simulate-transaction",
+         {"userId": alice['clerk_id'], "amount": 12.5}),
+        ("financial metrics", "GET", f"/api/finance/metrics/{alice['user_id']}", None),
+        ("financial summary", "GET", f"/api/finance/summary/{alice['user_id']}", None),
+        ("financial summary by clerk", "GET", f"/api/finance/summary/clerk/{alice['clerk_id']}", None),
+        ("agent chat", "POST", f"/api/agent/{alice['user_id']}", {"content": "How am I doing?"}),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--transactions', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0, help="simulated ms per database call")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    offline_environment()
+    import db
+    import clients
+    from app import app
+
+    backend = db.get_backend()
+    users = seed(n_users=args.users, transactions_per_user=args.transactions)
+    backend.latency = args.latency / 1000
+    clients.override('summary_model', fake_chat_model([SUMMARY_RESPONSE]))
+    clients.override('agent_model', fake_chat_model([AGENT_RESPONSE]))
+
+    client = app.test_client()
+    print(f"{'endpoint':<28} {'round trips':>11} {'ms/request':>11}")
+    for label, method, path, body in endpoints(users):
+        before = backend.round_trips
+        with Timer() as timer:
+            for _ in range(args.repeat):
+                response = client.open(path, method=method, json=body)
+                assert response.status_code < 500, (label, response.status_code, response.get_json())
+        trips = (backend.round_trips - before) / args.repeat
+        print(f"{label:<28} {trips:>11.1f} {timer.ms / args.repeat:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
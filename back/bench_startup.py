@@ -0,0 +1,75 @@
+"""Import time of the backend, with a budget that fails on regressions
+
+Usage: python bench_startup.py [--module app] [--runs N] [--budget-ms MS] [--top N]
+
+Each run imports the module in a fresh interpreter under
+``python -X importtime`` with the offline environment from bench_utils. The
+median cumulative time is checked against ``--budget-ms``, and none of the
+clients that clients.py builds lazily may be imported eagerly. Exits with
+status 1 if either check fails, so it can gate CI.
+"""
+import os
+import sys
+import argparse
+import subprocess
+from statistics import median
+from bench_utils import offline_environment
+
+# Modules only the lazily built clients need
+LAZY_MODULES = ('langchain_google_genai', 'pinecone', 'langchain_pinecone', 'langchain.agents',
+                'langchain_community', 'google.ai.generativelanguage')
+BUDGET_MS = 1500
+
+
+def import_times(module):
+    """[(depth, module, self us, cumulative us)] for one fresh import of module"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=os.environ.copy(), cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((depth, name.strip(), int(own), int(cumulative)))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', BUDGET_MS)))
+    parser.add_argument('--top', type=int, default=10, help="slowest direct imports to list")
+    args = parser.parse_args()
+
+    offline_environment()
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    total_ms = median(cumulative for run in runs for depth, name, _, cumulative in run
+                      if depth == 0 and name == args.module) / 1000
+    last = runs[-1]
+
+    print(f"{'direct import of ' + args.module:<40} {'cumulative ms':>14}")
+    direct = [(cumulative, name) for depth, name, _, cumulative in last if depth == 1]
+    for cumulative, name in sorted(direct, reverse=True)[:args.top]:
+        print(f"{name:<40} {cumulative / 1000:>14.1f}")
+
+    eager = sorted({name for _, name, _, _ in last
+                    for lazy in LAZY_MODULES if name == lazy or name.startswith(lazy + '.')})
+    print(f"\nimport {args.module}: median {total_ms:.0f} ms over {args.runs} runs, budget {args.budget_ms:.0f} ms")
+    failed = False
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import time is over budget by {total_ms - args.budget_ms:.0f} ms")
+        failed = True
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager[:10])}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""User search latency, full-table scan vs the in-memory name index
+
+Usage: python bench_user_search.py [--sizes 1000 10000 100000] [--queries N]
+
+For each user-base size the old /api/users/search behaviour (select every
+user, substring loop in Python) is timed against ``UserNameIndex.search``.
+"""
+import argparse
+import random
+from bench_utils import offline_environment, percentile, Timer, FIRST_NAMES, LAST_NAMES
+
+QUERIES = ["a", "al", "ali", "alice", "smi", "smith", "alice smith", "son", "mar", "yasmin moore", "zzz"]
+
+
+def insert_users(n, seed_value=0):
+    """Bulk insert n synthetic users without wallets or transactions"""
+    import db
+
+    rng = random.Random(seed_value)
+    rows = [{
+        "first_name": rng.choice(FIRST_NAMES) + ("" if i % 3 else str(rng.randint(1, 999))),
+        "last_name": rng.choice(LAST_NAMES) + ("" if i % 2 else str(rng.randint(1, 9999))),
+        "email": f"user{i}@example.com",
+        "age": 30,
+        "interests": ["saving"],
+        "clerk_id": f"clerk_{i}",
+    } for i in range(n)]
+    backend = db.get_backend()
+    for start in range(0, n, 5000):
+        backend.insert('users', rows[start:start + 5000])
+
+
+def scan_search(name):
+    """The previous implementation: fetch every user, substring loop"""
+    import db
+
+    name_parts = name.lower().split()
+    matching_users = []
+    for user in db.list_users():
+        full_name = f"{user.get('first_name', '')} {user.get('last_name', '')}".lower()
+        if any(part in full_name for part in name_parts):
+            matching_users.append({
+                'user_id': user.get('user_id'),
+                'first_name': user.get('first_name'),
+                'last_name': user.get('last_name'),
+                'email': user.get('email')
+            })
+    return matching_users
+
+
+def measure(search, queries):
+    timings = []
+    for query in queries:
+        with Timer() as timer:
+            search(query)
+        timings.append(timer.ms)
+    return percentile(timings, 50), percentile(timings, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    offline_environment()
+    import db
+    import user_index
+
+    print(f"{'users':>8} {'scan p50':>10} {'scan p95':>10} {'index p50':>10} {'index p95':>10} {'build ms':>9}")
+    for size in args.sizes:
+        db.set_backend(db.SQLiteBackend())
+        insert_users(size)
+        index = user_index.UserNameIndex()
+        with Timer() as build:
+            index.refresh()
+        queries = [QUERIES[i % len(QUERIES)] for i in range(args.queries)]
+        scan_queries = queries[:max(len(QUERIES), args.queries * 1000 // size)]
+        scan = measure(scan_search, scan_queries)
+        indexed = measure(lambda query: index.refresh().search(query), queries)
+        print(f"{size:>8} {scan[0]:>10.2f} {scan[1]:>10.2f} {indexed[0]:>10.3f} {indexed[1]:>10.3f} {build.ms:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Helpers shared by the offline benchmark scripts (bench_*.py)
+
+Benchmarks run against the in-process SQLite backend from ``db`` and a fake
+chat model, so they need no Supabase project, API keys or network access.
+"""
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+FIRST_NAMES = ["Alice", "Bob", "Carol", "David", "Erin", "Frank", "Grace", "Heidi", "Ivan", "Judy",
+               "Mallory", "Niaj", "Olivia", "Peggy", "Rupert", "Sybil", "Trent", "Victor", "Walter", "Yasmin"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+              "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore"]
+CATEGORIES = ["Food", "Shopping", "Transport", "Entertainment", "Bills", "transfer", "Salary"]
+
+
+def offline_environment(**overrides):
+    """Point every module at offline stand-ins; call before importing app/agent"""
+    env = {
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': ':memory:',
+        'CONVERSATION_STORE_PATH': ':memory:',
+        'NOTES_STORE_PATH': ':memory:',
+        'NOTES_VECTOR_PATH': '',
+        'EMBEDDING_CACHE_PATH': ':memory:',
+        'LLM_CACHE_PATH': ':memory:',
+        'TRACE_LOG_PATH': '',
+        'GOOGLE_API_KEY': 'offline-benchmark',
+        'PINECONE_API_KEY': 'offline-benchmark',
+    }
+    env.update(overrides)
+    for key, value in env.items():
+        os.environ.setdefault(key, value)
+
+
+def fake_chat_model(responses, latency=0.0):
+    """A LangChain chat model that cycles through canned responses
+
+    Every call takes ``latency`` seconds: time.sleep on the sync path,
+    asyncio.sleep on the async path, like a real network-bound LLM client.
+    """
+    import asyncio
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class LatencyFakeChatModel(FakeListChatModel):
+        delay: float = 0.0
+        disable_streaming: bool = True
+        calls: int = 0
+
+        def _call(self, messages, stop=None, run_manager=None, **kwargs):
+            self.calls += 1
+            time.sleep(self.delay)
+            return super()._call(messages, stop, run_manager, **kwargs)
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            self.calls += 1
+            await asyncio.sleep(self.delay)
+            text = super()._call(messages, stop, None, **kwargs)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    return LatencyFakeChatModel(responses=list(responses), delay=latency)
+
+
+def fake_tool_calling_model(responses, latency=0.0):
+    """A chat model with native tool calling that cycles through canned responses
+
+    Each response is either the text of a final answer or a list of
+    ``(tool_name, args)`` calls made together in one step.
+    """
+    import asyncio
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    def message(response, step):
+        if isinstance(response, str):
+            return AIMessage(content=response)
+        return AIMessage(content="", tool_calls=[
+            {"name": name, "args": args, "id": f"call-{step}-{i}"} for i, (name, args) in enumerate(response)
+        ])
+
+    class FakeToolCallingModel(BaseChatModel):
+        responses: list
+        delay: float = 0.0
+        i: int = 0
+        calls: int = 0
+
+        @property
+        def _llm_type(self):
+            return "fake-tool-calling"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _next(self):
+            response = message(self.responses[self.i % len(self.responses)], self.calls)
+            self.i += 1
+            self.calls += 1
+            return ChatResult(generations=[ChatGeneration(message=response)])
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(self.delay)
+            return self._next()
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            await asyncio.sleep(self.delay)
+            return self._next()
+
+    return FakeToolCallingModel(responses=list(responses), delay=latency)
+
+
+def seed(n_users=20, transactions_per_user=50, budgets_per_user=2, seed_value=0):
+    """Fill the current db backend with synthetic users, wallets, transactions and budgets
+
+    Returns the list of created user rows.
+    """
+    import db
+
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc)
+    users = []
+    for i in range(n_users):
+        user = db.create_user({
+            "first_name": FIRST_NAMES[i % len(FIRST_NAMES)],
+            "last_name": f"{LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}{'' if i < len(FIRST_NAMES) * len(LAST_NAMES) else i}",
+            "email": f"user{i}@example.com",
+            "age": rng.randint(18, 70),
+            "interests": ["saving", "investing"],
+            "clerk_id": f"clerk_{i}",
+        })
+        users.append(user)
+        db.create_wallet({
+            "user_id": user['user_id'],
+            "debit_balance": 1000.00,
+            "credit_balance": 0.00,
+            "saving_balance": 0.00,
+            "payment_methods": {"debit_cards": [], "credit_cards": []},
+        })
+        rows = []
+        for j in range(transactions_per_user):
+            category = rng.choice(CATEGORIES)
+            amount = round(rng.uniform(5, 200), 2)
+            rows.append({
+                "user_id": user['user_id'],
+                "description": f"{category} #{j}",
+                "amount": amount if category == "Salary" else -amount,
+                "category": category,
+                "payment_method": "debit",
+                "recipient": "Merchant",
+                "note": f"Synthetic {category.lower()} transaction",
+                "is_fraud": False,
+                "created_at": (now - timedelta(days=rng.uniform(0, 400))).isoformat(),
+            })
+        if rows:
+            db.create_transactions(rows)
+        for category in CATEGORIES[:budgets_per_user]:
+            db.create_budget({
+                "user_id": user['user_id'],
+                "category": category,
+                "amount": 300,
+                "period": "monthly",
+                "start_date": (now - timedelta(days=30)).date().isoformat(),
+                "end_date": (now + timedelta(days=30)).date().isoformat(),
+            })
+    return users
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Timer:
+    """Context manager measuring wall time in milliseconds"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self.start) * 1000
@@ -0,0 +1,85 @@
+"""Local notes vector index: snapshot load, incremental upserts and query latency
+
+Usage: python bench_vector_index.py [--users N] [--notes N] [--dim N] [--queries N]
+
+Random unit vectors stand in for embeddings. Rebuilding means inserting
+every note again, as the old from_documents demo did on every run (minus the
+embedding calls it also repeated); loading memory-maps the saved snapshot.
+Upserting one user's notes touches only that namespace.
+"""
+import os
+import argparse
+import tempfile
+import numpy as np
+from bench_utils import offline_environment, percentile, Timer
+
+
+def items(rng, count, dim, prefix="note"):
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    return [{"id": f"{prefix}-{i}", "vector": vectors[i], "text": f"{prefix} {i}",
+             "metadata": {"kind": "note", "bucket": i % 4}} for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--notes', type=int, default=30)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    offline_environment()
+    from vector_index import LocalVectorIndex, _normalize
+
+    rng = np.random.default_rng(0)
+    notes = {f"user-{u}": items(rng, args.notes, args.dim) for u in range(args.users)}
+
+    with Timer() as rebuild:
+        index = LocalVectorIndex(args.dim)
+        for user_id, user_notes in notes.items():
+            index.upsert(user_id, user_notes)
+
+    path = os.path.join(tempfile.mkdtemp(), 'notes_index')
+    index.path = path
+    with Timer() as save:
+        index.save()
+    with Timer() as load:
+        loaded = LocalVectorIndex.load(path)
+
+    # Exact top-k must match brute force, also after loading
+    user_id = "user-0"
+    query = rng.standard_normal(args.dim, dtype=np.float32)
+    brute = np.argsort(-(_normalize([n["vector"] for n in notes[user_id]]) @ _normalize(query)))[:4]
+    assert [r["id"] for r in loaded.search(user_id, query)] == [f"note-{i}" for i in brute]
+
+    timings = {"search": [], "mmr": [], "filtered mmr": [], "upsert user": []}
+    user_ids = list(notes)
+    for i in range(args.queries):
+        user_id = user_ids[i % len(user_ids)]
+        query = rng.standard_normal(args.dim, dtype=np.float32)
+        with Timer() as timer:
+            loaded.search(user_id, query)
+        timings["search"].append(timer.ms)
+        with Timer() as timer:
+            loaded.mmr(user_id, query)
+        timings["mmr"].append(timer.ms)
+        with Timer() as timer:
+            loaded.mmr(user_id, query, where={"bucket": [0, 1]})
+        timings["filtered mmr"].append(timer.ms)
+        changed = items(rng, 3, args.dim)
+        with Timer() as timer:
+            loaded.upsert(user_id, changed)
+        timings["upsert user"].append(timer.ms)
+
+    total = args.users * args.notes
+    print(f"{total} notes in {args.users} namespaces, {args.dim} dims")
+    print(f"{'rebuild from scratch':<22} {rebuild.ms:>10.1f} ms")
+    print(f"{'save snapshot':<22} {save.ms:>10.1f} ms")
+    print(f"{'load snapshot (mmap)':<22} {load.ms:>10.1f} ms")
+    print(f"\n{'operation':<22} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, values in timings.items():
+        print(f"{name:<22} {percentile(values, 50):>10.3f} {percentile(values, 95):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Small in-process caches shared by the backend modules"""
+import time
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after they are set"""
+
+    def __init__(self, max_entries=1024, ttl=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > self.clock():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            entry = self.entries.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class VersionStamps:
+    """Write versions per key, for caches that must not be filled by a read older than a write
+
+    A reader takes ``get(key)`` before it reads and only fills its cache if
+    ``get(key)`` is unchanged afterwards; writers ``bump(key)``. Versions come
+    from one counter and at most ``max_entries`` keys are kept: an evicted key
+    reads as the highest version evicted so far, which is never a version a
+    reader of that key took before its last write, so eviction can only turn a
+    cache fill into a miss.
+    """
+
+    def __init__(self, max_entries=65536):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.versions = OrderedDict()
+        self.counter = 0
+        self.floor = 0
+
+    def get(self, key):
+        with self.lock:
+            return self.versions.get(key, self.floor)
+
+    def bump(self, key):
+        with self.lock:
+            self.counter += 1
+            self.versions[key] = self.counter
+            self.versions.move_to_end(key)
+            while len(self.versions) > self.max_entries:
+                self.floor = max(self.floor, self.versions.popitem(last=False)[1])
+            return self.counter
+
+    def __len__(self):
+        return len(self.versions)
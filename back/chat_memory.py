@@ -0,0 +1,162 @@
+"""Token-budgeted chat memory for agent conversations
+
+A conversation keeps its last ``MEMORY_TURNS`` turns verbatim; older turns
+are folded into a running summary. The summary is updated incrementally (the
+previous summary plus the newly folded lines) by ``memory_model`` on a
+background thread, so a turn never waits for it; until a fold is summarized
+those lines are simply left out of the prompt.
+
+What the prompt sees never exceeds ``MEMORY_TOKEN_BUDGET`` (estimated at
+four characters a token): long messages are clipped, the summary is capped at
+a quarter of the budget, and verbatim turns are folded early when they would
+not fit. The rendered history text is cached on the conversation and only
+re-rendered when the memory changes, so building the prompt is a lookup.
+
+All state lives in the conversation dict: ``chat_history`` (verbatim
+messages), ``summary`` and ``folding`` (turns waiting to be summarized) are
+durable; ``history_text`` and ``turn_tokens`` are derived.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import clients
+
+MEMORY_TOKEN_BUDGET = int(os.getenv('MEMORY_TOKEN_BUDGET', '2000'))
+MEMORY_TURNS = int(os.getenv('MEMORY_TURNS', '6'))
+CHARS_PER_TOKEN = 4
+SUMMARY_TOKENS = MEMORY_TOKEN_BUDGET // 4
+# What the verbatim turns may use; the rest is kept for the summary and its header
+TURN_TOKENS = MEMORY_TOKEN_BUDGET - SUMMARY_TOKENS - 16
+# No single message may take more than this share of it
+MESSAGE_TOKENS = TURN_TOKENS // 4
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a bank customer and their assistant.
+Keep facts that may matter later (names, amounts, requests, decisions, open questions); drop small talk.
+Answer with the new summary only, in at most {words} words.
+
+Current summary:
+{summary}
+
+New lines:
+{lines}
+"""
+
+_lock = threading.RLock()
+_summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-memory')
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _clip(text, tokens):
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _line(message):
+    speaker = "Human" if message["role"] == "human" else "Assistant"
+    return f"{speaker}: {_clip(message['content'], MESSAGE_TOKENS)}\n"
+
+
+def _render(conversation):
+    lines = "".join(_line(message) for message in conversation["chat_history"])
+    summary = conversation["summary"]
+    text = f"Summary of the earlier conversation: {summary}\n{lines}" if summary else lines
+    conversation["history_text"] = text
+    conversation["turn_tokens"] = estimate_tokens(lines)
+
+
+def restore(conversation, state):
+    """Load the durable memory fields of a saved conversation_state into conversation"""
+    conversation["chat_history"] = list(state.get("chat_history", []))
+    conversation["summary"] = state.get("summary", "")
+    conversation["folding"] = list(state.get("folding", []))
+    conversation["summarizing"] = False
+    _render(conversation)
+    _fold(conversation)
+    _schedule(conversation)
+
+
+def state(conversation):
+    """Copies of the durable memory fields, safe to take while a summary is being written"""
+    with _lock:
+        return {
+            "chat_history": list(conversation["chat_history"]),
+            "summary": conversation["summary"],
+            "folding": list(conversation["folding"]),
+        }
+
+
+def history_text(conversation):
+    """The chat history as it goes into the prompt"""
+    return conversation["history_text"]
+
+
+def record(conversation, human, ai):
+    """Add one turn, folding the oldest turns out once the window or budget is exceeded"""
+    with _lock:
+        messages = [{"role": "human", "content": human}, {"role": "ai", "content": ai}]
+        conversation["chat_history"].extend(messages)
+        text = "".join(_line(message) for message in messages)
+        conversation["history_text"] += text
+        conversation["turn_tokens"] += estimate_tokens(text)
+        _fold(conversation)
+
+
+def _fold(conversation):
+    history = conversation["chat_history"]
+    if len(history) <= 2 * MEMORY_TURNS and conversation["turn_tokens"] <= TURN_TOKENS:
+        return
+    folded = max(0, len(history) - 2 * MEMORY_TURNS)
+    # Drop whole turns (never the latest) until the rest fits
+    tokens = sum(estimate_tokens(_line(message)) for message in history[folded:])
+    while tokens > TURN_TOKENS and len(history) - folded > 2:
+        tokens -= sum(estimate_tokens(_line(message)) for message in history[folded:folded + 2])
+        folded += 2
+    conversation["folding"].extend(history[:folded])
+    del history[:folded]
+    _render(conversation)
+    _schedule(conversation)
+
+
+def _schedule(conversation):
+    if conversation["folding"] and not conversation["summarizing"]:
+        conversation["summarizing"] = True
+        _summarizer.submit(_summarize, conversation)
+
+
+def summarize(summary, messages, llm=None):
+    """The running summary extended with messages"""
+    llm = llm or clients.get('memory_model')
+    words = SUMMARY_TOKENS * 3 // 4
+    lines = "".join(_line(message) for message in messages)
+    response = llm.invoke(SUMMARY_PROMPT.format(words=words, summary=summary or "(none yet)", lines=lines))
+    return _clip(str(response.content).strip(), SUMMARY_TOKENS)
+
+
+def _summarize(conversation):
+    while True:
+        with _lock:
+            messages = list(conversation["folding"])
+            summary = conversation["summary"]
+            if not messages:
+                conversation["summarizing"] = False
+                return
+        try:
+            updated = summarize(summary, messages)
+        except Exception as e:
+            print(f"Chat memory summary failed for {conversation.get('user_id')}: {e}")
+            with _lock:
+                # Left in folding; the next fold tries again
+                conversation["summarizing"] = False
+            return
+        with _lock:
+            del conversation["folding"][:len(messages)]
+            conversation["summary"] = updated
+            _render(conversation)
+
+
+def drain():
+    """Wait for the summaries queued so far (benchmarks and shutdown)"""
+    _summarizer.submit(lambda: None).result()
@@ -0,0 +1,141 @@
+"""Lazily built LLM and vector-store clients
+
+Importing the backend used to construct every Gemini chat model, the
+embeddings client and a Pinecone client (and create the Pinecone index over
+the network) at import time, which also pulled in all of
+langchain_google_genai. Each client is now registered here as a factory and
+built on first ``get``, once per process; the heavy imports live inside the
+factories. ``warm`` builds them ahead of the first request (the readiness
+endpoint calls it), and ``override`` swaps in a stand-in such as the fake
+chat model used by the benchmarks.
+"""
+import os
+import time
+import threading
+
+NOTES_INDEX = "notes"
+
+_factories = {}
+_instances = {}
+_lock = threading.RLock()  # factories may get() the clients they depend on
+
+
+def register(name, factory):
+    """Register a zero-argument factory for the client called name"""
+    _factories[name] = factory
+    return factory
+
+
+def get(name):
+    """The client called name, built on first use"""
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _instances:
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+def override(name, instance):
+    """Use instance for name from now on (tests and benchmarks)"""
+    with _lock:
+        _instances[name] = instance
+
+
+def reset(name=None):
+    """Forget built clients so the next get builds them again"""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def status():
+    """{name: True if built} for every registered client"""
+    return {name: name in _instances for name in _factories}
+
+
+def warm(names=None):
+    """Build the named (default: all) clients; {name: {ok, ms[, error]}}"""
+    report = {}
+    for name in names or list(_factories):
+        started = time.perf_counter()
+        try:
+            get(name)
+            report[name] = {"ok": True}
+        except Exception as e:
+            report[name] = {"ok": False, "error": str(e)}
+        report[name]["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def _gemini(**kwargs):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from metrics import llm_callbacks
+    return ChatGoogleGenerativeAI(model="gemini-2.0-flash", callbacks=llm_callbacks(), **kwargs)
+
+
+def _agent_framework():
+    """(Tool, AgentExecutor, create_react_agent); importing langchain.agents alone takes ~0.4 s"""
+    from langchain.tools import Tool
+    from langchain.agents import AgentExecutor, create_react_agent
+    return Tool, AgentExecutor, create_react_agent
+
+
+def _tool_agent_framework():
+    """(StructuredTool, AgentExecutor, create_tool_calling_agent) for the function-calling agent"""
+    from langchain_core.tools import StructuredTool
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+    return StructuredTool, AgentExecutor, create_tool_calling_agent
+
+
+def _llm_cache():
+    from llm_cache import get_cache
+    return get_cache()
+
+
+def _pinecone():
+    from pinecone import Pinecone
+    return Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
+
+
+def _embedding_model():
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+
+
+def _embeddings():
+    """The embedding model behind the persistent embedding cache"""
+    from embedding_cache import CachedEmbeddings, DEFAULT_PATH
+    return CachedEmbeddings(get('embedding_model'), "models/text-embedding-004",
+                            path=os.getenv('EMBEDDING_CACHE_PATH', DEFAULT_PATH))
+
+
+def _notes_index():
+    """Name of the Pinecone notes index, created if it does not exist yet"""
+    from pinecone import ServerlessSpec
+    pc = get('pinecone')
+    if NOTES_INDEX not in pc.list_indexes().names():
+        pc.create_index(
+            name=NOTES_INDEX,
+            dimension=768,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+    return NOTES_INDEX
+
+register('agent_model', _gemini)
+# Deterministic, so identical prompts are answered from the LLM cache
+register('summary_model', lambda: _gemini(temperature=0, cache=get('llm_cache')))
+register('agent_framework', _agent_framework)
+register('tool_agent_framework', _tool_agent_framework)
+register('notes_model', lambda: _gemini(temperature=0, max_retries=2, cache=get('llm_cache')))
+register('memory_model', lambda: _gemini(temperature=0, max_retries=2, cache=get('llm_cache')))
+register('llm_cache', _llm_cache)
+register('embedding_model', _embedding_model)
+register('embeddings', _embeddings)
+register('pinecone', _pinecone)
+register('notes_index', _notes_index)
@@ -0,0 +1,125 @@
+"""Bounded conversation store shared by every worker process
+
+Live conversations (chat history, pending transfer, context) are kept in a small
+in-memory LRU with an idle TTL. Only the durable part of a conversation
+(chat history, pending transfer, context watermark) is written to a local
+SQLite file, so several gunicorn workers on the same host can serve the same
+user: a worker that misses in memory, or sees a newer version on disk,
+rebuilds the conversation lazily from the saved state.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'conversations.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    user_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class ConversationStore:
+    """LRU + TTL cache of conversations backed by a durable on-disk state
+
+    ``build(user_id, state)`` creates a live conversation from a saved state
+    (or ``None``), and ``dump(conversation)`` returns its durable state as a
+    JSON-serializable dict.
+    """
+
+    def __init__(self, build, dump, path=DEFAULT_PATH, max_entries=256, ttl=1800, disk_ttl=7 * 24 * 3600):
+        self.build = build
+        self.dump = dump
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_ttl = disk_ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # user_id -> (conversation, version, last_access)
+        self.saves = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.prune()
+
+    def _load(self, user_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT state, version FROM conversations WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None, 0
+        return json.loads(row[0]), row[1]
+
+    def _version(self, user_id):
+        with self.lock:
+            row = self.conn.execute("SELECT version FROM conversations WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def get(self, user_id):
+        """Return the live conversation for a user, rebuilding it if needed"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+        if entry is not None:
+            conversation, version, last_access = entry
+            # Another worker may have advanced this conversation since we cached it
+            if now - last_access <= self.ttl and self._version(user_id) == version:
+                with self.lock:
+                    self.entries[user_id] = (conversation, version, now)
+                    self.entries.move_to_end(user_id)
+                return conversation
+
+        state, version = self._load(user_id)
+        conversation = self.build(user_id, state)
+        self._remember(user_id, conversation, version)
+        return conversation
+
+    def save(self, user_id, conversation):
+        """Persist the durable state of a conversation after a turn"""
+        state = json.dumps(self.dump(conversation))
+        with self.lock:
+            version = self.conn.execute(
+                "INSERT INTO conversations (user_id, state, version, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET state = excluded.state, version = version + 1, "
+                "updated_at = excluded.updated_at RETURNING version",
+                (user_id, state, time.time()),
+            ).fetchone()[0]
+            self.saves += 1
+            prune = self.saves % 100 == 0
+        self._remember(user_id, conversation, version)
+        if prune:
+            self.prune()
+
+    def discard(self, user_id):
+        """Forget a conversation in memory and on disk"""
+        with self.lock:
+            self.entries.pop(user_id, None)
+            self.conn.execute("DELETE FROM conversations WHERE user_id = ?", (user_id,))
+
+    def prune(self):
+        """Drop durable states that have not been touched for disk_ttl seconds"""
+        with self.lock:
+            self.conn.execute("DELETE FROM conversations WHERE updated_at < ?", (time.time() - self.disk_ttl,))
+
+    def _remember(self, user_id, conversation, version):
+        now = time.monotonic()
+        with self.lock:
+            self.entries[user_id] = (conversation, version, now)
+            self.entries.move_to_end(user_id)
+            # Expire idle entries from the cold end, then enforce the size cap
+            while self.entries:
+                _, (_, _, last_access) = next(iter(self.entries.items()))
+                if now - last_access > self.ttl or len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                else:
+                    break
+
+    def __len__(self):
+        return len(self.entries)
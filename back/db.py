@@ -0,0 +1,972 @@
+"""Shared data-access layer for the backend.
+
+Every module goes through the functions in this file instead of building its
+own Supabase client. Two backends implement the same small query interface
+(select / aggregate / insert / update / delete / rpc):
+
+- ``SupabaseBackend`` wraps one process-wide Supabase client. Its PostgREST
+  session is a single keep-alive HTTP/2 connection pool shared by all routes.
+- ``SQLiteBackend`` keeps the same tables in an in-process SQLite database so
+  every endpoint can be exercised and benchmarked offline.
+
+Filters are ``(column, op, value)`` triples ANDed together; op is a PostgREST
+operator (eq, neq, gt, gte, lt, lte, ilike, in) or ``or``, whose value is a
+list of filter lists of which at least one must match.
+
+Set ``DB_BACKEND=sqlite`` (and optionally ``SQLITE_PATH``) to use the local
+backend. Both backends count round trips so benchmarks can report them.
+"""
+import os
+import re
+import json
+import uuid
+import hashlib
+import time
+import asyncio
+import sqlite3
+import functools
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from cache import TTLCache, VersionStamps
+
+load_dotenv()
+
+
+def utc_now():
+    """Current UTC time as an ISO string, the format Supabase returns"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+_POSTGREST_RESERVED = re.compile(r'[,.:()"\\\s]')
+
+
+def _postgrest_value(value):
+    value = str(value).lower() if isinstance(value, bool) else str(value)
+    if _POSTGREST_RESERVED.search(value):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return value
+
+
+def _postgrest_group(group):
+    """PostgREST logic-tree text for one AND group of (column, op, value) filters"""
+    conditions = []
+    for column, op, value in group:
+        if op == 'in':
+            conditions.append(f"{column}.in.({','.join(_postgrest_value(v) for v in value)})")
+        elif op in ('like', 'ilike'):
+            conditions.append(f"{column}.{op}.{_postgrest_value(str(value).replace('%', '*'))}")
+        else:
+            conditions.append(f"{column}.{op}.{_postgrest_value(value)}")
+    return conditions[0] if len(conditions) == 1 else f"and({','.join(conditions)})"
+
+
+# Per-request round-trip counter ([count]) set by tracing; shared with contexts copied from the request
+current_round_trips = contextvars.ContextVar('current_round_trips', default=None)
+_round_trip_listeners = []
+
+
+def on_round_trip(listener):
+    """Register ``listener(backend_name, seconds)``, called after every database round trip"""
+    _round_trip_listeners.append(listener)
+    return listener
+
+
+def _count_round_trip(backend, seconds):
+    counter = current_round_trips.get()
+    if counter is not None:
+        counter[0] += 1
+    for listener in _round_trip_listeners:
+        listener(backend, seconds)
+
+
+class SupabaseBackend:
+    """Query interface backed by a single pooled Supabase client"""
+
+    name = "supabase"
+
+    def __init__(self, url, key):
+        from supabase import create_client
+
+        self.client = create_client(url, key)
+        self.round_trips = 0
+
+    def _filtered(self, query, filters):
+        alternatives = []
+        for column, op, value in filters:
+            if op == 'or':
+                alternatives.append(",".join(_postgrest_group(group) for group in value))
+            elif op == 'in':
+                query = query.in_(column, value)
+            else:
+                query = getattr(query, op)(column, value)
+        # PostgREST takes one top-level or=(...); several become or=(and(or(..),or(..)))
+        if len(alternatives) == 1:
+            query = query.or_(alternatives[0])
+        elif alternatives:
+            query = query.or_(f"and({','.join(f'or({a})' for a in alternatives)})")
+        return query
+
+    def _execute(self, query):
+        self.round_trips += 1
+        start = time.perf_counter()
+        try:
+            return query.execute().data
+        finally:
+            _count_round_trip(self.name, time.perf_counter() - start)
+
+    def select(self, table, columns='*', filters=(), order=(), limit=None):
+        query = self._filtered(self.client.table(table).select(columns), filters)
+        for column, desc in order:
+            query = query.order(column, desc=desc)
+        if limit is not None:
+            query = query.limit(limit)
+        return self._execute(query)
+
+    def aggregate(self, table, column, filters=()):
+        # PostgREST aggregate functions; migration.ts enables them
+        query = self._filtered(self.client.table(table).select(f"{column}.sum(),count()"), filters)
+        row = (self._execute(query) or [{}])[0]
+        return {"sum": float(row.get('sum') or 0), "count": int(row.get('count') or 0)}
+
+    def insert(self, table, rows):
+        return self._execute(self.client.table(table).insert(rows))
+
+    def update(self, table, values, filters):
+        return self._execute(self._filtered(self.client.table(table).update(values), filters))
+
+    def delete(self, table, filters):
+        return self._execute(self._filtered(self.client.table(table).delete(), filters))
+
+    def rpc(self, name, params):
+        return self._execute(self.client.rpc(name, params))
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    age INTEGER,
+    email TEXT UNIQUE,
+    interests TEXT,
+    created_at TEXT NOT NULL,
+    clerk_id TEXT UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS wallets (
+    wallet_id TEXT PRIMARY KEY,
+    user_id TEXT REFERENCES users(user_id) ON DELETE CASCADE,
+    debit_balance REAL DEFAULT 100.00,
+    credit_balance REAL DEFAULT 0.00,
+    saving_balance REAL DEFAULT 0.00,
+    payment_methods TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id TEXT PRIMARY KEY,
+    user_id TEXT REFERENCES users(user_id) ON DELETE CASCADE,
+    wallet_id TEXT,
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT,
+    payment_method TEXT,
+    transaction_type TEXT,
+    created_at TEXT NOT NULL,
+    recipient TEXT,
+    note TEXT,
+    is_fraud INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS budget_plans (
+    id TEXT PRIMARY KEY,
+    user_id TEXT REFERENCES users(user_id) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL,
+    period TEXT NOT NULL CHECK (period IN ('monthly', 'weekly')),
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_wallets_user_id ON wallets(user_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_created ON transactions(user_id, created_at, transaction_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_amount ON transactions(user_id, amount, transaction_id);
+CREATE INDEX IF NOT EXISTS idx_budget_plans_user_id ON budget_plans(user_id);
+"""
+
+# Primary key plus the columns that need converting on the way in and out
+SQLITE_TABLES = {
+    'users': {'key': 'user_id', 'json': ('interests',), 'bool': (), 'real': ()},
+    'wallets': {'key': 'wallet_id', 'json': ('payment_methods',), 'bool': (),
+                'real': ('debit_balance', 'credit_balance', 'saving_balance')},
+    'transactions': {'key': 'transaction_id', 'json': (), 'bool': ('is_fraud',), 'real': ('amount',)},
+    'budget_plans': {'key': 'id', 'json': (), 'bool': (), 'real': ('amount',)},
+}
+
+SQLITE_OPERATORS = {
+    'eq': '=',
+    'neq': '!=',
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+    'ilike': 'LIKE',
+}
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _identifier(name):
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid column name: {name}")
+    return name
+
+
+class SQLiteBackend:
+    """Query interface backed by an in-process SQLite database
+
+    ``latency`` adds a fixed delay to every call so benchmarks can model the
+    network cost of a Supabase round trip.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=':memory:', latency=0.0):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SQLITE_SCHEMA)
+        self.lock = threading.RLock()
+        self.latency = latency
+        self.round_trips = 0
+        self.procedures = dict(SQLITE_PROCEDURES)
+
+    def _round_trip(self):
+        self.round_trips += 1
+        start = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        _count_round_trip(self.name, time.perf_counter() - start)
+
+    def _columns(self, columns):
+        if columns.strip() == '*':
+            return '*'
+        return ", ".join(_identifier(c.strip()) for c in columns.split(','))
+
+    def _clauses(self, filters, params):
+        clauses = []
+        for column, op, value in filters:
+            if op == 'or':
+                groups = [" AND ".join(self._clauses(group, params)) or "1" for group in value]
+                clauses.append(f"(({') OR ('.join(groups)}))" if groups else "0")
+                continue
+            column = _identifier(column)
+            if op == 'in':
+                values = list(value)
+                if not values:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+                params.extend(self._encode_value(v) for v in values)
+            elif op in SQLITE_OPERATORS:
+                clauses.append(f"{column} {SQLITE_OPERATORS[op]} ?")
+                params.append(self._encode_value(value))
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+        return clauses
+
+    def _where(self, filters):
+        params = []
+        clauses = self._clauses(filters, params)
+        sql = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return sql, params
+
+    def _encode_value(self, value):
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    def _encode_row(self, table, row):
+        meta = SQLITE_TABLES[table]
+        encoded = {}
+        for column, value in row.items():
+            if column in meta['json'] and value is not None:
+                value = json.dumps(value)
+            encoded[_identifier(column)] = self._encode_value(value)
+        return encoded
+
+    def _decode_row(self, table, row):
+        meta = SQLITE_TABLES[table]
+        decoded = dict(row)
+        for column in meta['json']:
+            if decoded.get(column) is not None:
+                decoded[column] = json.loads(decoded[column])
+        for column in meta['bool']:
+            if column in decoded and decoded[column] is not None:
+                decoded[column] = bool(decoded[column])
+        for column in meta['real']:
+            if decoded.get(column) is not None:
+                decoded[column] = float(decoded[column])
+        return decoded
+
+    def _query(self, table, sql, params):
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [self._decode_row(table, row) for row in rows]
+
+    def select(self, table, columns='*', filters=(), order=(), limit=None):
+        self._round_trip()
+        where, params = self._where(filters)
+        sql = f"SELECT {self._columns(columns)} FROM {_identifier(table)}{where}"
+        if order:
+            sql += " ORDER BY " + ", ".join(
+                f"{_identifier(column)} {'DESC' if desc else 'ASC'}" for column, desc in order
+            )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return self._query(table, sql, params)
+
+    def aggregate(self, table, column, filters=()):
+        self._round_trip()
+        where, params = self._where(filters)
+        column = _identifier(column)
+        sql = f"SELECT COALESCE(SUM({column}), 0), COUNT(*) FROM {_identifier(table)}{where}"
+        with self.lock:
+            total, count = self.conn.execute(sql, params).fetchone()
+        return {"sum": float(total), "count": count}
+
+    def _insert_rows(self, table, rows):
+        """Insert rows without counting a round trip; callers hold the lock"""
+        key = SQLITE_TABLES[table]['key']
+        inserted = []
+        for row in rows:
+            row = dict(row)
+            row.setdefault(key, str(uuid.uuid4()))
+            row.setdefault('created_at', utc_now())
+            encoded = self._encode_row(table, row)
+            columns = ", ".join(encoded)
+            placeholders = ", ".join("?" for _ in encoded)
+            cursor = self.conn.execute(
+                f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) RETURNING *",
+                list(encoded.values()),
+            )
+            inserted.append(self._decode_row(table, cursor.fetchone()))
+        return inserted
+
+    def insert(self, table, rows):
+        self._round_trip()
+        if isinstance(rows, dict):
+            rows = [rows]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                inserted = self._insert_rows(table, rows)
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+        return inserted
+
+    def update(self, table, values, filters):
+        self._round_trip()
+        encoded = self._encode_row(table, values)
+        assignments = ", ".join(f"{column} = ?" for column in encoded)
+        where, params = self._where(filters)
+        sql = f"UPDATE {_identifier(table)} SET {assignments}{where} RETURNING *"
+        return self._query(table, sql, list(encoded.values()) + params)
+
+    def delete(self, table, filters):
+        self._round_trip()
+        where, params = self._where(filters)
+        return self._query(table, f"DELETE FROM {_identifier(table)}{where} RETURNING *", params)
+
+    def rpc(self, name, params):
+        self._round_trip()
+        if name not in self.procedures:
+            raise ValueError(f"Unknown procedure: {name}")
+        return self.procedures[name](self, **params)
+
+
+def _sqlite_transfer_funds(backend, p_sender_id, p_recipient_id, p_amount, p_description,
+                           p_sender_description=None, p_recipient_description=None,
+                           p_sender_note=None, p_recipient_note=None,
+                           p_category='transfer', p_payment_method='debit'):
+    """SQLite twin of the transfer_funds Postgres function in migration.ts"""
+    amount = float(p_amount)
+    if amount <= 0:
+        return {"success": False, "error": "Amount must be positive"}
+    conn = backend.conn
+    with backend.lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            sender = conn.execute("SELECT debit_balance FROM wallets WHERE user_id = ?", (p_sender_id,)).fetchone()
+            if sender is None:
+                conn.execute("ROLLBACK")
+                return {"success": False, "error": "Sender wallet not found"}
+            recipient = conn.execute("SELECT debit_balance FROM wallets WHERE user_id = ?", (p_recipient_id,)).fetchone()
+            if recipient is None:
+                conn.execute("ROLLBACK")
+                return {"success": False, "error": "Recipient wallet not found"}
+            if sender['debit_balance'] < amount:
+                conn.execute("ROLLBACK")
+                return {"success": False, "error": "Insufficient funds", "balance": sender['debit_balance']}
+            sender_balance = conn.execute(
+                "UPDATE wallets SET debit_balance = debit_balance - ? WHERE user_id = ? RETURNING debit_balance",
+                (amount, p_sender_id),
+            ).fetchone()['debit_balance']
+            recipient_balance = conn.execute(
+                "UPDATE wallets SET debit_balance = debit_balance + ? WHERE user_id = ? RETURNING debit_balance",
+                (amount, p_recipient_id),
+            ).fetchone()['debit_balance']
+            sender_transaction, recipient_transaction = backend._insert_rows('transactions', [
+                {
+                    'user_id': p_sender_id,
+                    'description': p_sender_description or p_description,
+                    'amount': -amount,
+                    'category': p_category,
+                    'payment_method': p_payment_method,
+                    'transaction_type': 'expense',
+                    'recipient': p_recipient_id,
+                    'note': p_sender_note,
+                    'is_fraud': False,
+                },
+                {
+                    'user_id': p_recipient_id,
+                    'description': p_recipient_description or p_description,
+                    'amount': amount,
+                    'category': p_category,
+                    'payment_method': p_payment_method,
+                    'transaction_type': 'income',
+                    'recipient': p_sender_id,
+                    'note': p_recipient_note,
+                    'is_fraud': False,
+                },
+            ])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    return {
+        "success": True,
+        "sender_balance": float(sender_balance),
+        "recipient_balance": float(recipient_balance),
+        "sender_transaction": sender_transaction,
+        "recipient_transaction": recipient_transaction,
+    }
+
+
+def _sqlite_summary_watermark(backend, p_user_id):
+    """SQLite twin of the summary_watermark Postgres function in migration.ts"""
+    def digest(rows):
+        return hashlib.md5("|".join(str(value) for row in rows for value in row).encode()).hexdigest()
+
+    with backend.lock:
+        latest = backend.conn.execute(
+            "SELECT transaction_id, created_at FROM transactions WHERE user_id = ? "
+            "ORDER BY created_at DESC, transaction_id DESC LIMIT 1",
+            (p_user_id,),
+        ).fetchone()
+        wallet = backend.conn.execute(
+            "SELECT debit_balance, credit_balance, saving_balance FROM wallets WHERE user_id = ?", (p_user_id,)
+        ).fetchall()
+        budgets = backend.conn.execute(
+            "SELECT id, category, amount, period, start_date, end_date FROM budget_plans WHERE user_id = ? ORDER BY id",
+            (p_user_id,),
+        ).fetchall()
+    return {
+        "transaction": dict(latest) if latest else None,
+        "wallet": digest(wallet) if wallet else None,
+        "budgets": digest(budgets),
+    }
+
+
+def _sqlite_import_transactions(backend, p_user_id, p_rows, p_adjust_balance=True):
+    """SQLite twin of the import_transactions Postgres function in migration.ts"""
+    conn = backend.conn
+    with backend.lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            wallet = conn.execute("SELECT wallet_id, debit_balance FROM wallets WHERE user_id = ?", (p_user_id,)).fetchone()
+            if wallet is None:
+                conn.execute("ROLLBACK")
+                return {"success": False, "error": "Wallet not found"}
+            rows = [dict(row, user_id=p_user_id, wallet_id=wallet['wallet_id']) for row in p_rows]
+            for row in rows:
+                if row.get('created_at') is None:
+                    row.pop('created_at', None)
+            inserted = backend._insert_rows('transactions', rows)
+            net = sum(float(row['amount']) for row in rows)
+            balance = wallet['debit_balance']
+            if p_adjust_balance and net:
+                balance = conn.execute(
+                    "UPDATE wallets SET debit_balance = debit_balance + ? WHERE user_id = ? RETURNING debit_balance",
+                    (net, p_user_id),
+                ).fetchone()['debit_balance']
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    return {"success": True, "inserted": len(inserted), "transactions": inserted, "net_amount": round(net, 2),
+            "balance": float(balance)}
+
+
+SQLITE_PROCEDURES = {
+    'transfer_funds': _sqlite_transfer_funds,
+    'summary_watermark': _sqlite_summary_watermark,
+    'import_transactions': _sqlite_import_transactions,
+}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _backend_from_env():
+    if os.getenv('DB_BACKEND', 'supabase').lower() == 'sqlite':
+        return SQLiteBackend(os.getenv('SQLITE_PATH', ':memory:'))
+    return SupabaseBackend(os.getenv('SUPABASE_URL'), os.getenv('ANON_SUPABASE_KEY'))
+
+
+def get_backend():
+    """Return the process-wide backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _backend_from_env()
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the process-wide backend (used by benchmarks) and return the old one"""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    wallet_cache.clear()
+    clerk_cache.clear()
+    return previous
+
+
+def round_trips():
+    """Number of database round trips made by the current backend so far"""
+    return get_backend().round_trips
+
+
+_executor = None
+
+
+def get_executor():
+    """Bounded thread pool for blocking data-access calls made from async code"""
+    global _executor
+    if _executor is None:
+        with _backend_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv('DB_EXECUTOR_WORKERS', '32')),
+                    thread_name_prefix='db'
+                )
+    return _executor
+
+
+async def run_in_executor(fn, *args, **kwargs):
+    """Await a blocking call (e.g. any function in this module) without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    # In the caller's context, so the call counts towards its request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, fn, *args, **kwargs))
+
+
+_write_listeners = []
+
+
+def on_write(listener):
+    """Register ``listener(table, user_ids)``, called after every write made through this module
+
+    Process-local caches use this to drop or update entries for the users a
+    write touched.
+    """
+    _write_listeners.append(listener)
+    return listener
+
+
+def _notify(table, user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if user_ids:
+        for listener in _write_listeners:
+            listener(table, user_ids)
+
+
+_insert_listeners = []
+
+
+def on_insert(listener):
+    """Register ``listener(table, rows)``, called with the rows of every transactions insert
+
+    Unlike on_write this carries the rows, for readers that follow a user's
+    transactions past a created_at watermark: imports and other callers may
+    supply an older created_at, and such rows land behind the watermark.
+    """
+    _insert_listeners.append(listener)
+    return listener
+
+
+def _notify_inserted(table, rows):
+    rows = [row for row in rows or () if row]
+    if rows:
+        for listener in _insert_listeners:
+            listener(table, rows)
+
+
+def _first(rows):
+    return rows[0] if rows else None
+
+
+# Users
+#
+# Most page loads start by resolving the signed-in Clerk ID, so user rows are
+# cached by clerk_id for CLERK_CACHE_TTL_SECONDS, and unknown Clerk IDs for
+# CLERK_NEGATIVE_TTL_SECONDS (short, so a user created by another worker
+# during onboarding is found quickly). create_user and update_user write the
+# new row through, and version stamps per clerk_id stop an in-flight read
+# from caching a result older than a write, as for wallets below.
+
+CLERK_CACHE_TTL_SECONDS = float(os.getenv('CLERK_CACHE_TTL_SECONDS', '300'))
+CLERK_NEGATIVE_TTL_SECONDS = float(os.getenv('CLERK_NEGATIVE_TTL_SECONDS', '5'))
+clerk_cache = TTLCache(max_entries=int(os.getenv('CLERK_CACHE_SIZE', '8192')), ttl=CLERK_CACHE_TTL_SECONDS)
+_clerk_versions = VersionStamps(max_entries=4 * clerk_cache.max_entries)
+# user_id -> clerk_id it is cached under; only needed while that entry can be live
+_clerk_ids = TTLCache(max_entries=clerk_cache.max_entries, ttl=CLERK_CACHE_TTL_SECONDS)
+_clerk_lock = threading.Lock()
+
+
+def _project(row, columns):
+    """A copy of a cached full row with only the requested columns"""
+    if row is None:
+        return None
+    if columns.strip() == '*':
+        return dict(row)
+    return {column.strip(): row[column.strip()] for column in columns.split(',')}
+
+
+def _user_written(user_id, user):
+    """Drop the user's old clerk_id entry and cache the written row under its clerk_id"""
+    with _clerk_lock:
+        for clerk_id in {_clerk_ids.pop(user_id, None), user and user.get('clerk_id')}:
+            if clerk_id:
+                _clerk_versions.bump(clerk_id)
+                clerk_cache.pop(clerk_id)
+        if user and user.get('clerk_id'):
+            clerk_id = user['clerk_id']
+            clerk_cache.set(clerk_id, (_clerk_versions.get(clerk_id), user))
+            _clerk_ids.set(user_id, clerk_id)
+
+
+# Rows per users page; PostgREST caps a response at max_rows (1000 by default)
+USERS_PAGE_SIZE = int(os.getenv('USERS_PAGE_SIZE', '1000'))
+
+
+def list_users(columns='*', exclude_user_id=None, since=None):
+    """Get all users, optionally leaving out one user or only those created at or after since
+
+    Reads pages in user_id order until one comes back empty, so a server-side
+    row cap smaller than USERS_PAGE_SIZE cannot cut the list short. columns
+    must include user_id.
+    """
+    filters = [('user_id', 'neq', exclude_user_id)] if exclude_user_id else []
+    if since:
+        filters.append(('created_at', 'gte', since))
+    users = []
+    while True:
+        after = [('user_id', 'gt', users[-1]['user_id'])] if users else []
+        page = get_backend().select('users', columns, filters + after, order=[('user_id', False)], limit=USERS_PAGE_SIZE)
+        if not page:
+            return users
+        users.extend(page)
+
+
+def get_users(user_ids, columns='*'):
+    """Get the users with these user_ids"""
+    return get_backend().select('users', columns, [('user_id', 'in', list(user_ids))])
+
+
+def get_user(user_id, columns='*'):
+    """Get a user by their user_id"""
+    return _first(get_backend().select('users', columns, [('user_id', 'eq', user_id)]))
+
+
+def get_user_by_clerk_id(clerk_id, columns='*'):
+    """Get a user by their Clerk ID, from the identity cache while it is fresh"""
+    entry = clerk_cache.get(clerk_id)
+    if entry is not None:
+        user = entry[1]
+    else:
+        version = _clerk_versions.get(clerk_id)
+        user = _first(get_backend().select('users', '*', [('clerk_id', 'eq', clerk_id)]))
+        with _clerk_lock:
+            if _clerk_versions.get(clerk_id) == version:
+                clerk_cache.set(clerk_id, (version, user), ttl=None if user else CLERK_NEGATIVE_TTL_SECONDS)
+                if user:
+                    _clerk_ids.set(user['user_id'], clerk_id)
+    return _project(user, columns)
+
+
+def get_user_id_by_clerk_id(clerk_id):
+    """The user_id for a Clerk ID, or None for an unknown one"""
+    user = get_user_by_clerk_id(clerk_id)
+    return user['user_id'] if user else None
+
+
+def get_user_by_name(first_name, last_name, columns='*'):
+    """Get the first user with exactly this first and last name"""
+    filters = [('first_name', 'eq', first_name), ('last_name', 'eq', last_name)]
+    return _first(get_backend().select('users', columns, filters))
+
+
+def search_users_by_name(first_name=None, last_name=None, columns='*'):
+    """Case-insensitive substring search on first and/or last name"""
+    filters = []
+    if first_name:
+        filters.append(('first_name', 'ilike', f"%{first_name}%"))
+    if last_name:
+        filters.append(('last_name', 'ilike', f"%{last_name}%"))
+    return get_backend().select('users', columns, filters)
+
+
+def create_user(user_data):
+    """Create a new user"""
+    user = _first(get_backend().insert('users', user_data))
+    if user:
+        _user_written(user['user_id'], user)
+    _notify('users', [user and user.get('user_id')])
+    return user
+
+
+def update_user(user_id, user_data):
+    """Update a user by their user_id"""
+    user = _first(get_backend().update('users', user_data, [('user_id', 'eq', user_id)]))
+    _user_written(user_id, user)
+    _notify('users', [user_id])
+    return user
+
+
+# Wallets
+#
+# Wallet rows are cached per user for WALLET_CACHE_TTL_SECONDS. Every balance
+# change in this module writes the new row (or balance) through to the cache,
+# so repeated reads in one chat turn or page load cost no round trips. Each
+# user has a version stamp bumped by every write; a read only fills the cache
+# if no write happened while it was in flight, so a slow read can never put
+# an older balance back. Writes from other workers are picked up within the
+# TTL, and transfers re-check balances atomically in the database anyway.
+
+WALLET_CACHE_TTL_SECONDS = float(os.getenv('WALLET_CACHE_TTL_SECONDS', '5'))
+wallet_cache = TTLCache(max_entries=int(os.getenv('WALLET_CACHE_SIZE', '4096')), ttl=WALLET_CACHE_TTL_SECONDS)
+_wallet_versions = VersionStamps(max_entries=4 * wallet_cache.max_entries)
+_wallet_lock = threading.Lock()
+
+
+def _wallet_written(user_id, wallet=None, **balances):
+    """Bump the user's wallet version and cache the new row, patch the cached row, or drop it"""
+    if not user_id:
+        return
+    with _wallet_lock:
+        version = _wallet_versions.bump(user_id)
+        if wallet is None and balances:
+            entry = wallet_cache.pop(user_id)
+            wallet = dict(entry[1], **balances) if entry else None
+        if wallet is not None:
+            wallet_cache.set(user_id, (version, wallet))
+        else:
+            wallet_cache.pop(user_id)
+
+
+def get_wallet(user_id, columns='*'):
+    """Get a user's wallet, from the write-through cache while it is fresh"""
+    entry = wallet_cache.get(user_id)
+    if entry is not None:
+        wallet = entry[1]
+    else:
+        version = _wallet_versions.get(user_id)
+        wallet = _first(get_backend().select('wallets', '*', [('user_id', 'eq', user_id)]))
+        if wallet is not None:
+            with _wallet_lock:
+                if _wallet_versions.get(user_id) == version:
+                    wallet_cache.set(user_id, (version, wallet))
+    return _project(wallet, columns)
+
+
+def create_wallet(wallet_data):
+    """Create a wallet"""
+    wallet = _first(get_backend().insert('wallets', wallet_data))
+    _wallet_written(wallet_data.get('user_id'), wallet)
+    _notify('wallets', [wallet_data.get('user_id')])
+    return wallet
+
+
+def update_wallet(user_id, values):
+    """Update fields on a user's wallet"""
+    wallet = _first(get_backend().update('wallets', values, [('user_id', 'eq', user_id)]))
+    _wallet_written(user_id, wallet)
+    _notify('wallets', [user_id])
+    return wallet
+
+
+# Transactions
+
+def list_transactions(user_id, columns='*', since=None, limit=None):
+    """Get a user's transactions, newest first"""
+    filters = [('user_id', 'eq', user_id)]
+    if since:
+        filters.append(('created_at', 'gte', since))
+    return get_backend().select('transactions', columns, filters, order=[('created_at', True)], limit=limit)
+
+
+def get_transactions(user_id, transaction_ids, columns='*'):
+    """A user's transactions with these ids, oldest first"""
+    filters = [('user_id', 'eq', user_id), ('transaction_id', 'in', list(transaction_ids))]
+    return get_backend().select('transactions', columns, filters, order=[('created_at', False), ('transaction_id', False)])
+
+
+def list_transactions_page(user_id, columns='*', filters=(), sort='created_at', descending=True, after=None, limit=50):
+    """One page of a user's transactions in a stable (sort, transaction_id) order
+
+    ``after`` is the (sort value, transaction_id) of the last row of the
+    previous page: rows are found by seeking past it on the index rather
+    than by offset, so every page costs the same however deep it is.
+    """
+    query_filters = [('user_id', 'eq', user_id), *filters]
+    if after:
+        value, transaction_id = after
+        op = 'lt' if descending else 'gt'
+        query_filters.append((None, 'or', [[(sort, op, value)], [(sort, 'eq', value), ('transaction_id', op, transaction_id)]]))
+    order = [(sort, descending), ('transaction_id', descending)]
+    return get_backend().select('transactions', columns, query_filters, order=order, limit=limit)
+
+
+def transaction_totals(user_id, filters=()):
+    """Income, expenses (as a positive number), net flow and count of a user's filtered transactions
+
+    Two aggregate round trips, one per amount sign, however many rows match.
+    """
+    query_filters = [('user_id', 'eq', user_id), *filters]
+    income = get_backend().aggregate('transactions', 'amount', query_filters + [('amount', 'gte', 0)])
+    expense = get_backend().aggregate('transactions', 'amount', query_filters + [('amount', 'lt', 0)])
+    return {
+        "income": round(income['sum'], 2),
+        "expense": round(-expense['sum'], 2),
+        "net": round(income['sum'] + expense['sum'], 2),
+        "count": income['count'] + expense['count'],
+    }
+
+
+def create_transaction(transaction_data):
+    """Insert a single transaction"""
+    transaction = _first(get_backend().insert('transactions', transaction_data))
+    _notify_inserted('transactions', [transaction])
+    _notify('transactions', [transaction_data.get('user_id')])
+    return transaction
+
+
+def transfer_funds(sender_id, recipient_id, amount, description, sender_description=None,
+                   recipient_description=None, sender_note=None, recipient_note=None,
+                   category='transfer', payment_method='debit'):
+    """Move money between two debit balances and record both ledger legs atomically
+
+    Runs as one round trip: the transfer_funds Postgres function on Supabase,
+    or a single SQLite transaction locally. Both wallets are debited/credited
+    and both transactions inserted, or nothing changes. Returns a dict with
+    ``success`` and either ``error`` or the new balances and transaction rows.
+    """
+    result = get_backend().rpc('transfer_funds', {
+        'p_sender_id': sender_id,
+        'p_recipient_id': recipient_id,
+        'p_amount': amount,
+        'p_description': description,
+        'p_sender_description': sender_description,
+        'p_recipient_description': recipient_description,
+        'p_sender_note': sender_note,
+        'p_recipient_note': recipient_note,
+        'p_category': category,
+        'p_payment_method': payment_method,
+    })
+    if result.get('success'):
+        _wallet_written(sender_id, debit_balance=float(result['sender_balance']))
+        _wallet_written(recipient_id, debit_balance=float(result['recipient_balance']))
+        _notify('wallets', [sender_id, recipient_id])
+        _notify_inserted('transactions', [result.get('sender_transaction'), result.get('recipient_transaction')])
+        _notify('transactions', [sender_id, recipient_id])
+    return result
+
+
+def import_transactions(user_id, rows, adjust_balance=True):
+    """Insert a batch of a user's transactions and apply their net amount to the debit balance
+
+    One round trip and one transaction per batch: the import_transactions
+    Postgres function on Supabase, or a single SQLite transaction locally.
+    Returns a dict with ``success`` and either ``error`` or ``inserted``,
+    the inserted ``transactions`` rows, ``net_amount`` and the resulting
+    ``balance``.
+    """
+    result = get_backend().rpc('import_transactions', {
+        'p_user_id': user_id,
+        'p_rows': rows,
+        'p_adjust_balance': adjust_balance,
+    })
+    if result.get('success'):
+        _notify_inserted('transactions', result.get('transactions'))
+        _notify('transactions', [user_id])
+        if adjust_balance:
+            _wallet_written(user_id, debit_balance=float(result['balance']))
+            _notify('wallets', [user_id])
+    return result
+
+
+def create_transactions(rows):
+    """Insert several transactions in one round trip"""
+    rows = list(rows)
+    inserted = get_backend().insert('transactions', rows)
+    _notify_inserted('transactions', inserted)
+    _notify('transactions', [row.get('user_id') for row in rows])
+    return inserted
+
+
+# Budget plans
+
+def list_budgets(user_id):
+    """Get a user's budget plans"""
+    return get_backend().select('budget_plans', '*', [('user_id', 'eq', user_id)])
+
+
+def create_budget(budget_data):
+    """Create a budget plan"""
+    budget = _first(get_backend().insert('budget_plans', budget_data))
+    _notify('budget_plans', [budget_data.get('user_id')])
+    return budget
+
+
+def update_budget(budget_id, budget_data):
+    """Update a budget plan by id"""
+    budget = _first(get_backend().update('budget_plans', budget_data, [('id', 'eq', budget_id)]))
+    _notify('budget_plans', [budget and budget.get('user_id')])
+    return budget
+
+
+def delete_budget(budget_id):
+    """Delete a budget plan by id"""
+    budget = _first(get_backend().delete('budget_plans', [('id', 'eq', budget_id)]))
+    _notify('budget_plans', [budget and budget.get('user_id')])
+    return budget
+
+
+def summary_watermark(user_id):
+    """Cheap version stamp of everything a financial summary is built from
+
+    One round trip returning the newest transaction (id and created_at) plus
+    digests of the wallet balances and budget plans.
+    """
+    return get_backend().rpc('summary_watermark', {'p_user_id': user_id})
@@ -0,0 +1,132 @@
+"""Persistent, content-addressed cache in front of an embeddings client
+
+``CachedEmbeddings`` wraps any LangChain embeddings object (``embed_documents``
+/ ``embed_query``) and stores every vector in a local SQLite file under
+(model, task, sha256(text)); documents and queries are embedded with
+different task types, so they are cached separately. A call looks up all its
+texts in one query, embeds only the distinct misses in as few requests as
+``EMBEDDING_BATCH_SIZE`` allows, and returns vectors in input order.
+
+The cache holds at most ``EMBEDDING_CACHE_SIZE`` vectors; the least recently
+used are evicted past that. ``stats()`` reports hits, misses, embedding
+requests and the characters that did not have to be sent again.
+"""
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+import metrics
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embeddings.db')
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '200000'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '100'))
+# SQLite caps bound parameters per statement
+LOOKUP_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+
+def cache_key(model, task, text):
+    return f"{model}:{task}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+class CachedEmbeddings:
+    """embed_documents / embed_query through a size-bounded on-disk cache"""
+
+    def __init__(self, embeddings, model=None, path=DEFAULT_PATH, max_entries=EMBEDDING_CACHE_SIZE,
+                 batch_size=EMBEDDING_BATCH_SIZE):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, 'model', type(embeddings).__name__)
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.counters = {"hits": 0, "misses": 0, "requests": 0, "chars_saved": 0, "chars_embedded": 0}
+
+    def _lookup(self, keys):
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32).tolist()) for key, vector in rows)
+            if found:
+                now = time.time()
+                self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                      [(now, key) for key in found])
+        return found
+
+    def _store(self, vectors):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, vector.tobytes(), now) for key, vector in vectors.items()]
+            )
+            excess = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+
+    def _embed(self, texts, task, embed_batch):
+        keys = [cache_key(self.model, task, text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        hits = sum(1 for key in keys if key in found)
+
+        fresh = {}
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch = missing_keys[start:start + self.batch_size]
+            requested = time.perf_counter()
+            vectors = embed_batch([missing[key] for key in batch])
+            metrics.observe_upstream('embedding', time.perf_counter() - requested)
+            for key, vector in zip(batch, vectors):
+                # Rounded to float32 now, so a hit later returns exactly the same vector
+                fresh[key] = np.asarray(vector, dtype=np.float32)
+        if fresh:
+            self._store(fresh)
+
+        with self.lock:
+            self.counters["hits"] += hits
+            self.counters["misses"] += len(keys) - hits
+            self.counters["requests"] += -(-len(missing_keys) // self.batch_size)
+            self.counters["chars_saved"] += sum(len(text) for key, text in zip(keys, texts) if key in found)
+            self.counters["chars_embedded"] += sum(len(text) for text in missing.values())
+        return [found[key] if key in found else fresh[key].tolist() for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts), 'document', self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed([text], 'query', lambda batch: [self.embeddings.embed_query(batch[0])])[0]
+
+    def stats(self):
+        """Counters since start, the hit rate and the number of cached vectors"""
+        with self.lock:
+            size = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        return dict(counters, hit_rate=round(counters["hits"] / lookups, 3) if lookups else None, entries=size)
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM embeddings")
@@ -1,96 +1,91 @@
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import SystemMessage, HumanMessage
+from langchain_core.messages import SystemMessage, HumanMessage
 from dotenv import load_dotenv
-from supabase import create_client
+import re
 import json
-from datetime import datetime, timedelta
+import asyncio
+import db
+import clients
+import tracing
+from financial_metrics import compute_metrics, get_metric_transactions, get_financial_metrics
+from cache import TTLCache
 
 load_dotenv()
 
-# Initialize Supabase client
-supabase_url = os.getenv('SUPABASE_URL')
-supabase_key = os.getenv('ANON_SUPABASE_KEY')
-supabase = create_client(supabase_url, supabase_key)
-
-# Initialize the chat model
-chat_model = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
-
-def get_user_transactions(user_id, days=30):
-    """Get the user's transactions for the specified time period"""
-    # Calculate the date range (last 30 days by default)
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
-    
-    # Format dates for the query
-    start_date_str = start_date.isoformat()
-    
-    # Query transactions
-    response = supabase.table('transactions').select('*')\
-        .eq('user_id', user_id)\
-        .gte('created_at', start_date_str)\
-        .order('created_at', desc=True)\
-        .execute()
-    
-    return response.data
-
-def get_user_wallet(user_id):
-    """Get the user's wallet information"""
-    response = supabase.table('wallets').select('*').eq('user_id', user_id).execute()
-    if response.data:
-        return response.data[0]
-    return None
+# user_id -> (summary_watermark, summary). The watermark check makes entries
+# safe across workers; local writes also drop entries straight away.
+summary_cache = TTLCache(
+    max_entries=int(os.getenv('SUMMARY_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('SUMMARY_CACHE_TTL_SECONDS', '3600'))
+)
+
+@db.on_write
+def invalidate_summaries(table, user_ids):
+    if table in ('transactions', 'wallets', 'budget_plans'):
+        for user_id in user_ids:
+            summary_cache.pop(user_id)
+
+def get_user_transactions(user_id):
+    """Get the transaction columns and time range the financial metrics need"""
+    return get_metric_transactions(user_id)
 
 def get_user_budgets(user_id):
     """Get the user's budget plans"""
-    response = supabase.table('budget_plans').select('*').eq('user_id', user_id).execute()
-    return response.data
+    return db.list_budgets(user_id)
 
-def generate_financial_summary(user_id):
-    """Generate a comprehensive financial summary for the user"""
-    # Get user data
-    transactions = get_user_transactions(user_id)
-    wallet = get_user_wallet(user_id)
-    budgets = get_user_budgets(user_id)
-    
-    # Calculate financial metrics
-    total_income = sum([t['amount'] for t in transactions if t['amount'] > 0])
-    total_expenses = sum([abs(t['amount']) for t in transactions if t['amount'] < 0])
-    
-    # Categorize expenses
-    expense_categories = {}
-    for t in transactions:
-        if t['amount'] < 0:
-            category = t['category']
-            if category not in expense_categories:
-                expense_categories[category] = 0
-            expense_categories[category] += abs(t['amount'])
-    
-    # Sort categories by amount
-    sorted_categories = sorted(expense_categories.items(), key=lambda x: x[1], reverse=True)
-    top_categories = sorted_categories[:3] if len(sorted_categories) >= 3 else sorted_categories
-    
-    # Create context for the LLM
-    context = {
-        "transactions": transactions,
-        "wallet": wallet,
-        "budgets": budgets,
-        "total_income": total_income,
-        "total_expenses": total_expenses,
-        "expense_categories": expense_categories,
-        "top_spending_categories": top_categories
-    }
+def format_budgets(budgets):
+    """One prompt line per active budget plan"""
+    lines = []
+    for budget in budgets:
+        if not budget.get('active'):
+            continue
+        status = "OVER BUDGET" if budget['over_budget'] else f"${budget['remaining']} left"
+        lines.append(
+            f"  - {budget['category']} ({budget['period']}, {budget['period_start']} to {budget['period_end']}): "
+            f"spent ${budget['spent']} of ${budget['limit']} ({status})"
+        )
+    return "\n".join(lines) or "  - No active budgets"
+
+def format_unusual(transactions):
+    """One prompt line per flagged transaction"""
+    lines = [
+        f"  - {t['date']} {t['description']} ({t['category']}): ${t['amount']}, "
+        f"typical {t['category']} expense ${t['category_average']}"
+        for t in transactions
+    ]
+    return "\n".join(lines) or "  - None flagged"
+
+def build_summary_messages(metrics, wallet):
+    """Build the LLM conversation that asks for a narrative of precomputed metrics"""
+    windows = metrics['windows']
+    month = metrics['month_over_month']
+    top_categories = list(windows['30d']['expenses_by_category'].items())[:3]
+    window_lines = "\n".join(
+        f"  - Last {name[:-1]} days: income ${w['income']}, expenses ${w['expenses']}, "
+        f"net ${w['net']}, savings rate {w['savings_rate'] if w['savings_rate'] is not None else 'n/a'}, "
+        f"{w['transaction_count']} transactions"
+        for name, w in windows.items()
+    )
+    category_changes = ", ".join(
+        f"{name} {change['change']:+}" for name, change in month['expenses_by_category'].items() if change['change']
+    ) or "none"
     
     # Prompt for summary generation with custom formatting
     summary_prompt = f"""
     As a financial analyst, review the following user financial data and create both a short summary and detailed report.
+    All figures are already computed; use them as given and do not recalculate.
     
     User's Financial Data:
     - Current Balances: Debit ${wallet['debit_balance']}, Credit ${wallet['credit_balance']}
-    - Total Income (30 days): ${total_income}
-    - Total Expenses (30 days): ${total_expenses}
-    - Top Spending Categories: {top_categories}
-    - Number of Transactions: {len(transactions)}
+    - Income and expenses by period:
+{window_lines}
+    - Top Spending Categories (30 days): {top_categories}
+    - This month ({month['month']}) vs last month: income ${month['income']['current']} vs ${month['income']['previous']}, expenses ${month['expenses']['current']} vs ${month['expenses']['previous']}
+    - Category spending changes vs last month: {category_changes}
+    - Budgets in the current period:
+{format_budgets(metrics['budgets'])}
+    - Unusually large expenses (last 90 days):
+{format_unusual(metrics['unusual_transactions'])}
     
     Part 1: Create a brief 3-5 bullet point summary highlighting the most important financial insights.
     Format each point on a new line starting with "HIGHLIGHT: ".
@@ -106,7 +101,7 @@ def generate_financial_summary(user_id):
     [/SECTION]
     
     [SECTION:BUDGET]
-    Compare actual spending to budgets (if available) and highlight areas of concern.
+    Describe how spending compares to the budgets above and highlight areas of concern.
     [/SECTION]
     
     [SECTION:RECOMMENDATIONS]
@@ -114,21 +109,20 @@ def generate_financial_summary(user_id):
     [/SECTION]
     
     [SECTION:UNUSUAL]
-    Note any unusual activity or patterns in the transaction history.
+    Describe the unusually large expenses above and any notable month-over-month changes.
     [/SECTION]
     
     Use this exact formatting with section tags as shown above.
     """
     
     # Generate the summary
-    conversation = [
+    return [
         SystemMessage(content="You are a financial analyst AI that provides insightful summaries of user financial data."),
         HumanMessage(content=summary_prompt)
     ]
-    
-    response = chat_model.invoke(conversation)
-    content = response.content
-    
+
+def parse_summary(content):
+    """Split the LLM response into highlights and a formatted detailed report"""
     # Process the response with custom formatting
     highlights = []
     sections = {}
@@ -141,7 +135,6 @@ def generate_financial_summary(user_id):
                 highlights.append(highlight)
     
     # Extract sections
-    import re
     section_pattern = r'\[SECTION:(\w+)\](.*?)\[\/SECTION\]'
     section_matches = re.findall(section_pattern, content, re.DOTALL)
     
@@ -171,20 +164,81 @@ def generate_financial_summary(user_id):
     
     return result
 
-def get_user_id_by_clerk_id(clerk_id):
-    """Get the user_id corresponding to a Clerk ID"""
-    response = supabase.table('users').select('user_id').eq('clerk_id', clerk_id).execute()
-    if response.data:
-        return response.data[0]['user_id']
+def cached_summary(user_id, watermark):
+    """The cached summary for a user if it was built from data matching watermark"""
+    entry = summary_cache.get(user_id)
+    if entry is not None and entry[0] == watermark:
+        return entry[1]
     return None
 
+def generate_financial_summary(user_id):
+    """Generate a comprehensive financial summary for the user"""
+    with tracing.trace('summary', user_id=user_id) as request:
+        # A summary built from the same transactions, wallet and budgets is reused
+        watermark = db.summary_watermark(user_id)
+        summary = cached_summary(user_id, watermark)
+        if summary is not None:
+            request.attrs["cached"] = True
+            return summary
+
+        # Get user data
+        with request.span("data"):
+            transactions = get_user_transactions(user_id)
+            wallet = db.get_wallet(user_id)
+            budgets = get_user_budgets(user_id)
+        with request.span("metrics"):
+            metrics = compute_metrics(transactions, budgets)
+
+        response = clients.get('summary_model').invoke(build_summary_messages(metrics, wallet), config=request.config())
+        summary = parse_summary(response.content)
+        summary_cache.set(user_id, (watermark, summary))
+        return summary
+
+async def agenerate_financial_summary(user_id):
+    """Async generate_financial_summary: reads run concurrently on the db executor, the LLM call on the event loop"""
+    with tracing.trace('summary', user_id=user_id) as request:
+        watermark = await db.run_in_executor(db.summary_watermark, user_id)
+        summary = cached_summary(user_id, watermark)
+        if summary is not None:
+            request.attrs["cached"] = True
+            return summary
+
+        with request.span("data"):
+            transactions, wallet, budgets = await asyncio.gather(
+                db.run_in_executor(get_user_transactions, user_id),
+                db.run_in_executor(db.get_wallet, user_id),
+                db.run_in_executor(get_user_budgets, user_id),
+            )
+
+        with request.span("metrics"):
+            metrics = compute_metrics(transactions, budgets)
+        response = await clients.get('summary_model').ainvoke(build_summary_messages(metrics, wallet),
+                                                               config=request.config())
+        summary = parse_summary(response.content)
+        summary_cache.set(user_id, (watermark, summary))
+        return summary
+
 def generate_summary_by_clerk_id(clerk_id):
     """Generate a financial summary using the Clerk ID"""
-    user_id = get_user_id_by_clerk_id(clerk_id)
+    user_id = db.get_user_id_by_clerk_id(clerk_id)
     if user_id:
         return generate_financial_summary(user_id)
     return {"error": "User not found"}
 
+def get_metrics_by_clerk_id(clerk_id):
+    """Financial metrics using the Clerk ID"""
+    user_id = db.get_user_id_by_clerk_id(clerk_id)
+    if user_id:
+        return get_financial_metrics(user_id)
+    return {"error": "User not found"}
+
+async def agenerate_summary_by_clerk_id(clerk_id):
+    """Async generate_summary_by_clerk_id"""
+    user_id = await db.run_in_executor(db.get_user_id_by_clerk_id, clerk_id)
+    if user_id:
+        return await agenerate_financial_summary(user_id)
+    return {"error": "User not found"}
+
 if __name__ == "__main__":
     # Test the function with a sample user ID
     test_user_id = "user_123"  # Replace with a real user ID for testing
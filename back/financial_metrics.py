@@ -0,0 +1,240 @@
+"""Vectorized financial metrics over a user's transactions
+
+A year of transactions is loaded once (only the columns needed) into NumPy
+arrays. From that columnar view ``compute_metrics`` derives, without
+per-transaction Python loops:
+
+- income, expenses, net and savings rate for the last 7/30/90/365 days
+- expense totals per category for each of those windows
+- spend in the current period of every budget plan against its limit
+- this calendar month against last month, overall and per category
+- expenses that are unusually large for their category
+
+The summary prompt is built from these numbers so the LLM only has to narrate
+them, and the same dict is served by /api/finance/metrics.
+"""
+from datetime import datetime, timedelta, timezone
+from dateutil.relativedelta import relativedelta
+import numpy as np
+import db
+
+WINDOWS = (7, 30, 90, 365)
+METRIC_COLUMNS = 'transaction_id,created_at,amount,category,description'
+PERIOD_LENGTHS = {'weekly': relativedelta(weeks=1), 'monthly': relativedelta(months=1)}
+UNUSUAL_Z_SCORE = 3.0
+UNUSUAL_MIN_SAMPLES = 5
+DAY = 86400.0
+
+
+def parse_timestamp(value):
+    """Epoch seconds for an ISO date or timestamp (naive values are taken as UTC)"""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _round(value):
+    return round(float(value), 2)
+
+
+class TransactionColumns:
+    """Columnar (structure-of-arrays) view of a list of transaction rows"""
+
+    def __init__(self, transactions):
+        self.ids = [t.get('transaction_id') for t in transactions]
+        self.descriptions = [t.get('description') for t in transactions]
+        self.timestamps = np.fromiter((parse_timestamp(t['created_at']) for t in transactions),
+                                      dtype=np.float64, count=len(transactions))
+        self.amounts = np.fromiter((float(t['amount']) for t in transactions),
+                                   dtype=np.float64, count=len(transactions))
+        categories = np.array([(t.get('category') or 'uncategorized') for t in transactions], dtype=object)
+        if len(transactions):
+            self.categories, self.codes = np.unique(categories.astype(str), return_inverse=True)
+        else:
+            self.categories, self.codes = np.array([], dtype=str), np.array([], dtype=np.int64)
+        self.expenses = np.where(self.amounts < 0, -self.amounts, 0.0)
+        self.income = np.where(self.amounts > 0, self.amounts, 0.0)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def one_hot(self, weights):
+        """(n_transactions, n_categories) matrix with ``weights`` in each row's category column"""
+        matrix = np.zeros((len(self), len(self.categories)))
+        matrix[np.arange(len(self)), self.codes] = weights
+        return matrix
+
+
+def window_metrics(columns, now, windows=WINDOWS):
+    """Income, expenses, savings rate and per-category spend for each trailing window"""
+    # (n_windows, n_transactions) membership matrix: every window in one matrix product
+    starts = now - np.asarray(windows, dtype=np.float64) * DAY
+    membership = (columns.timestamps[None, :] >= starts[:, None]).astype(np.float64)
+    income = membership @ columns.income
+    expenses = membership @ columns.expenses
+    counts = membership.sum(axis=1)
+    by_category = membership @ columns.one_hot(columns.expenses)
+
+    result = {}
+    for i, days in enumerate(windows):
+        categories = {
+            str(name): _round(total)
+            for name, total in sorted(zip(columns.categories, by_category[i]), key=lambda item: -item[1])
+            if total > 0
+        }
+        result[f"{days}d"] = {
+            "income": _round(income[i]),
+            "expenses": _round(expenses[i]),
+            "net": _round(income[i] - expenses[i]),
+            "savings_rate": _round((income[i] - expenses[i]) / income[i]) if income[i] > 0 else None,
+            "transaction_count": int(counts[i]),
+            "expenses_by_category": categories,
+        }
+    return result
+
+
+def current_period(budget, now):
+    """(start, end) epoch seconds of the budget period containing now, or None if inactive"""
+    start = datetime.fromtimestamp(parse_timestamp(budget['start_date']), timezone.utc)
+    end = datetime.fromtimestamp(parse_timestamp(budget['end_date']), timezone.utc)
+    current = datetime.fromtimestamp(now, timezone.utc)
+    if current < start or current > end + timedelta(days=1):
+        return None
+    step = PERIOD_LENGTHS.get(budget.get('period'), PERIOD_LENGTHS['monthly'])
+    period_start = start
+    while period_start + step <= current:
+        period_start += step
+    return period_start.timestamp(), min(period_start + step, end + timedelta(days=1)).timestamp()
+
+
+def budget_metrics(columns, budgets, now):
+    """Spend in the current period of each budget plan against its limit"""
+    categories_lower = np.char.lower(columns.categories.astype(str)) if len(columns.categories) else columns.categories
+    results = []
+    for budget in budgets or []:
+        limit = float(budget['amount'])
+        entry = {
+            "id": budget.get('id'),
+            "category": budget['category'],
+            "period": budget.get('period'),
+            "limit": _round(limit),
+        }
+        period = current_period(budget, now)
+        if period is None:
+            entry.update({"active": False})
+            results.append(entry)
+            continue
+        matching = np.flatnonzero(categories_lower == str(budget['category']).lower())
+        in_period = (columns.timestamps >= period[0]) & (columns.timestamps < period[1]) & np.isin(columns.codes, matching)
+        spent = float(columns.expenses[in_period].sum())
+        entry.update({
+            "active": True,
+            "period_start": datetime.fromtimestamp(period[0], timezone.utc).date().isoformat(),
+            "period_end": datetime.fromtimestamp(period[1], timezone.utc).date().isoformat(),
+            "spent": _round(spent),
+            "remaining": _round(limit - spent),
+            "utilization": _round(spent / limit) if limit > 0 else None,
+            "over_budget": spent > limit,
+        })
+        results.append(entry)
+    return results
+
+
+def _change(current, previous):
+    return {
+        "current": _round(current),
+        "previous": _round(previous),
+        "change": _round(current - previous),
+        "change_pct": _round((current - previous) / previous * 100) if previous else None,
+    }
+
+
+def month_over_month(columns, now):
+    """This calendar month so far against the whole of last month"""
+    current = datetime.fromtimestamp(now, timezone.utc)
+    month_start = current.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    bounds = np.array([(month_start - relativedelta(months=1)).timestamp(), month_start.timestamp(), now + 1])
+    # 0 = last month, 1 = this month, anything else is outside both
+    month = np.searchsorted(bounds, columns.timestamps, side='right') - 1
+    valid = (month >= 0) & (month <= 1)
+    income = np.bincount(month[valid], weights=columns.income[valid], minlength=2)
+    expenses = np.bincount(month[valid], weights=columns.expenses[valid], minlength=2)
+
+    n_categories = len(columns.categories)
+    by_category = np.bincount(month[valid] * n_categories + columns.codes[valid],
+                              weights=columns.expenses[valid], minlength=2 * n_categories).reshape(2, n_categories) \
+        if n_categories else np.zeros((2, 0))
+    categories = {
+        str(name): _change(by_category[1, i], by_category[0, i])
+        for i, name in enumerate(columns.categories)
+        if by_category[0, i] or by_category[1, i]
+    }
+    return {
+        "month": month_start.strftime('%Y-%m'),
+        "income": _change(income[1], income[0]),
+        "expenses": _change(expenses[1], expenses[0]),
+        "expenses_by_category": categories,
+    }
+
+
+def unusual_transactions(columns, now, days=90, limit=5):
+    """Recent expenses far above the typical amount for their category (z-score)"""
+    if not len(columns):
+        return []
+    n_categories = len(columns.categories)
+    is_expense = columns.expenses > 0
+    counts = np.bincount(columns.codes, weights=is_expense, minlength=n_categories)
+    sums = np.bincount(columns.codes, weights=columns.expenses, minlength=n_categories)
+    squares = np.bincount(columns.codes, weights=columns.expenses ** 2, minlength=n_categories)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        stds = np.sqrt(np.maximum(squares / counts - means ** 2, 0))
+        z_scores = (columns.expenses - means[columns.codes]) / stds[columns.codes]
+    flagged = np.flatnonzero(
+        is_expense
+        & (columns.timestamps >= now - days * DAY)
+        & (counts[columns.codes] >= UNUSUAL_MIN_SAMPLES)
+        & np.isfinite(z_scores)
+        & (z_scores >= UNUSUAL_Z_SCORE)
+    )
+    flagged = flagged[np.argsort(-z_scores[flagged])][:limit]
+    return [
+        {
+            "transaction_id": columns.ids[i],
+            "description": columns.descriptions[i],
+            "category": str(columns.categories[columns.codes[i]]),
+            "amount": _round(columns.expenses[i]),
+            "category_average": _round(means[columns.codes[i]]),
+            "z_score": _round(z_scores[i]),
+            "date": datetime.fromtimestamp(columns.timestamps[i], timezone.utc).date().isoformat(),
+        }
+        for i in flagged
+    ]
+
+
+def compute_metrics(transactions, budgets, now=None):
+    """All metrics for one user from a year of transactions and their budget plans"""
+    now = datetime.now(timezone.utc).timestamp() if now is None else now
+    columns = TransactionColumns(transactions)
+    return {
+        "generated_at": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+        "windows": window_metrics(columns, now),
+        "budgets": budget_metrics(columns, budgets, now),
+        "month_over_month": month_over_month(columns, now),
+        "unusual_transactions": unusual_transactions(columns, now),
+    }
+
+
+def get_metric_transactions(user_id):
+    """The columns and time range of transactions the metrics need"""
+    since = (datetime.now(timezone.utc) - timedelta(days=max(WINDOWS))).isoformat()
+    return db.list_transactions(user_id, METRIC_COLUMNS, since=since)
+
+
+def get_financial_metrics(user_id):
+    """Fetch a user's data and compute their financial metrics"""
+    return compute_metrics(get_metric_transactions(user_id), db.list_budgets(user_id))
@@ -0,0 +1,107 @@
+"""Per-user transaction-history context for the chat agent
+
+Instead of pulling a user's whole transaction table into the prompt once and
+never refreshing it, each user gets a ``HistoryContext`` holding only the most
+recent ``HISTORY_CONTEXT_ROWS`` transactions from the last
+``HISTORY_CONTEXT_DAYS`` days. ``refresh`` asks only for rows at or after the
+newest ``created_at`` already held (the watermark), so keeping the context
+current after a transfer costs one small query instead of a full re-fetch.
+Rows inserted with an older ``created_at`` (imports, backdated entries) are
+behind the watermark, so ``db.on_insert`` rewinds the user's context and its
+next refresh re-reads the window.
+"""
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+import db
+
+HISTORY_COLUMNS = 'transaction_id,created_at,description,note,amount'
+HISTORY_CONTEXT_ROWS = int(os.getenv('HISTORY_CONTEXT_ROWS', '50'))
+HISTORY_CONTEXT_DAYS = int(os.getenv('HISTORY_CONTEXT_DAYS', '90'))
+HISTORY_CACHE_SIZE = int(os.getenv('HISTORY_CACHE_SIZE', '1024'))
+
+
+def format_transaction(transaction):
+    """One line of agent context for a transaction"""
+    return f"{transaction['created_at']} | {transaction['description']}; {transaction['note']}: ${transaction['amount']}"
+
+
+class HistoryContext:
+    """Most recent transactions of one user, newest first"""
+
+    def __init__(self, user_id, max_rows=HISTORY_CONTEXT_ROWS, window_days=HISTORY_CONTEXT_DAYS):
+        self.user_id = user_id
+        self.window = timedelta(days=window_days)
+        self.rows = deque(maxlen=max_rows)
+        self.seen = set()
+        self.watermark = None
+        self.lock = threading.Lock()
+        self._text = ""
+
+    def refresh(self):
+        """Pull transactions newer than the watermark and drop rows outside the window"""
+        window_start = (datetime.now(timezone.utc) - self.window).isoformat()
+        with self.lock:
+            since = max(self.watermark, window_start) if self.watermark else window_start
+            new_rows = db.list_transactions(self.user_id, HISTORY_COLUMNS, since=since, limit=self.rows.maxlen)
+            # gte on the watermark re-reads rows sharing its timestamp; skip ones we hold
+            new_rows = [row for row in new_rows if row['transaction_id'] not in self.seen]
+            changed = bool(new_rows)
+            for row in reversed(new_rows):
+                if len(self.rows) == self.rows.maxlen:
+                    self.seen.discard(self.rows[-1]['transaction_id'])
+                self.rows.appendleft(row)
+                self.seen.add(row['transaction_id'])
+            while self.rows and self.rows[-1]['created_at'] < window_start:
+                self.seen.discard(self.rows.pop()['transaction_id'])
+                changed = True
+            if self.rows:
+                self.watermark = self.rows[0]['created_at']
+            if changed:
+                self._text = "\n".join(format_transaction(row) for row in self.rows)
+        return self
+
+    def rewind(self, created_at):
+        """Re-read the whole window on the next refresh if a row was written behind the watermark"""
+        with self.lock:
+            if self.watermark and created_at < self.watermark:
+                self.rows.clear()
+                self.seen.clear()
+                self.watermark = None
+
+    def text(self):
+        return self._text
+
+
+_contexts = OrderedDict()
+_contexts_lock = threading.Lock()
+
+
+def get_history_context(user_id):
+    """Return the user's history context, refreshed up to the latest transaction"""
+    with _contexts_lock:
+        context = _contexts.get(user_id)
+        if context is None:
+            context = _contexts[user_id] = HistoryContext(user_id)
+        _contexts.move_to_end(user_id)
+        while len(_contexts) > HISTORY_CACHE_SIZE:
+            _contexts.popitem(last=False)
+    return context.refresh()
+
+
+
+@db.on_insert
+def _rewind_backdated(table, rows):
+    if table != 'transactions':
+        return
+    oldest = {}
+    for row in rows:
+        user_id, created_at = row.get('user_id'), row.get('created_at')
+        if user_id and created_at and (user_id not in oldest or created_at < oldest[user_id]):
+            oldest[user_id] = created_at
+    for user_id, created_at in oldest.items():
+        with _contexts_lock:
+            context = _contexts.get(user_id)
+        if context is not None:
+            context.rewind(created_at)
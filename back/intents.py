@@ -0,0 +1,176 @@
+"""Fast path for simple chat requests that do not need the ReAct agent
+
+Asking the agent for a balance costs at least one LLM round trip (often
+three to five with tool calls). ``route`` recognises a few closed-form
+requests and ``answer`` serves them straight from the data layer:
+
+- ``balance``: "what's my balance", "how much money do I have"
+- ``recent_transactions``: "show my last 5 transactions"
+- ``list_payees``: "list users I can pay", "who can I send money to"
+
+Routing is anchored rules first, then a small bag-of-words nearest-example
+classifier with a high threshold. Messages that look like they ask for
+something more (an amount, a transfer to someone, several clauses) always go
+to the agent, and so do messages the classifier cannot fully read: a word
+outside its vocabulary ("amazon", "march") or a qualifier such as "for",
+"in" or "since" usually narrows the request in a way the canned answers
+would drop. ``stats()`` reports how many messages each path served.
+"""
+import re
+import math
+import threading
+from collections import Counter
+import db
+from history_context import HISTORY_COLUMNS
+from user_index import list_users_compact
+
+DEFAULT_TRANSACTIONS = 5
+MAX_TRANSACTIONS = 20
+MIN_SIMILARITY = 0.72
+MIN_MARGIN = 0.15
+
+RULES = [
+    ('balance', re.compile(
+        r"^(what'?s|what is|show|check|tell me|get)?\s*(me\s+)?(my\s+)?(current\s+|account\s+|wallet\s+)*"
+        r"(balance|balances)\??$")),
+    ('balance', re.compile(r"^how much (money )?(do i have|have i got|is in my (account|wallet))\??$")),
+    ('recent_transactions', re.compile(
+        r"^(show|list|get|see|view)?\s*(me\s+)?(my\s+)?(last|latest|recent|most recent)\s*(?P<count>\d+)?\s*"
+        r"(transactions|payments|purchases|activity)\??$")),
+    ('list_payees', re.compile(
+        r"^(list|show|get|who are)?\s*(me\s+)?(the\s+|all\s+)?(other\s+)?(users|people|contacts|payees)"
+        r"( (i|that i) can (pay|send money to|transfer to))?\??$")),
+    ('list_payees', re.compile(r"^who can i (pay|send money to|transfer (money )?to)\??$")),
+]
+
+EXAMPLES = {
+    'balance': [
+        "what is my balance", "how much money do i have", "check my balance", "what's in my account",
+        "how much is in my wallet", "my current balance please", "account balance",
+        "what is my debit balance", "show my savings balance",
+    ],
+    'recent_transactions': [
+        "show my last transactions", "what did i spend recently", "my recent purchases",
+        "list my latest payments", "what are my most recent transactions", "recent activity on my account",
+        "show my transaction history",
+    ],
+    'list_payees': [
+        "list users i can pay", "who can i send money to", "show me the other users", "list my contacts",
+        "which people can i transfer to", "show all users",
+    ],
+}
+
+# Any of these means the request is more than a lookup
+AGENT_ONLY = re.compile(
+    r"\$\s*\d|\d+\s*(dollars|bucks)|\b(send|transfer|pay|move|split|refund)\b.*\b(to|for)\b|"
+    r"\b(why|should|could|would|if|advice|advise|budget|afford|compare|predict|plan|and|but|then|also)\b"
+)
+WORD = re.compile(r"[a-z']+")
+# A qualifier narrows a lookup to a merchant, period or person; "in my account" does not
+QUALIFIER = re.compile(r"\b(for|in|from|at|on|since|during|before|after|between|with|by|about|to)\b")
+ACCOUNT_PHRASE = re.compile(r"\b(in|on) my (account|wallet)\b")
+# Words that change nothing about a lookup, allowed even if no example uses them
+FILLER = {'please', 'pls', 'thanks', 'thank', 'hi', 'hey', 'hello', 'the', 'a', 'now', 'again', 'quickly'}
+
+
+def _tokens(text):
+    return [token.strip("'") for token in WORD.findall(text.lower()) if token.strip("'")]
+
+
+class ExampleClassifier:
+    """Cosine similarity of tf-idf word vectors against labelled examples"""
+
+    def __init__(self, examples):
+        documents = [(intent, Counter(_tokens(text))) for intent, texts in examples.items() for text in texts]
+        frequency = Counter(token for _, counts in documents for token in counts)
+        self.idf = {token: math.log((1 + len(documents)) / (1 + count)) + 1 for token, count in frequency.items()}
+        self.examples = [(intent, self._vector(counts)) for intent, counts in documents]
+
+    def _vector(self, counts):
+        vector = {token: count * self.idf.get(token, 0.0) for token, count in counts.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+        return {token: value / norm for token, value in vector.items()}
+
+    def classify(self, text):
+        """(intent, similarity, margin over the best other intent)"""
+        counts = Counter(_tokens(text))
+        unknown = sum(count for token, count in counts.items() if token not in self.idf)
+        vector = self._vector(counts)
+        best = {}
+        for intent, example in self.examples:
+            score = sum(value * example.get(token, 0.0) for token, value in vector.items())
+            best[intent] = max(best.get(intent, 0.0), score)
+        ranked = sorted(best.items(), key=lambda item: -item[1])
+        intent, score = ranked[0]
+        # Words the classifier has never seen mean it cannot vouch for the message
+        score *= len(counts) / (len(counts) + unknown) if counts else 0.0
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        return intent, score, score - runner_up
+
+
+classifier = ExampleClassifier(EXAMPLES)
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def record(path):
+    """Count one message served by path (an intent name, or 'agent')"""
+    with _stats_lock:
+        _stats[path] += 1
+
+
+def stats():
+    """Messages per path and the fraction served without the agent"""
+    with _stats_lock:
+        counts = dict(_stats)
+    total = sum(counts.values())
+    fast = total - counts.get('agent', 0)
+    return {"messages": total, "paths": counts, "fast_path_ratio": round(fast / total, 3) if total else None}
+
+
+def route(message):
+    """(intent, params) for a message the fast path can answer, else None"""
+    text = " ".join(message.lower().strip().rstrip('.!').split())
+    if not text or len(text) > 80:
+        return None
+    for intent, pattern in RULES:
+        match = pattern.match(text)
+        if match:
+            count = match.groupdict().get('count')
+            return intent, {"count": int(count)} if count else {}
+    if AGENT_ONLY.search(text) or QUALIFIER.search(ACCOUNT_PHRASE.sub(' ', text)):
+        return None
+    if any(token not in classifier.idf and token not in FILLER for token in _tokens(text)):
+        return None
+    intent, score, margin = classifier.classify(text)
+    if score >= MIN_SIMILARITY and margin >= MIN_MARGIN:
+        return intent, {}
+    return None
+
+
+def _money(value):
+    return f"${float(value or 0):,.2f}"
+
+
+def answer(intent, params, user_id):
+    """The reply for a routed message, from the data layer only"""
+    if intent == 'balance':
+        wallet = db.get_wallet(user_id, 'debit_balance,credit_balance,saving_balance')
+        if not wallet:
+            return "I couldn't find a wallet for your account."
+        return (f"Your debit balance is {_money(wallet['debit_balance'])}, credit balance "
+                f"{_money(wallet['credit_balance'])} and savings {_money(wallet['saving_balance'])}.")
+    if intent == 'recent_transactions':
+        count = max(1, min(params.get('count', DEFAULT_TRANSACTIONS), MAX_TRANSACTIONS))
+        rows = db.list_transactions(user_id, HISTORY_COLUMNS, limit=count)
+        if not rows:
+            return "You don't have any transactions yet."
+        lines = [f"- {row['created_at'][:10]} {row['description']}: {_money(row['amount'])}" for row in rows]
+        return f"Your last {len(rows)} transaction{'s' if len(rows) != 1 else ''}:\n" + "\n".join(lines)
+    if intent == 'list_payees':
+        users = list_users_compact(exclude_user_id=user_id)
+        if not users:
+            return "There are no other users to pay yet."
+        return "You can send money to:\n" + "\n".join(f"- {user['name']}" for user in users) + \
+            "\nTell me who to pay and how much."
+    raise ValueError(f"Unknown intent: {intent}")
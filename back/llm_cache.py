@@ -0,0 +1,139 @@
+"""Exact-match LLM response cache for deterministic (temperature 0) chat models
+
+``SQLiteLLMCache`` is a LangChain ``BaseCache``: set as a chat model's
+``cache``, it is consulted on every call of that model, including inside
+``prompt_template | llm`` chains and ``with_structured_output``. LangChain
+passes the rendered prompt (the serialized messages) and an ``llm_string``
+holding the model name, its parameters and any bound tools or output schema;
+the cache key is the sha256 of both, so a hit needs the same model, params,
+prompt and schema.
+
+Entries live in a local SQLite file shared by every worker on the host.
+Every 100 writes the least recently used entries beyond ``LLM_CACHE_SIZE``
+are evicted. Generations are stored as plain JSON (text, or an AI message's
+content, tool calls and kwargs) and rebuilt on lookup, so nothing but
+``ChatGeneration`` / ``Generation`` / ``AIMessage`` is ever revived. Only attach it to models whose output is a function of the
+prompt (temperature 0); ``LLM_CACHE=0`` turns it off.
+"""
+import os
+import time
+import json
+import hashlib
+import sqlite3
+import threading
+from langchain_core.caches import BaseCache
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+ENABLED = os.getenv('LLM_CACHE', '1') == '1'
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'llm_cache.db')
+LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '10000'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    generations TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used);
+"""
+
+
+def cache_key(prompt, llm_string):
+    return hashlib.sha256(f"{llm_string}\0{prompt}".encode('utf-8')).hexdigest()
+
+
+def dump_generations(generations):
+    """The fields of each generation that a cached call needs, as JSON"""
+    entries = []
+    for generation in generations:
+        if isinstance(generation, ChatGeneration):
+            message = generation.message
+            entries.append({
+                "content": message.content,
+                "tool_calls": getattr(message, 'tool_calls', []),
+                "additional_kwargs": message.additional_kwargs,
+            })
+        else:
+            entries.append({"text": generation.text})
+    return json.dumps(entries, default=str)
+
+
+def load_generations(value):
+    """Rebuild the generations written by dump_generations"""
+    entries = json.loads(value)
+    if not isinstance(entries, list):
+        raise ValueError("not a list of generations")
+    generations = []
+    for entry in entries:
+        if "text" in entry:
+            generations.append(Generation(text=entry["text"]))
+        else:
+            message = AIMessage(content=entry["content"], tool_calls=entry["tool_calls"],
+                                additional_kwargs=entry["additional_kwargs"])
+            generations.append(ChatGeneration(message=message))
+    return generations
+
+
+class SQLiteLLMCache(BaseCache):
+    """Size-bounded LRU LangChain cache in a SQLite file"""
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=LLM_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.counters = {"hits": 0, "misses": 0, "writes": 0}
+
+    def lookup(self, prompt, llm_string):
+        key = cache_key(prompt, llm_string)
+        with self.lock:
+            row = self.conn.execute("SELECT generations FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            try:
+                generations = load_generations(row[0])
+            except (ValueError, KeyError):
+                # An entry in an older format: a miss that the next update overwrites
+                self.counters["misses"] += 1
+                return None
+            self.conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.counters["hits"] += 1
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        key = cache_key(prompt, llm_string)
+        generations = dump_generations(return_val)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, generations, last_used) VALUES (?, ?, ?)",
+                (key, generations, time.time())
+            )
+            self.counters["writes"] += 1
+            if self.counters["writes"] % 100 == 0:
+                self._evict()
+
+    def _evict(self):
+        excess = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)", (excess,)
+            )
+
+    def clear(self, **kwargs):
+        with self.lock:
+            self.conn.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return dict(self.counters, entries=entries)
+
+
+def get_cache():
+    """The host-wide cache, or None when LLM_CACHE=0"""
+    if not ENABLED:
+        return None
+    return SQLiteLLMCache(os.getenv('LLM_CACHE_PATH', DEFAULT_PATH))
@@ -0,0 +1,257 @@
+"""Prometheus metrics for the HTTP routes and their upstream calls
+
+``init_app`` adds request hooks to the Flask app (asgi.py calls
+``start_request`` / ``end_request`` itself for the routes it serves on the
+event loop). Per route template (``/api/users/<user_id>``, so the label set
+stays small) it records:
+
+- ``http_request_duration_seconds``: latency histogram by method and route,
+  up to the end of the body for streamed responses
+- ``http_requests_total``: responses by method, route and status code
+- ``http_requests_in_flight``: requests being served by method and route
+
+``upstream_call_duration_seconds`` is a histogram of every database round
+trip (labelled with the backend, e.g. ``supabase``), LLM call and embedding
+request, by the route that made it (``none`` for background work); its
+``_count`` is the number of calls. ``render()`` produces the text exposition
+format served at ``/metrics``.
+
+Everything is plain dicts behind one lock, so a request costs a few
+microseconds (bench_metrics.py). Metrics are per process; with several
+workers, scrape each one or aggregate in Prometheus.
+"""
+import time
+import bisect
+import threading
+import contextvars
+import db
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+UPSTREAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Route template of the request being served in this context
+current_route = contextvars.ContextVar('current_route', default='none')
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Bucket counts, sum and count per label tuple"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                yield f"{self.name}_bucket", labels + (_bound(bound),), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class Counter:
+    """A number per label tuple that only goes up (or, as a gauge, up and down)"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, labels, amount=1):
+        with _lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.series.items():
+            yield self.name, labels, value
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+
+def _bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by route',
+                            ('method', 'route'), REQUEST_BUCKETS)
+REQUESTS = Counter('http_requests_total', 'Responses by route and status code', ('method', 'route', 'status'))
+IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests being served by route', ('method', 'route'))
+UPSTREAM_LATENCY = Histogram('upstream_call_duration_seconds', 'Database, LLM and embedding calls by route',
+                             ('upstream', 'route'), UPSTREAM_BUCKETS)
+METRICS = (REQUEST_LATENCY, REQUESTS, IN_FLIGHT, UPSTREAM_LATENCY)
+
+
+def start_request(method, route):
+    """Count a request in flight; pass the result to end_request"""
+    IN_FLIGHT.inc((method, route))
+    token = current_route.set(route)
+    return method, route, time.perf_counter(), token
+
+
+def end_request(started, status):
+    method, route, start, token = started
+    elapsed = time.perf_counter() - start
+    if token is not None:
+        try:
+            current_route.reset(token)
+        except ValueError:
+            # Ended in another context (e.g. a streamed response finished elsewhere)
+            current_route.set('none')
+    IN_FLIGHT.inc((method, route), -1)
+    REQUEST_LATENCY.observe((method, route), elapsed)
+    REQUESTS.inc((method, route, str(status)))
+
+
+def observe_upstream(upstream, seconds):
+    """Record one call to an upstream service made on behalf of the current route"""
+    UPSTREAM_LATENCY.observe((upstream, current_route.get()), seconds)
+
+
+db.on_round_trip(observe_upstream)
+
+
+class RecordedResponse:
+    """WSGI response iterable that runs under the request's route and ends it on close()"""
+
+    def __init__(self, response, started, status):
+        self.response = response
+        self.iterator = iter(response)
+        self.route = started[1]
+        self.started = started
+        self.status = status
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = current_route.set(self.route)
+        try:
+            return next(self.iterator)
+        finally:
+            current_route.reset(token)
+
+    def close(self):
+        try:
+            close = getattr(self.response, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            started, self.started = self.started, None
+            if started is not None:
+                end_request(started, self.status[0])
+
+
+def init_app(app):
+    """Record every request the Flask app serves"""
+    from flask import request
+    wsgi_app = app.wsgi_app
+
+    @app.before_request
+    def _start_request():
+        rule = request.url_rule
+        request.environ['metrics.started'] = start_request(request.method, rule.rule if rule else 'unmatched')
+
+    def recorded(environ, start_response):
+        status = [500]
+
+        def recording(line, headers, exc_info=None):
+            status[0] = line.split(' ', 1)[0]
+            return start_response(line, headers, exc_info)
+
+        try:
+            response = wsgi_app(environ, recording)
+        except BaseException:
+            started = environ.pop('metrics.started', None)
+            if started is not None:
+                end_request(started, status[0])
+            raise
+        started = environ.pop('metrics.started', None)
+        if started is None:
+            return response
+        # The body (a stream_with_context generator for SSE) is produced after
+        # we return: the request ends when the server closes it
+        current_route.reset(started[3])
+        return RecordedResponse(response, started[:3] + (None,), status)
+
+    # A WSGI wrapper rather than after/teardown hooks: it reads the status
+    # without going through request-local proxies, which is most of the cost
+    app.wsgi_app = recorded
+
+
+_llm_handler = None
+
+
+def llm_callbacks():
+    """Callbacks that record each call of the chat model they are attached to"""
+    global _llm_handler
+    if _llm_handler is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class LLMCallMetrics(BaseCallbackHandler):
+            run_inline = True
+
+            def __init__(self):
+                self.running = {}
+
+            def on_chat_model_start(self, serialized, messages, run_id=None, **kwargs):
+                self.running[run_id] = (time.perf_counter(), current_route.get())
+
+            def on_llm_start(self, serialized, prompts, run_id=None, **kwargs):
+                self.running[run_id] = (time.perf_counter(), current_route.get())
+
+            def on_llm_end(self, response, run_id=None, **kwargs):
+                self._end(run_id)
+
+            def on_llm_error(self, error, run_id=None, **kwargs):
+                self._end(run_id)
+
+            def _end(self, run_id):
+                start, route = self.running.pop(run_id, (None, None))
+                if start is not None:
+                    UPSTREAM_LATENCY.observe(('llm', route), time.perf_counter() - start)
+
+        _llm_handler = LLMCallMetrics()
+    return [_llm_handler]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for metric in METRICS:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                keys = metric.labels + (('le',) if name.endswith('_bucket') else ())
+                lines.append(f"{name}{{{_labels(keys, labels)}}} {value}")
+    return "\n".join(lines) + "\n"
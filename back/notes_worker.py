@@ -0,0 +1,353 @@
+"""Background note-taking over users' transactions
+
+Running ``make_note`` and ``update_notes`` inline costs two LLM calls per
+transaction, each with the whole (growing) notes document in the prompt. The
+``NotesWorker`` instead keeps one notes document per user and folds up to
+``NOTES_BATCH_SIZE`` new transactions into it with a single ``update_notes``
+call, on a background thread.
+
+- Writes to the transactions table queue the user (``db.on_write``); the
+  worker reads everything after the user's watermark, oldest first, so a
+  burst of transactions becomes one call.
+- ``backfill(user_ids)`` queues whole histories at low priority: backfill
+  batches are at least ``NOTES_BACKFILL_INTERVAL_SECONDS`` apart. No batch
+  starts while ``busy()`` (agent turns in progress) is true, so note-taking
+  never competes with chat for the LLM.
+- Rows inserted behind the watermark (imports and other backdated
+  ``created_at`` values) would never be read past it, so ``db.on_insert``
+  adds their ids to the user's backlog, which is folded in before the rows
+  past the watermark.
+- Notes, the (created_at, transaction_id) watermark, the backlog and a
+  version number are persisted in a local SQLite file; a save only succeeds
+  against the version it started from, so two workers never interleave
+  updates of one user.
+- Saved notes are passed to ``on_saved``; the shared worker indexes them
+  for retrieval with ``vector_index.index_notes``.
+
+Disabled unless ``NOTES_WORKER=1``: it spends LLM calls on every user.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import deque
+import db
+import vector_index
+
+ENABLED = os.getenv('NOTES_WORKER', '0') == '1'
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'notes.db')
+NOTES_BATCH_SIZE = int(os.getenv('NOTES_BATCH_SIZE', '25'))
+NOTES_DEBOUNCE_SECONDS = float(os.getenv('NOTES_DEBOUNCE_SECONDS', '2'))
+NOTES_BACKFILL_INTERVAL_SECONDS = float(os.getenv('NOTES_BACKFILL_INTERVAL_SECONDS', '5'))
+NOTES_COLUMNS = 'transaction_id,created_at,description,amount,category,recipient,note'
+EMPTY_NOTES = "No history yet"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    user_id TEXT PRIMARY KEY,
+    notes TEXT NOT NULL,
+    watermark_created_at TEXT,
+    watermark_id TEXT,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    backlog TEXT NOT NULL DEFAULT '[]'
+);
+"""
+
+
+def format_transaction(row):
+    """One line per transaction, in the format the notes prompt expects"""
+    line = f"{row['created_at'][:16].replace('T', ' ')}: {row['description']}, '{row.get('recipient') or row.get('category')}', ${row['amount']}"
+    return f"{line} ({row['note']})" if row.get('note') else line
+
+
+def default_update(transactions, notes):
+    from utils import update_notes
+    return update_notes(transactions, notes)
+
+
+class NotesStore:
+    """Versioned per-user notes on disk"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(notes)")]
+        if 'backlog' not in columns:
+            # Stores created before the backlog existed
+            self.conn.execute("ALTER TABLE notes ADD COLUMN backlog TEXT NOT NULL DEFAULT '[]'")
+
+    def get(self, user_id):
+        """{notes, watermark, backlog, version, updated_at}; version 0 if the user has none yet"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT notes, watermark_created_at, watermark_id, backlog, version, updated_at FROM notes "
+                "WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        if row is None:
+            return {"notes": [], "watermark": None, "backlog": [], "version": 0, "updated_at": None}
+        notes, created_at, transaction_id, backlog, version, updated_at = row
+        return {
+            "notes": json.loads(notes),
+            "watermark": (created_at, transaction_id) if created_at else None,
+            "backlog": json.loads(backlog),
+            "version": version,
+            "updated_at": updated_at,
+        }
+
+    def save(self, user_id, notes, watermark, version, backlog=()):
+        """Store notes if the user is still at version; the new version, or None on a conflict"""
+        with self.lock:
+            if version == 0:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO notes (user_id, notes, watermark_created_at, watermark_id, version, "
+                    "updated_at, backlog) VALUES (?, ?, ?, ?, 1, ?, ?)",
+                    (user_id, json.dumps(notes), watermark[0], watermark[1], time.time(), json.dumps(list(backlog)))
+                )
+            else:
+                cursor = self.conn.execute(
+                    "UPDATE notes SET notes = ?, watermark_created_at = ?, watermark_id = ?, backlog = ?, "
+                    "version = version + 1, updated_at = ? WHERE user_id = ? AND version = ?",
+                    (json.dumps(notes), watermark[0], watermark[1], json.dumps(list(backlog)), time.time(), user_id,
+                     version)
+                )
+        return version + 1 if cursor.rowcount else None
+
+    def add_backlog(self, user_id, rows):
+        """Queue the ids of rows at or behind the user's watermark; True if any were"""
+        while True:
+            state = self.get(user_id)
+            watermark = state["watermark"]
+            if watermark is None:
+                # Nothing folded yet: the next batch reads from the start anyway
+                return False
+            behind = [row['transaction_id'] for row in rows
+                      if (row['created_at'], row['transaction_id']) <= watermark
+                      and row['transaction_id'] not in state["backlog"]]
+            if not behind:
+                return False
+            # Bumping the version makes a batch saved meanwhile retry with the new backlog
+            with self.lock:
+                cursor = self.conn.execute(
+                    "UPDATE notes SET backlog = ?, version = version + 1 WHERE user_id = ? AND version = ?",
+                    (json.dumps(state["backlog"] + behind), user_id, state["version"])
+                )
+            if cursor.rowcount:
+                return True
+
+    def discard(self, user_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM notes WHERE user_id = ?", (user_id,))
+
+
+class NotesWorker:
+    """Folds users' new transactions into their notes on a background thread
+
+    ``update(transactions, notes)`` takes formatted transaction lines and the
+    current notes (a list, or EMPTY_NOTES) and returns the new notes list;
+    ``on_saved(user_id, notes)`` runs after each successful save.
+    """
+
+    def __init__(self, store, update=default_update, batch_size=NOTES_BATCH_SIZE,
+                 debounce=NOTES_DEBOUNCE_SECONDS, backfill_interval=NOTES_BACKFILL_INTERVAL_SECONDS, busy=None,
+                 on_saved=None):
+        self.store = store
+        self.update = update
+        self.on_saved = on_saved
+        self.batch_size = batch_size
+        self.debounce = debounce
+        self.backfill_interval = backfill_interval
+        self.busy = busy or (lambda: False)
+        self.cond = threading.Condition()
+        self.live = {}  # user_id -> monotonic time it was first queued
+        self.backfills = deque()
+        self.queued_backfills = set()
+        self.last_backfill = 0.0
+        self.thread = None
+        self.stopping = False
+        self.stats = {"batches": 0, "transactions": 0, "conflicts": 0, "errors": 0, "index_errors": 0}
+
+    def start(self):
+        with self.cond:
+            if self.thread is None:
+                self.stopping = False
+                self.thread = threading.Thread(target=self._run, name='notes-worker', daemon=True)
+                self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def enqueue(self, user_id):
+        """Fold the user's new transactions in soon"""
+        with self.cond:
+            self.live.setdefault(user_id, time.monotonic())
+            self.cond.notify()
+
+    def backfill(self, user_ids):
+        """Queue whole histories at background priority"""
+        with self.cond:
+            for user_id in user_ids:
+                if user_id not in self.queued_backfills:
+                    self.queued_backfills.add(user_id)
+                    self.backfills.append(user_id)
+            self.cond.notify()
+
+    def pending(self):
+        with self.cond:
+            return len(self.live) + len(self.backfills)
+
+    def _next(self):
+        """(user_id, is_backfill) of the next job, waiting until one is due"""
+        with self.cond:
+            while not self.stopping:
+                now = time.monotonic()
+                due = [user_id for user_id, queued in self.live.items() if now - queued >= self.debounce]
+                wait = None
+                if self.live and not due:
+                    wait = self.debounce - (now - min(self.live.values()))
+                if (due or self.backfills) and self.busy():
+                    wait = 0.1
+                elif due:
+                    del self.live[due[0]]
+                    return due[0], False
+                elif self.backfills:
+                    gap = self.backfill_interval - (now - self.last_backfill)
+                    if gap <= 0:
+                        self.last_backfill = now
+                        user_id = self.backfills.popleft()
+                        self.queued_backfills.discard(user_id)
+                        return user_id, True
+                    wait = gap if wait is None else min(wait, gap)
+                self.cond.wait(wait)
+        return None, False
+
+    def _run(self):
+        while True:
+            user_id, is_backfill = self._next()
+            if user_id is None:
+                return
+            try:
+                more = self.process(user_id)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Notes update failed for {user_id}: {e}")
+                continue
+            if more:
+                if is_backfill:
+                    self.backfill([user_id])
+                else:
+                    self.enqueue(user_id)
+
+    def process(self, user_id):
+        """Fold the next batch of the user's transactions into their notes; True if more remain"""
+        state = self.store.get(user_id)
+        backlog = state["backlog"][self.batch_size:]
+        if state["backlog"]:
+            # Rows written behind the watermark first; the watermark stays where it is
+            rows = db.get_transactions(user_id, state["backlog"][:self.batch_size], NOTES_COLUMNS)
+            watermark = state["watermark"]
+            more = True
+        else:
+            rows = db.list_transactions_page(
+                user_id, NOTES_COLUMNS, descending=False, after=state["watermark"], limit=self.batch_size
+            )
+            if not rows:
+                return False
+            watermark = (rows[-1]['created_at'], rows[-1]['transaction_id'])
+            more = len(rows) == self.batch_size
+        notes = state["notes"]
+        if rows:
+            notes = self.update([format_transaction(row) for row in rows], notes or EMPTY_NOTES)
+        if self.store.save(user_id, notes, watermark, state["version"], backlog) is None:
+            # Another worker folded this batch in first; pick up from its watermark
+            self.stats["conflicts"] += 1
+            return True
+        self.stats["batches"] += 1
+        self.stats["transactions"] += len(rows)
+        if self.on_saved is not None:
+            # The notes are saved: a failure here must not stop the rest of the backlog
+            try:
+                self.on_saved(user_id, notes)
+            except Exception as e:
+                self.stats["index_errors"] += 1
+                print(f"Notes indexing failed for {user_id}: {e}")
+        return more
+
+    def drain(self, user_id):
+        """Process the user's whole backlog in the calling thread"""
+        while self.process(user_id):
+            pass
+        return self.store.get(user_id)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = NotesWorker(NotesStore(os.getenv('NOTES_STORE_PATH', DEFAULT_PATH)),
+                                  on_saved=vector_index.index_notes)
+        return _worker
+
+
+def start(busy=None):
+    """Start the shared worker and queue users whenever their transactions change"""
+    worker = get_worker()
+    if busy is not None:
+        worker.busy = busy
+    worker.start()
+    return worker
+
+
+@db.on_write
+def _queue_changed_users(table, user_ids):
+    if table == 'transactions' and _worker is not None and _worker.thread is not None:
+        for user_id in user_ids:
+            if user_id:
+                _worker.enqueue(user_id)
+
+
+@db.on_insert
+def _backlog_backdated_rows(table, rows):
+    if table != 'transactions' or _worker is None:
+        return
+    by_user = {}
+    for row in rows:
+        if row.get('user_id') and row.get('created_at') and row.get('transaction_id'):
+            by_user.setdefault(row['user_id'], []).append(row)
+    for user_id, user_rows in by_user.items():
+        _worker.store.add_backlog(user_id, user_rows)
+
+
+def get_notes(user_id):
+    """The user's persisted notes state"""
+    return get_worker().store.get(user_id)
+
+
+if __name__ == "__main__":
+    import argparse
+    import clients
+
+    parser = argparse.ArgumentParser(description="Backfill notes for every user (or the given ones)")
+    parser.add_argument('user_ids', nargs='*')
+    args = parser.parse_args()
+
+    worker = get_worker()
+    for user_id in args.user_ids or [user['user_id'] for user in db.list_users('user_id')]:
+        state = worker.drain(user_id)
+        print(f"{user_id}: version {state['version']}, {len(state['notes'])} notes")
+    if clients.status().get('embeddings'):
+        print("Embedding cache:", clients.get('embeddings').stats())
@@ -0,0 +1,41 @@
+"""Routing decisions of the intent fast path: python -m unittest test_intents"""
+import unittest
+import intents
+
+
+class RouteTest(unittest.TestCase):
+
+    def assertRoutes(self, message, intent, params=None):
+        self.assertEqual(intents.route(message), (intent, params or {}), message)
+
+    def assertAgent(self, message):
+        self.assertIsNone(intents.route(message), message)
+
+    def test_lookups_take_the_fast_path(self):
+        self.assertRoutes("What's my balance?", 'balance')
+        self.assertRoutes("how much is in my wallet", 'balance')
+        self.assertRoutes("what's in my account", 'balance')
+        self.assertRoutes("what is my balance please", 'balance')
+        self.assertRoutes("show my last 5 transactions", 'recent_transactions', {"count": 5})
+        self.assertRoutes("my recent purchases", 'recent_transactions')
+        self.assertRoutes("recent activity on my account", 'recent_transactions')
+        self.assertRoutes("who can I send money to", 'list_payees')
+        self.assertRoutes("list users I can pay", 'list_payees')
+
+    def test_qualified_lookups_go_to_the_agent(self):
+        self.assertAgent("show my recent amazon purchases")
+        self.assertAgent("show my transaction history for march")
+        self.assertAgent("what are my most recent transactions in march")
+        self.assertAgent("show my payments since monday")
+        self.assertAgent("recent transactions from bob")
+
+    def test_open_requests_go_to_the_agent(self):
+        self.assertAgent("How am I doing this month?")
+        self.assertAgent("Why did my spending go up?")
+        self.assertAgent("send $20 to Bob")
+        self.assertAgent("Can I afford a vacation in June?")
+        self.assertAgent("what is my balance and my recent purchases")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""Round trips through the LLM response cache: python -m unittest test_llm_cache"""
+import unittest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+from llm_cache import SQLiteLLMCache, cache_key
+
+
+class LLMCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SQLiteLLMCache(':memory:')
+
+    def test_chat_generation_round_trip(self):
+        message = AIMessage(content="Groceries", tool_calls=[
+            {"name": "Category", "args": {"category": "Groceries"}, "id": "call-1", "type": "tool_call"}
+        ])
+        self.cache.update("prompt", "model", [ChatGeneration(message=message)])
+        generations = self.cache.lookup("prompt", "model")
+        self.assertEqual(len(generations), 1)
+        self.assertIsInstance(generations[0], ChatGeneration)
+        self.assertEqual(generations[0].message.content, "Groceries")
+        self.assertEqual(generations[0].message.tool_calls, message.tool_calls)
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 0, "writes": 1, "entries": 1})
+
+    def test_text_generation_round_trip(self):
+        self.cache.update("prompt", "model", [Generation(text="plain")])
+        self.assertEqual([g.text for g in self.cache.lookup("prompt", "model")], ["plain"])
+
+    def test_other_model_or_prompt_misses(self):
+        self.cache.update("prompt", "model", [Generation(text="plain")])
+        self.assertIsNone(self.cache.lookup("prompt", "other model"))
+        self.assertIsNone(self.cache.lookup("other prompt", "model"))
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_unreadable_entry_counts_as_a_miss(self):
+        self.cache.conn.execute("INSERT INTO llm_cache VALUES (?, ?, 0)",
+                                (cache_key("prompt", "model"), '{"lc": 1}'))
+        self.assertIsNone(self.cache.lookup("prompt", "model"))
+        self.assertEqual(self.cache.stats()["hits"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Loading the user name index from the database: python -m unittest test_user_index"""
+import unittest
+from unittest import mock
+from bench_utils import offline_environment
+
+offline_environment()
+
+import db
+from user_index import UserNameIndex
+
+
+class CappedBackend:
+    """Passes calls through to the real backend, returning at most max_rows rows per select like PostgREST"""
+
+    def __init__(self, backend, max_rows):
+        self.backend = backend
+        self.max_rows = max_rows
+        self.selects = 0
+
+    def select(self, *args, **kwargs):
+        self.selects += 1
+        return self.backend.select(*args, **kwargs)[:self.max_rows]
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+class RebuildTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = db.get_backend()
+        self.backend.delete('users', [])
+        self.backend.insert('users', [{
+            "first_name": f"Name{i}", "last_name": "Pager", "email": f"pager{i}@example.com",
+            "age": 30, "interests": [], "clerk_id": f"clerk_pager_{i}",
+        } for i in range(250)])
+
+    def rebuilt_index(self, max_rows):
+        capped = CappedBackend(self.backend, max_rows)
+        with mock.patch.object(db, 'USERS_PAGE_SIZE', 100), mock.patch.object(db, 'get_backend', lambda: capped):
+            index = UserNameIndex()
+            index.rebuild()
+        return index, capped
+
+    def test_rebuild_reads_every_page(self):
+        index, capped = self.rebuilt_index(max_rows=1000)
+        self.assertEqual(len(index.users), 250)
+        self.assertEqual(capped.selects, 4)
+
+    def test_rebuild_survives_a_server_row_cap_below_the_page_size(self):
+        index, _ = self.rebuilt_index(max_rows=40)
+        self.assertEqual(len(index.users), 250)
+        self.assertEqual(len(index.search("pager", limit=1000)), 250)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+"""Per-request traces of agent turns and financial summaries
+
+``trace(kind, **attrs)`` wraps one request (an agent turn, a summary);
+streaming requests that span several blocks use ``Trace``, ``bound`` and
+``finish`` directly. While a trace is bound, the database round trips made in
+its context are counted, and the LangChain callbacks from ``Trace.config()``
+add a span for every LLM call (model, prompt/completion tokens, latency) and
+tool call (name, latency, round trips it made). ``Trace.span`` times any
+other step. When the request ends, a span for the whole request is added and
+the trace goes to a bounded in-memory ring buffer and, unless
+``TRACE_LOG_PATH`` is empty, one JSON line in a log file.
+
+Tool round trips are the request's counter before and after the tool, so
+tools running in parallel in one step may count each other's queries.
+``stats()`` gives p50/p95/p99 latency per step type (and per model or tool
+name) over the buffered traces.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+import db
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traces.jsonl')
+TRACE_LOG_PATH = os.getenv('TRACE_LOG_PATH', DEFAULT_PATH)
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '2000'))
+
+_buffer = deque(maxlen=TRACE_BUFFER_SIZE)
+_lock = threading.Lock()
+_sink = None
+
+
+class Trace:
+    """Spans recorded for one request"""
+
+    def __init__(self, kind, **attrs):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+        # Shared with db through db.current_round_trips, and with contexts copied from the request
+        self.round_trips = [0]
+        self.lock = threading.Lock()
+
+    def add(self, type, name, ms, **fields):
+        with self.lock:
+            self.spans.append({"type": type, "name": name, "ms": round(ms, 2), **fields})
+
+    @contextmanager
+    def span(self, type, name=None):
+        """Time a step that LangChain callbacks do not see"""
+        start, round_trips = time.perf_counter(), self.round_trips[0]
+        try:
+            yield
+        finally:
+            self.add(type, name, (time.perf_counter() - start) * 1000, round_trips=self.round_trips[0] - round_trips)
+
+    def config(self, callbacks=()):
+        """RunnableConfig that records this trace's LLM and tool spans"""
+        return {"callbacks": [*callbacks, TraceCallbackHandler(self)]}
+
+    def to_dict(self):
+        with self.lock:
+            return {"id": self.id, "kind": self.kind, "started_at": self.started_at, **self.attrs,
+                    "round_trips": self.round_trips[0], "spans": list(self.spans)}
+
+
+def _usage(response):
+    """(prompt_tokens, completion_tokens) of an LLMResult, None where unknown"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                return usage.get('input_tokens'), usage.get('output_tokens')
+    usage = (response.llm_output or {}).get('token_usage') or {}
+    return usage.get('prompt_tokens'), usage.get('completion_tokens')
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Adds an llm span per model call and a tool span per tool call to a Trace"""
+
+    run_inline = True
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.running = {}
+
+    def _start(self, run_id, name):
+        self.running[run_id] = (name, time.perf_counter(), self.trace.round_trips[0])
+
+    def _end(self, run_id):
+        name, start, round_trips = self.running.pop(run_id, (None, time.perf_counter(), 0))
+        return name, (time.perf_counter() - start) * 1000, self.trace.round_trips[0] - round_trips
+
+    def _model(self, serialized, kwargs):
+        params = kwargs.get('invocation_params') or {}
+        return params.get('model') or params.get('model_name') or params.get('_type') or \
+            ((serialized or {}).get('kwargs') or {}).get('model') or "llm"
+
+    def on_llm_start(self, serialized, prompts, run_id=None, **kwargs):
+        self._start(run_id, self._model(serialized, kwargs))
+
+    def on_chat_model_start(self, serialized, messages, run_id=None, **kwargs):
+        self._start(run_id, self._model(serialized, kwargs))
+
+    def on_llm_end(self, response, run_id=None, **kwargs):
+        name, ms, _ = self._end(run_id)
+        prompt_tokens, completion_tokens = _usage(response)
+        self.trace.add("llm", name, ms, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error, run_id=None, **kwargs):
+        name, ms, _ = self._end(run_id)
+        self.trace.add("llm", name, ms, error=str(error))
+
+    def on_tool_start(self, serialized, input_str, run_id=None, **kwargs):
+        self._start(run_id, (serialized or {}).get("name") or kwargs.get("name"))
+
+    def on_tool_end(self, output, run_id=None, **kwargs):
+        name, ms, round_trips = self._end(run_id)
+        self.trace.add("tool", name, ms, round_trips=round_trips)
+
+    def on_tool_error(self, error, run_id=None, **kwargs):
+        name, ms, round_trips = self._end(run_id)
+        self.trace.add("tool", name, ms, round_trips=round_trips, error=str(error))
+
+
+@contextmanager
+def bound(current):
+    """Count the database round trips made in this block (and contexts copied from it) on current"""
+    token = db.current_round_trips.set(current.round_trips)
+    try:
+        yield current
+    finally:
+        db.current_round_trips.reset(token)
+
+
+def finish(current, error=None):
+    """Add the span for the whole request and record the trace"""
+    if error is not None:
+        current.attrs["error"] = str(error)
+    current.add(current.kind, None, (time.perf_counter() - current.start) * 1000, round_trips=current.round_trips[0])
+    record(current)
+
+
+@contextmanager
+def trace(kind, **attrs):
+    """Trace the request run inside the block; yields the Trace"""
+    current = Trace(kind, **attrs)
+    error = None
+    try:
+        with bound(current):
+            yield current
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        finish(current, error)
+
+
+def record(finished):
+    """Keep a finished trace in the ring buffer and append it to the log file"""
+    global _sink
+    entry = finished.to_dict()
+    with _lock:
+        _buffer.append(entry)
+        if TRACE_LOG_PATH:
+            try:
+                if _sink is None:
+                    _sink = open(TRACE_LOG_PATH, 'a', encoding='utf-8')
+                _sink.write(json.dumps(entry, default=str) + "\n")
+                _sink.flush()
+            except OSError as e:
+                print(f"Could not write trace: {e}")
+
+
+def recent(limit=20, kind=None):
+    """The latest buffered traces, newest first"""
+    with _lock:
+        entries = list(_buffer)
+    entries = [entry for entry in reversed(entries) if kind is None or entry["kind"] == kind]
+    return entries[:limit]
+
+
+def _percentile(ordered, pct):
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def stats(kind=None):
+    """p50/p95/p99 latency per step type, and per type:name, over the buffered traces"""
+    with _lock:
+        entries = list(_buffer)
+    latencies = defaultdict(list)
+    for entry in entries:
+        if kind is not None and entry["kind"] != kind:
+            continue
+        for span in entry["spans"]:
+            latencies[span["type"]].append(span["ms"])
+            if span["name"]:
+                latencies[f"{span['type']}:{span['name']}"].append(span["ms"])
+    result = {}
+    for step, values in sorted(latencies.items()):
+        values.sort()
+        result[step] = {"count": len(values), "p50": _percentile(values, 50), "p95": _percentile(values, 95),
+                        "p99": _percentile(values, 99)}
+    return result
@@ -0,0 +1,213 @@
+"""Bulk transaction import from CSV or JSONL uploads
+
+``POST /api/transactions/<user_id>/import`` takes a bank statement as a file
+upload (``file`` field) or as the raw request body. Rows are parsed one at a
+time from the stream, validated, and written in batches of ``batch_size``
+through ``db.import_transactions``: one round trip per batch that inserts
+every row and applies the batch's net amount to the debit balance, instead
+of a wallet read, an insert and a wallet write per row.
+
+Memory use is bounded by the batch size and the error list, not the file
+size. The response reports rows imported and failed, the first
+``MAX_REPORTED_ERRORS`` per-row errors (with line numbers), batches, elapsed
+time and rows per second. A failure that stops the import (no wallet, an
+unreadable file, a database error) is reported as ``error`` alongside the
+counts, since the batches before it are already committed.
+
+Recognised columns (case-insensitive): description, amount (or separate
+debit/credit columns), date/created_at, category, payment_method,
+recipient (or merchant/payee), note (or memo).
+"""
+import io
+import csv
+import json
+import math
+import time
+from datetime import datetime, timezone
+import db
+
+BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+FORMATS = ('csv', 'jsonl')
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d')
+FIELD_ALIASES = {
+    'date': 'created_at',
+    'transaction_date': 'created_at',
+    'merchant': 'recipient',
+    'payee': 'recipient',
+    'memo': 'note',
+}
+TEXT_LIMITS = {'description': 255, 'category': 64, 'payment_method': 32, 'recipient': 255, 'note': 1000}
+
+
+class ImportAborted(Exception):
+    """A batch was rejected as a whole (e.g. the user has no wallet)"""
+
+
+def detect_format(filename=None, content_type=None, requested=None):
+    """csv or jsonl from an explicit format, the file extension or the content type"""
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+        return requested
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')) or 'json' in (content_type or ''):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_records(stream, fmt):
+    """(line number, raw dict or parse error) for each record, read incrementally"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e.msg}")
+            continue
+        yield line_number, record if isinstance(record, dict) else ValueError("Each line must be a JSON object")
+
+
+def parse_amount(value):
+    """Float from numbers or statement strings like '$1,234.50' or '(12.00)'"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        amount = float(value)
+    else:
+        text = str(value or '').strip().replace('$', '').replace(',', '')
+        negative = text.startswith('(') and text.endswith(')')
+        try:
+            amount = float(text.strip('()'))
+        except ValueError:
+            raise ValueError(f"amount must be a number, got {value!r}")
+        if negative:
+            amount = -amount
+    if not math.isfinite(amount):
+        raise ValueError("amount must be a finite number")
+    return round(amount, 2)
+
+
+def parse_date(value):
+    """ISO timestamp (UTC if no offset) for common statement date formats"""
+    text = str(value).strip()
+    try:
+        parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"Unrecognised date: {text}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.isoformat()
+
+
+def normalize_row(record):
+    """Validated transaction fields for one uploaded record; raises ValueError"""
+    fields = {}
+    for key, value in record.items():
+        if key is None:
+            raise ValueError("Row has more values than the header")
+        key = key.strip().lower()
+        fields[FIELD_ALIASES.get(key, key)] = value.strip() if isinstance(value, str) else value
+
+    if fields.get('amount') not in (None, ''):
+        amount = parse_amount(fields['amount'])
+    elif fields.get('debit') not in (None, '') or fields.get('credit') not in (None, ''):
+        amount = parse_amount(fields.get('credit') or 0) - abs(parse_amount(fields.get('debit') or 0))
+    else:
+        raise ValueError("amount is required")
+    if amount == 0:
+        raise ValueError("amount must not be zero")
+
+    description = fields.get('description')
+    if not description:
+        raise ValueError("description is required")
+
+    row = {
+        'description': description,
+        'amount': amount,
+        'category': fields.get('category') or 'Uncategorized',
+        'payment_method': fields.get('payment_method') or 'debit',
+        'transaction_type': 'income' if amount > 0 else 'expense',
+        'created_at': parse_date(fields['created_at']) if fields.get('created_at') else None,
+        'recipient': fields.get('recipient') or None,
+        'note': fields.get('note') or None,
+        'is_fraud': False,
+    }
+    for field, limit in TEXT_LIMITS.items():
+        if row[field] is not None and len(str(row[field])) > limit:
+            raise ValueError(f"{field} is longer than {limit} characters")
+    return row
+
+
+def import_stream(user_id, stream, fmt='csv', batch_size=BATCH_SIZE, adjust_balance=True):
+    """Import every valid record of stream for user_id and return the import report"""
+    started = time.perf_counter()
+    report = {
+        "rows": 0,
+        "imported": 0,
+        "failed": 0,
+        "batches": 0,
+        "net_amount": 0.0,
+        "balance": None,
+        "errors": [],
+    }
+
+    def fail(line, error):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line, "error": error})
+
+    def flush(batch):
+        try:
+            result = db.import_transactions(user_id, batch, adjust_balance)
+        except Exception as e:
+            # Network or PostgREST failure: earlier batches are committed, report what landed
+            raise ImportAborted(f"Import stopped after {report['imported']} rows: {e}") from e
+        if not result.get('success'):
+            raise ImportAborted(result.get('error', 'Import failed'))
+        report["batches"] += 1
+        report["imported"] += result['inserted']
+        report["net_amount"] = round(report["net_amount"] + float(result['net_amount']), 2)
+        report["balance"] = result['balance']
+
+    batch = []
+    try:
+        for line, record in iter_records(stream, fmt):
+            report["rows"] += 1
+            if isinstance(record, Exception):
+                fail(line, str(record))
+                continue
+            try:
+                batch.append(normalize_row(record))
+            except (ValueError, TypeError) as e:
+                fail(line, str(e))
+                continue
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    except ImportAborted as e:
+        report["error"] = str(e)
+    except UnicodeDecodeError:
+        report["error"] = "File is not valid UTF-8"
+    except csv.Error as e:
+        report["error"] = f"Could not read CSV after row {report['rows']}: {e}"
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["imported"] / elapsed, 1) if elapsed > 0 else None
+    return report
@@ -0,0 +1,196 @@
+"""Cursor-paginated, server-filtered transaction listing
+
+``GET /api/transactions/<user_id>/page`` returns one page of a user's
+transactions instead of the whole history. Pages are ordered by
+(sort column, transaction_id), which is unique and therefore stable, and
+the opaque ``cursor`` of a response encodes the last row's position in that
+order. The next page seeks past it on the (user_id, sort column,
+transaction_id) index, so every page has the same cost no matter how long
+the history is.
+
+Query parameters (all optional):
+
+- ``limit``: page size, default 25, at most 100
+- ``cursor``: ``next_cursor`` from the previous page
+- ``sort`` (created_at | amount) and ``order`` (desc | asc)
+- ``type``: income (amount >= 0) or expense (amount < 0)
+- ``category``: one or more categories, comma separated
+- ``from`` / ``to``: date or timestamp bounds on created_at (a bare ``to``
+  date includes that whole day)
+- ``min_amount`` / ``max_amount``: bounds on the absolute amount
+- ``q``: text matched as a substring of description, category and note, or
+  exactly against the amount (either sign): ``12`` finds 12.00 and -12.00
+  but not 112.50, unlike the old in-browser filter, since the amount is not
+  searchable as text on the server
+- ``fields``: columns to return, comma separated
+
+The first page (no ``cursor``) also carries ``totals``: income, expenses,
+net flow and count over every transaction matching the filters, computed
+by the database rather than summed over the rows loaded so far.
+"""
+import json
+import base64
+from datetime import date, datetime, timedelta
+import db
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+TRANSACTION_FIELDS = ('transaction_id', 'created_at', 'description', 'amount', 'category', 'payment_method',
+                      'transaction_type', 'recipient', 'note', 'is_fraud', 'wallet_id')
+SORT_FIELDS = ('created_at', 'amount')
+TRANSACTION_TYPES = ('income', 'expense')
+SEARCH_FIELDS = ('description', 'category', 'note')
+
+
+def encode_cursor(sort, descending, row):
+    payload = json.dumps([sort, descending, row[sort], row['transaction_id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort, descending):
+    """(sort value, transaction_id) from a cursor made for the same sort order"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, cursor_descending, value, transaction_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if (cursor_sort, cursor_descending) != (sort, descending):
+        raise ValueError("Cursor was issued for a different sort order")
+    return value, transaction_id
+
+
+def _number(args, name):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+
+def _timestamp(args, name, end_of_day=False):
+    """ISO bound for created_at; a bare date as ``to`` means the start of the next day"""
+    value = args.get(name)
+    if not value:
+        return None, None
+    try:
+        if len(value) == 10:
+            day = date.fromisoformat(value)
+            return ('lt', (day + timedelta(days=1)).isoformat()) if end_of_day else ('gte', day.isoformat())
+        return ('lte' if end_of_day else 'gte'), datetime.fromisoformat(value.replace('Z', '+00:00')).isoformat()
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date or timestamp")
+
+
+def amount_filters(transaction_type, low, high):
+    """Filters for the type (amount sign) and bounds on the absolute amount"""
+    income = [('amount', 'gte', 0)]
+    expense = [('amount', 'lt', 0)]
+    if low is not None:
+        income.append(('amount', 'gte', low))
+        expense.append(('amount', 'lte', -low))
+    if high is not None:
+        income.append(('amount', 'lte', high))
+        expense.append(('amount', 'gte', -high))
+    if transaction_type == 'income':
+        return income
+    if transaction_type == 'expense':
+        return expense
+    if low is None and high is None:
+        return []
+    return [(None, 'or', [income, expense])]
+
+
+def search_filters(text):
+    """Filters matching text in any searchable column, or an exact amount"""
+    text = text.replace('%', '').replace('*', '').strip()
+    if not text:
+        return []
+    groups = [[(field, 'ilike', f"%{text}%")] for field in SEARCH_FIELDS]
+    try:
+        amount = float(text.lstrip('$'))
+        groups += [[('amount', 'eq', amount)], [('amount', 'eq', -amount)]]
+    except ValueError:
+        pass
+    return [(None, 'or', groups)]
+
+
+def parse_page_request(args):
+    """Validate query parameters into keyword arguments for db.list_transactions_page
+
+    Raises ValueError with a message suitable for the client.
+    """
+    try:
+        limit = int(args.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    sort = args.get('sort', 'created_at')
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_FIELDS)}")
+    order = args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be asc or desc")
+    descending = order == 'desc'
+
+    transaction_type = args.get('type') or None
+    if transaction_type == 'all':
+        transaction_type = None
+    if transaction_type is not None and transaction_type not in TRANSACTION_TYPES:
+        raise ValueError(f"type must be one of: {', '.join(TRANSACTION_TYPES)}")
+
+    fields = [field.strip() for field in args.get('fields', '').split(',') if field.strip()]
+    unknown = [field for field in fields if field not in TRANSACTION_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if fields:
+        # The cursor and the type tag need these
+        fields = list(dict.fromkeys(fields + ['transaction_id', sort, 'amount']))
+        columns = ','.join(field for field in fields if field != 'transaction_type')
+    else:
+        fields, columns = list(TRANSACTION_FIELDS), '*'
+
+    filters = amount_filters(transaction_type, _number(args, 'min_amount'), _number(args, 'max_amount'))
+    categories = [category.strip() for category in args.get('category', '').split(',') if category.strip()]
+    if categories:
+        filters.append(('category', 'in', categories))
+    for name, end_of_day in (('from', False), ('to', True)):
+        op, value = _timestamp(args, name, end_of_day)
+        if op:
+            filters.append(('created_at', op, value))
+    filters += search_filters(args.get('q', ''))
+
+    cursor = args.get('cursor')
+    return {
+        'columns': columns,
+        'fields': fields,
+        'filters': filters,
+        'sort': sort,
+        'descending': descending,
+        'after': decode_cursor(cursor, sort, descending) if cursor else None,
+        'limit': limit,
+    }
+
+
+def list_transaction_page(user_id, args):
+    """{transactions, next_cursor} for one page described by request args, plus totals on the first page"""
+    query = parse_page_request(args)
+    rows = db.list_transactions_page(
+        user_id, query['columns'], query['filters'], query['sort'], query['descending'],
+        query['after'], query['limit'] + 1
+    )
+    page = rows[:query['limit']]
+    for row in page:
+        # Same rule the transactions page displays: the sign of the amount
+        if 'transaction_type' in query['fields']:
+            row['transaction_type'] = 'income' if row['amount'] >= 0 else 'expense'
+    has_more = len(rows) > query['limit']
+    result = {
+        "transactions": page,
+        "next_cursor": encode_cursor(query['sort'], query['descending'], page[-1]) if has_more else None,
+    }
+    if query['after'] is None:
+        result["totals"] = db.transaction_totals(user_id, query['filters'])
+    return result
@@ -0,0 +1,347 @@
+"""In-process name index for user search
+
+``/api/users/search`` used to fetch every column of every user and scan them
+in Python on each keystroke. ``UserNameIndex`` keeps only the searchable and
+returned fields in memory and indexes the distinct name tokens two ways:
+
+- a sorted token list, so exact and prefix matches are a bisect away
+- trigram -> tokens postings, so substring matches only look at tokens
+  sharing every trigram of the query, and fuzzy matches only score the
+  tokens with the most trigrams in common
+
+Both structures grow with the number of distinct first/last names rather
+than with the number of users, and candidates per query are capped, so
+search latency stays flat as the user base grows.
+
+``resolve_user`` is the agent's typo-tolerant lookup: it scores the closest
+tokens by edit similarity and returns the top few users in a compact form,
+cached per index version, so name resolution costs no database round trips.
+
+The index loads once, applies users written through ``db`` incrementally
+(``db.on_write``), picks up users created by other workers every
+``USER_INDEX_REFRESH_SECONDS`` and rebuilds fully every
+``USER_INDEX_REBUILD_SECONDS``.
+"""
+import os
+import time
+import bisect
+import heapq
+import threading
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from itertools import islice
+import db
+from cache import TTLCache
+
+INDEX_COLUMNS = 'user_id,first_name,last_name,email,created_at'
+RESULT_FIELDS = ('user_id', 'first_name', 'last_name', 'email')
+USER_INDEX_REFRESH_SECONDS = float(os.getenv('USER_INDEX_REFRESH_SECONDS', '30'))
+USER_INDEX_REBUILD_SECONDS = float(os.getenv('USER_INDEX_REBUILD_SECONDS', '3600'))
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_CANDIDATES = 500  # users considered per query part
+
+# Per query part: a token equal to it, starting with it, or containing it
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+SUBSTRING_SCORE = 1.0
+
+# Fuzzy resolution for the agent
+RESOLVE_LIMIT = 5
+FUZZY_TOKENS = 25  # closest name tokens considered per query word
+MIN_SIMILARITY = 0.6
+PREFIX_SIMILARITY = 0.85
+
+
+def tokenize(text):
+    return (text or '').lower().split()
+
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def padded_trigrams(token):
+    """Trigrams of the token with word boundaries, so short names and first letters count"""
+    return trigrams(f"  {token} ")
+
+
+def similarity(a, b):
+    """Typo-tolerant similarity of two name tokens in [0, 1]"""
+    if a == b:
+        return 1.0
+    ratio = SequenceMatcher(None, a, b).ratio()
+    # A partially typed name is a strong match for the full one
+    return max(ratio, PREFIX_SIMILARITY) if b.startswith(a) else ratio
+
+
+def full_name(user):
+    return f"{user.get('first_name') or ''} {user.get('last_name') or ''}".strip()
+
+
+class UserNameIndex:
+    """Token and trigram index over users' first and last names"""
+
+    def __init__(self, refresh_seconds=USER_INDEX_REFRESH_SECONDS, rebuild_seconds=USER_INDEX_REBUILD_SECONDS,
+                 clock=time.monotonic):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.pending = set()
+        self.version = 0  # bumped on every change, keys the resolver cache
+        self._reset()
+
+    def _reset(self):
+        self.users = {}  # user_id -> projected user row
+        self.sort_keys = {}  # user_id -> lowercase full name, for ordering ties
+        self.tokens = {}  # name token -> set of user_ids
+        self.sorted_tokens = []
+        self.postings = defaultdict(set)  # trigram (with word boundaries) -> set of name tokens
+        self.version += 1
+        self.watermark = None
+        self.loaded_at = None
+        self.refreshed_at = None
+
+    # Maintenance
+
+    def _add_token(self, token, user_id):
+        users = self.tokens.get(token)
+        if users is None:
+            users = self.tokens[token] = set()
+            bisect.insort(self.sorted_tokens, token)
+            for trigram in padded_trigrams(token):
+                self.postings[trigram].add(token)
+        users.add(user_id)
+
+    def _remove_token(self, token, user_id):
+        users = self.tokens.get(token)
+        if users is None:
+            return
+        users.discard(user_id)
+        if not users:
+            del self.tokens[token]
+            del self.sorted_tokens[bisect.bisect_left(self.sorted_tokens, token)]
+            for trigram in padded_trigrams(token):
+                self.postings[trigram].discard(token)
+                if not self.postings[trigram]:
+                    del self.postings[trigram]
+
+    def remove(self, user_id):
+        with self.lock:
+            user = self.users.pop(user_id, None)
+            if user is not None:
+                del self.sort_keys[user_id]
+                for token in set(tokenize(full_name(user))):
+                    self._remove_token(token, user_id)
+                self.version += 1
+
+    def upsert(self, user):
+        """Add a user row (with at least INDEX_COLUMNS) or replace the indexed copy"""
+        with self.lock:
+            user_id = user['user_id']
+            self.remove(user_id)
+            self.users[user_id] = {field: user.get(field) for field in RESULT_FIELDS}
+            self.sort_keys[user_id] = full_name(user).lower()
+            for token in set(tokenize(full_name(user))):
+                self._add_token(token, user_id)
+            self.version += 1
+            created_at = user.get('created_at')
+            if created_at and (self.watermark is None or created_at > self.watermark):
+                self.watermark = created_at
+
+    def mark_stale(self, user_ids):
+        with self.lock:
+            self.pending.update(user_ids)
+
+    def rebuild(self):
+        """Reload every user from the database"""
+        users = db.list_users(INDEX_COLUMNS)
+        with self.lock:
+            self._reset()
+            self.pending.clear()
+            for user in users:
+                self.upsert(user)
+            self.loaded_at = self.refreshed_at = self.clock()
+
+    def refresh(self):
+        """Bring the index up to date: full rebuild, pending writes, or users created elsewhere"""
+        with self.lock:
+            now = self.clock()
+            if self.loaded_at is None or now - self.loaded_at >= self.rebuild_seconds:
+                self.rebuild()
+                return self
+            if self.pending:
+                user_ids, self.pending = self.pending, set()
+                found = {user['user_id']: user for user in db.get_users(user_ids, INDEX_COLUMNS)}
+                for user_id in user_ids:
+                    if user_id in found:
+                        self.upsert(found[user_id])
+                    else:
+                        self.remove(user_id)
+            if now - self.refreshed_at >= self.refresh_seconds:
+                for user in db.list_users(INDEX_COLUMNS, since=self.watermark):
+                    self.upsert(user)
+                self.refreshed_at = now
+        return self
+
+    # Queries
+
+    def _match_part(self, part):
+        """[(score, user_ids)] for one query part, best tier first, about MAX_CANDIDATES users in total"""
+        tiers = []
+        total = 0
+
+        def collect(score, tokens):
+            nonlocal total
+            users = set()
+            for token in tokens:
+                room = MAX_CANDIDATES - total - len(users)
+                if room <= 0:
+                    break
+                token_users = self.tokens[token]
+                users.update(token_users if len(token_users) <= room else islice(token_users, room))
+            total += len(users)
+            tiers.append((score, users))
+
+        collect(EXACT_SCORE, [part] if part in self.tokens else [])
+        start = bisect.bisect_left(self.sorted_tokens, part)
+        end = bisect.bisect_left(self.sorted_tokens, part + '\uffff', start)
+        collect(PREFIX_SCORE, (token for token in self.sorted_tokens[start:end] if token != part))
+        if len(part) >= 3:
+            # Tokens sharing every trigram of the part, smallest posting list first
+            postings = sorted((self.postings.get(trigram, set()) for trigram in trigrams(part)), key=len)
+            candidates = set.intersection(*postings)
+            collect(SUBSTRING_SCORE, (token for token in candidates if part in token and not token.startswith(part)))
+        else:
+            # Too short to have a trigram: a token holding the part after its first letter has a
+            # trigram with a letter then the part, and there are only as many trigrams as the
+            # alphabet allows, however many users there are
+            size = len(part)
+            collect(SUBSTRING_SCORE, (token for trigram, tokens in self.postings.items()
+                                      if trigram[0] != ' ' and trigram[1:1 + size] == part
+                                      for token in tokens if not token.startswith(part)))
+        return tiers
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Users whose first or last name matches any word of query, best matches first
+
+        Users matching every word rank first (by summed score), then users
+        matching any word, exact before prefix before substring matches;
+        ties are broken alphabetically by name.
+        """
+        parts = list(dict.fromkeys(tokenize(query)))
+        if not parts:
+            return []
+        with self.lock:
+            matches = [self._match_part(part) for part in parts]
+            ranked = []
+            if len(parts) > 1:
+                every = set.intersection(*(set().union(*(users for _, users in tiers)) for tiers in matches))
+                scores = {user_id: sum(next(score for score, users in tiers if user_id in users) for tiers in matches)
+                          for user_id in every}
+                ranked = sorted(every, key=lambda user_id: (-scores[user_id], self.sort_keys[user_id]))[:limit]
+            chosen = set(ranked)
+            for tier in range(len(matches[0]) if len(parts) == 1 else 3):
+                if len(ranked) >= limit:
+                    break
+                users = set().union(*(tiers[tier][1] for tiers in matches if tier < len(tiers))) - chosen
+                best = heapq.nsmallest(limit - len(ranked), users, key=self.sort_keys.__getitem__)
+                ranked.extend(best)
+                chosen.update(best)
+            return [dict(self.users[user_id]) for user_id in ranked]
+
+    def _similar_tokens(self, part):
+        """token -> similarity for the indexed tokens closest to one query part"""
+        query_trigrams = padded_trigrams(part)
+        overlap = Counter()
+        for trigram in query_trigrams:
+            overlap.update(self.postings.get(trigram, ()))
+        if part in self.tokens:
+            overlap[part] = len(query_trigrams)
+        # Shortlist by trigram Jaccard similarity, then rank by edit similarity
+        size = len(query_trigrams)
+        shortlist = heapq.nlargest(FUZZY_TOKENS, overlap.items(),
+                                   key=lambda item: item[1] / (len(item[0]) + 1 + size - item[1]))
+        scored = {token: similarity(part, token) for token, _ in shortlist}
+        return {token: score for token, score in scored.items() if score >= MIN_SIMILARITY}
+
+    def resolve(self, query, limit=RESOLVE_LIMIT, exclude_user_id=None):
+        """Best fuzzy matches for a person's name as [(score, user_id)]
+
+        Each word of the query is scored against the user's closest name
+        token; a user's score is the average over the words.
+        """
+        parts = list(dict.fromkeys(tokenize(query)))
+        if not parts:
+            return []
+        with self.lock:
+            totals = defaultdict(float)
+            for part in parts:
+                best = {}
+                for token, score in self._similar_tokens(part).items():
+                    for user_id in islice(self.tokens[token], MAX_CANDIDATES):
+                        if score > best.get(user_id, 0.0):
+                            best[user_id] = score
+                for user_id, score in best.items():
+                    totals[user_id] += score / len(parts)
+            totals.pop(exclude_user_id, None)
+            ranked = heapq.nsmallest(limit, totals.items(), key=lambda item: (-item[1], self.sort_keys[item[0]]))
+            return [(round(score, 2), user_id) for user_id, score in ranked if score >= MIN_SIMILARITY]
+
+    def first(self, limit, exclude_user_id=None):
+        """The first users in name order"""
+        with self.lock:
+            user_ids = (user_id for user_id in self.users if user_id != exclude_user_id)
+            return heapq.nsmallest(limit, user_ids, key=self.sort_keys.__getitem__)
+
+    def compact(self, user_id, score=None):
+        """The short form of a user shown to the agent"""
+        user = self.users[user_id]
+        entry = {"user_id": user_id, "name": full_name(user)}
+        if score is not None:
+            entry["match"] = score
+        return entry
+
+    def __len__(self):
+        return len(self.users)
+
+
+user_index = UserNameIndex()
+# (index version, normalized name, limit, excluded user) -> compact matches
+resolve_cache = TTLCache(max_entries=int(os.getenv('RESOLVE_CACHE_SIZE', '4096')), ttl=USER_INDEX_REBUILD_SECONDS)
+
+
+@db.on_write
+def track_user_writes(table, user_ids):
+    if table == 'users':
+        user_index.mark_stale(user_ids)
+
+
+def resolve_user(name, limit=RESOLVE_LIMIT, exclude_user_id=None):
+    """Top fuzzy matches for a name as compact {user_id, name, match} entries"""
+    user_index.refresh()
+    key = (user_index.version, ' '.join(tokenize(name)), limit, exclude_user_id)
+    matches = resolve_cache.get(key)
+    if matches is None:
+        with user_index.lock:
+            matches = [user_index.compact(user_id, score)
+                       for score, user_id in user_index.resolve(name, limit, exclude_user_id)]
+        resolve_cache.set(key, matches)
+    return matches
+
+
+def list_users_compact(limit=RESOLVE_LIMIT, exclude_user_id=None):
+    """A short, name-ordered list of users as compact {user_id, name} entries"""
+    user_index.refresh()
+    with user_index.lock:
+        return [user_index.compact(user_id) for user_id in user_index.first(limit, exclude_user_id)]
+
+
+def search_users(query, limit=SEARCH_LIMIT):
+    """Ranked name search over all users, refreshing the shared index first; raises ValueError for a bad limit"""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    return user_index.refresh().search(query, max(1, min(limit, MAX_SEARCH_LIMIT)))
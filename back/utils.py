@@ -1,41 +1,10 @@
 import os
-from pinecone import Pinecone, ServerlessSpec
-from time import sleep
-
-pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
-index_name = "notes"
-
-if index_name not in pc.list_indexes().names():
-    pc.create_index(
-        name=index_name,
-        dimension=768, # Replace with your model dimensions
-        metric="cosine", # Replace with your model metric
-        spec=ServerlessSpec(
-            cloud="aws",
-            region="us-east-1"
-        ) 
-    )
-
-from langchain_pinecone import PineconeVectorStore
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage
+import clients
 from pydantic import BaseModel, Field
 from typing import Optional, Union, List
 from typing_extensions import Annotated, TypedDict
-from langchain_community.vectorstores import FAISS
-from langchain.docstore.document import Document
-
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-)
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+index_name = clients.NOTES_INDEX
 
 class Notes(BaseModel):
     """
@@ -44,7 +13,9 @@ class Notes(BaseModel):
 
     notes: List[str] = Field(description="Clinical point form notes")
 
-def make_note(transaction, notes="No history yet", llm=llm):
+def make_note(transaction, notes="No history yet", llm=None):
+    from langchain_core.prompts import ChatPromptTemplate
+    llm = llm or clients.get('notes_model')
 
     system_template = "Here are past notes on the user and their transaction history, and a new transaction. Create a single concise note for the new transaction using the notes as context. Avoid including information already present in the transaction."
 
@@ -59,13 +30,18 @@ def make_note(transaction, notes="No history yet", llm=llm):
     
     return response.content
 
-def update_notes(transaction, notes="No history yet", llm=llm):
+def update_notes(transaction, notes="No history yet", llm=None):
+    """New notes after one transaction, or a list of them folded in with one call"""
+    from langchain_core.prompts import ChatPromptTemplate
+    llm = llm or clients.get('notes_model')
+    if isinstance(transaction, list):
+        transaction = "\n".join(transaction)
 
     structured_llm = llm.with_structured_output(Notes)
     system_template = """
     You are working on notes you took on the user and user's transaction history. The notes should include ample numbers to track quantitative patterns in their transaction history (including BUT NOT LIMITED TO transaction history and purchase amount). They should not only track quantiative patterns in their transaction history but also qualitative patterns. The notes should not only track transaction history patterns but also insights into the user (including BUT NOT LIMITED TO user habits, preferences, and personality). The notes should be concise and in point form notes, and the tone must be clinical. The notes should be able to capture as much information as you can about the user.
     
-    Below are: your current notes and a new transaction. You will update your notes given this latest transaction. You will reorganize and simplify your notes to shorter. Always strive to store the information as concisely as possible without repetition. Remove repetition and details that are redundant and too specific. You will draw broader conclusions. You must analyze the user such as BUT NOT LIMITED TO their personality, likes/dislikes, habits, and other characteristics. DO NOT FORGET TO ACCOUNT FOR THE NEW TRANSACTION IN YOUR NOTES.
+    Below are: your current notes and a new transaction. You will update your notes given this latest transaction. You will reorganize and simplify your notes to shorter. Always strive to store the information as concisely as possible without repetition. Remove repetition and details that are redundant and too specific. You will draw broader conclusions. You must analyze the user such as BUT NOT LIMITED TO their personality, likes/dislikes, habits, and other characteristics. DO NOT FORGET TO ACCOUNT FOR THE NEW TRANSACTION (ONE PER LINE IF THERE ARE SEVERAL) IN YOUR NOTES.
     """
 
 
@@ -81,6 +57,8 @@ def update_notes(transaction, notes="No history yet", llm=llm):
     return response.notes
 
 if __name__ == "__main__":
+    import vector_index
+    index = vector_index.LocalVectorIndex()
     notes = ["Empty"]
     transactions = [
         "2023-10-26 08:15: Espresso, 'The Daily Grind', $3.50",
@@ -98,22 +76,20 @@ if __name__ == "__main__":
         transaction_note = make_note(transaction, notes)
         transaction_notes.append(transaction_note)
         notes = update_notes(transaction, notes)
-        print(f"\n\n{transaction}:\n- {'\n- '.join(notes)}\n\n")
+        print("\n\n" + transaction + ":\n- " + "\n- ".join(notes) + "\n\n")
     print("Individual transaction notes:")
     for transaction, note in zip(transactions, transaction_notes):
         print(transaction, note)
 
-    texts = [Document(page_content=note) for note in notes]
-    #vectorstore = FAISS.from_documents(texts, embeddings)
-    index_name = "notes"
-    vectorstore = PineconeVectorStore.from_documents(texts, index_name=index_name, embedding=embeddings)
-    input("waiting for stupid pinecone...")
-    retriever = vectorstore.as_retriever(search_type="mmr")
-    docs = retriever.invoke("Educational expenses")
-    print("Educational expenses:", docs, "\n")
-
-    texts1 = [Document(page_content=note, metadata={"transaction": transaction}) for transaction, note in zip(transactions, transaction_notes)]
-    vectorstore1 = FAISS.from_documents(texts1, embeddings)
-    retriever1 = vectorstore1.as_retriever(search_type="mmr")
-    docs1 = retriever1.invoke("Educational expenses")
+    # Searchable as soon as upsert returns; no waiting on remote indexing
+    vector_index.index_notes("demo", notes, index)
+    print("Educational expenses:", vector_index.search_notes("demo", "Educational expenses", index=index), "\n")
+
+    embeddings = clients.get('embeddings')
+    index.upsert("demo-transactions", [
+        {"id": f"transaction-{i}", "vector": vector, "text": note, "metadata": {"transaction": transaction}}
+        for i, (transaction, note, vector) in enumerate(
+            zip(transactions, transaction_notes, embeddings.embed_documents(transaction_notes)))
+    ])
+    docs1 = index.mmr("demo-transactions", embeddings.embed_query("Educational expenses"))
     print("Educational expenses:", docs1)
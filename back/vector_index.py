@@ -0,0 +1,393 @@
+"""Vector index over user notes for retrieval (RAG)
+
+The old notes demo rebuilt a Pinecone or FAISS store from scratch on every
+run and then waited for Pinecone to finish indexing. ``LocalVectorIndex``
+keeps one namespace per user in NumPy arrays instead:
+
+- ``upsert`` / ``delete`` by id, in place, so updating a user's notes only
+  touches (and embeds) the notes that changed;
+- ``search`` (cosine top-k) and ``mmr`` (maximal marginal relevance, as the
+  LangChain retrievers do) with optional metadata filters: ``{key: value}``,
+  or ``{key: [values]}`` for any of several values;
+- ``save`` writes a new snapshot (``vectors.npy`` + ``index.json``) and then
+  atomically points ``CURRENT`` at it; ``load`` memory-maps the vectors, so
+  it takes milliseconds whatever the size, and a namespace is only copied
+  into memory when it is next written. ``checkpoint`` saves at most every
+  ``NOTES_VECTOR_SAVE_SECONDS``; notes themselves are durable in the notes
+  store, and ``index_notes`` re-embeds whatever the snapshot missed.
+
+Results are visible as soon as ``upsert`` returns. ``PineconeVectorIndex``
+has the same interface for deployments that want Pinecone
+(``NOTES_VECTOR_BACKEND=pinecone``); the local index is the default.
+"""
+import os
+import json
+import time
+import hashlib
+import shutil
+import threading
+import numpy as np
+import clients
+
+NOTES_VECTOR_BACKEND = os.getenv('NOTES_VECTOR_BACKEND', 'local')
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'notes_index')
+NOTES_VECTOR_SAVE_SECONDS = float(os.getenv('NOTES_VECTOR_SAVE_SECONDS', '30'))
+VECTORS_FILE = 'vectors.npy'
+INDEX_FILE = 'index.json'
+CURRENT_FILE = 'CURRENT'
+FETCH_K = 20
+LAMBDA_MULT = 0.5
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _matches(metadata, where):
+    for key, wanted in where.items():
+        value = metadata.get(key)
+        if isinstance(wanted, (list, tuple, set)):
+            if value not in wanted:
+                return False
+        elif value != wanted:
+            return False
+    return True
+
+
+def _top(scores, k):
+    """Indices of the k highest scores, best first"""
+    if len(scores) > k:
+        top = np.argpartition(-scores, k)[:k]
+        return top[np.argsort(-scores[top], kind='stable')]
+    return np.argsort(-scores, kind='stable')
+
+
+def mmr(query, vectors, k=4, lambda_mult=LAMBDA_MULT):
+    """Row indices of vectors picked by maximal marginal relevance to query
+
+    Each pick maximises lambda * similarity to the query minus
+    (1 - lambda) * the highest similarity to a row already picked.
+    Vectors and query must be unit length.
+    """
+    if len(vectors) == 0:
+        return []
+    relevance = vectors @ query
+    redundancy = np.full(len(vectors), -np.inf, dtype=np.float32)
+    chosen = []
+    for _ in range(min(k, len(vectors))):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * np.where(np.isinf(redundancy), 0, redundancy)
+        scores[chosen] = -np.inf
+        pick = int(np.argmax(scores))
+        chosen.append(pick)
+        redundancy = np.maximum(redundancy, vectors @ vectors[pick])
+    return chosen
+
+
+class Namespace:
+    """The vectors, ids, texts and metadata of one user"""
+
+    def __init__(self, dim, vectors=None, ids=(), texts=(), metadata=()):
+        self.ids = list(ids)
+        self.rows = {item_id: row for row, item_id in enumerate(self.ids)}
+        self.texts = list(texts)
+        self.metadata = list(metadata)
+        # Read-only (memory-mapped) until the first write
+        self.vectors = vectors if vectors is not None else np.empty((0, dim), dtype=np.float32)
+        self.writable = vectors is None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def view(self):
+        return self.vectors[:len(self.ids)]
+
+    def _reserve(self, count):
+        needed = len(self.ids) + count
+        if self.writable and needed <= len(self.vectors):
+            return
+        grown = np.empty((max(needed, 2 * len(self.vectors), 16), self.vectors.shape[1]), dtype=np.float32)
+        grown[:len(self.ids)] = self.view()
+        self.vectors = grown
+        self.writable = True
+
+    def upsert(self, ids, vectors, texts, metadata):
+        new = sum(1 for item_id in dict.fromkeys(ids) if item_id not in self.rows)
+        self._reserve(new)
+        for item_id, vector, text, meta in zip(ids, vectors, texts, metadata):
+            row = self.rows.get(item_id)
+            if row is None:
+                row = self.rows[item_id] = len(self.ids)
+                self.ids.append(item_id)
+                self.texts.append(text)
+                self.metadata.append(meta)
+            else:
+                self.texts[row] = text
+                self.metadata[row] = meta
+            self.vectors[row] = vector
+
+    def delete(self, ids):
+        """Remove ids by moving the last row into each hole"""
+        removed = 0
+        for item_id in ids:
+            row = self.rows.pop(item_id, None)
+            if row is None:
+                continue
+            if not self.writable:
+                self._reserve(0)
+            last = len(self.ids) - 1
+            if row != last:
+                moved = self.ids[last]
+                self.ids[row], self.texts[row], self.metadata[row] = moved, self.texts[last], self.metadata[last]
+                self.vectors[row] = self.vectors[last]
+                self.rows[moved] = row
+            self.ids.pop()
+            self.texts.pop()
+            self.metadata.pop()
+            removed += 1
+        return removed
+
+    def candidates(self, where):
+        """(row indices, vectors) passing the metadata filter"""
+        vectors = self.view()
+        if not where:
+            return np.arange(len(self.ids)), vectors
+        rows = np.fromiter((row for row, meta in enumerate(self.metadata) if _matches(meta, where)), dtype=np.int64)
+        return rows, vectors[rows]
+
+    def result(self, row, score):
+        return {"id": self.ids[row], "text": self.texts[row], "metadata": self.metadata[row], "score": float(score)}
+
+
+class LocalVectorIndex:
+    """Per-namespace in-process vector index with on-disk snapshots"""
+
+    def __init__(self, dim=768, path=None):
+        self.dim = dim
+        self.path = path
+        self.namespaces = {}
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.dirty = False
+        self.saved_at = time.monotonic()
+
+    def upsert(self, namespace, items):
+        """Insert or replace items: dicts with id, vector, text and optional metadata"""
+        if not items:
+            return 0
+        vectors = _normalize([item['vector'] for item in items])
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+        with self.lock:
+            space = self.namespaces.get(namespace)
+            if space is None:
+                space = self.namespaces[namespace] = Namespace(self.dim)
+            space.upsert([item['id'] for item in items], vectors, [item.get('text', '') for item in items],
+                         [item.get('metadata') or {} for item in items])
+            self.dirty = True
+        return len(items)
+
+    def delete(self, namespace, ids=None):
+        """Delete ids from a namespace, or the whole namespace when ids is None"""
+        with self.lock:
+            self.dirty = True
+            if ids is None:
+                space = self.namespaces.pop(namespace, None)
+                return len(space) if space else 0
+            space = self.namespaces.get(namespace)
+            return space.delete(ids) if space else 0
+
+    def get(self, namespace):
+        """{id: text} of every item in a namespace"""
+        with self.lock:
+            space = self.namespaces.get(namespace)
+            return dict(zip(space.ids, space.texts)) if space else {}
+
+    def search(self, namespace, vector, k=4, where=None):
+        """Top k items by cosine similarity, best first"""
+        query = _normalize(vector)
+        with self.lock:
+            space = self.namespaces.get(namespace)
+            if not space:
+                return []
+            rows, vectors = space.candidates(where)
+            scores = vectors @ query
+            return [space.result(rows[i], scores[i]) for i in _top(scores, k)]
+
+    def mmr(self, namespace, vector, k=4, fetch_k=FETCH_K, lambda_mult=LAMBDA_MULT, where=None):
+        """k items chosen by MMR from the fetch_k most similar"""
+        query = _normalize(vector)
+        with self.lock:
+            space = self.namespaces.get(namespace)
+            if not space:
+                return []
+            rows, vectors = space.candidates(where)
+            scores = vectors @ query
+            fetched = _top(scores, fetch_k)
+            picked = mmr(query, vectors[fetched], k, lambda_mult)
+            return [space.result(rows[fetched[i]], scores[fetched[i]]) for i in picked]
+
+    def save(self, path=None):
+        """Write a snapshot and switch CURRENT to it; returns the number of items"""
+        path = path or self.path
+        with self.lock:
+            names = list(self.namespaces)
+            spaces = [self.namespaces[name] for name in names]
+            manifest = {"dim": self.dim, "namespaces": []}
+            offset = 0
+            for name, space in zip(names, spaces):
+                manifest["namespaces"].append({
+                    "name": name, "offset": offset, "ids": space.ids, "texts": space.texts, "metadata": space.metadata,
+                })
+                offset += len(space)
+            vectors = np.concatenate([space.view() for space in spaces]) if spaces else np.empty((0, self.dim), np.float32)
+
+            self.generation += 1
+            snapshot = f"snapshot-{self.generation}"
+            directory = os.path.join(path, snapshot)
+            shutil.rmtree(directory, ignore_errors=True)
+            os.makedirs(directory)
+            np.save(os.path.join(directory, VECTORS_FILE), vectors)
+            with open(os.path.join(directory, INDEX_FILE), 'w') as f:
+                json.dump(manifest, f, separators=(',', ':'))
+            with open(os.path.join(path, CURRENT_FILE + '.tmp'), 'w') as f:
+                f.write(snapshot)
+            os.replace(os.path.join(path, CURRENT_FILE + '.tmp'), os.path.join(path, CURRENT_FILE))
+            # Older snapshots may still be memory-mapped; unlinking them is safe on POSIX
+            for entry in os.listdir(path):
+                if entry.startswith('snapshot-') and entry != snapshot:
+                    shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+            self.dirty = False
+            self.saved_at = time.monotonic()
+        return offset
+
+    def checkpoint(self, interval=NOTES_VECTOR_SAVE_SECONDS):
+        """Save if there are unsaved changes and the last save is interval seconds old"""
+        if self.path and self.dirty and time.monotonic() - self.saved_at >= interval:
+            return self.save()
+        return None
+
+    @classmethod
+    def load(cls, path, dim=768):
+        """Open the CURRENT snapshot with memory-mapped vectors; an empty index if there is none"""
+        index = cls(dim, path)
+        try:
+            with open(os.path.join(path, CURRENT_FILE)) as f:
+                snapshot = f.read().strip()
+        except FileNotFoundError:
+            return index
+        directory = os.path.join(path, snapshot)
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            manifest = json.load(f)
+        index.dim = manifest["dim"]
+        index.generation = int(snapshot.rsplit('-', 1)[1])
+        vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode='r')
+        for entry in manifest["namespaces"]:
+            count = len(entry["ids"])
+            index.namespaces[entry["name"]] = Namespace(
+                index.dim, vectors[entry["offset"]:entry["offset"] + count],
+                entry["ids"], entry["texts"], entry["metadata"]
+            )
+        return index
+
+
+class PineconeVectorIndex:
+    """The LocalVectorIndex interface on a Pinecone index, one namespace per user"""
+
+    def __init__(self, index_name=None):
+        self.index = clients.get('pinecone').Index(index_name or clients.get('notes_index'))
+
+    def upsert(self, namespace, items):
+        self.index.upsert(vectors=[{
+            "id": item['id'],
+            "values": list(map(float, item['vector'])),
+            "metadata": dict(item.get('metadata') or {}, text=item.get('text', '')),
+        } for item in items], namespace=namespace)
+        return len(items)
+
+    def delete(self, namespace, ids=None):
+        if ids is None:
+            self.index.delete(delete_all=True, namespace=namespace)
+        elif ids:
+            self.index.delete(ids=list(ids), namespace=namespace)
+
+    def get(self, namespace):
+        ids = [item_id for page in self.index.list(namespace=namespace) for item_id in page]
+        if not ids:
+            return {}
+        fetched = self.index.fetch(ids=ids, namespace=namespace).vectors
+        return {item_id: vector.metadata.get('text', '') for item_id, vector in fetched.items()}
+
+    def _query(self, namespace, vector, top_k, where, include_values=False):
+        filter_ = {key: {"$in": list(value)} if isinstance(value, (list, tuple, set)) else {"$eq": value}
+                   for key, value in (where or {}).items()}
+        response = self.index.query(vector=list(map(float, vector)), top_k=top_k, namespace=namespace,
+                                    filter=filter_ or None, include_metadata=True, include_values=include_values)
+        results = []
+        for match in response.matches:
+            metadata = dict(match.metadata or {})
+            results.append({"id": match.id, "text": metadata.pop('text', ''), "metadata": metadata,
+                            "score": match.score, "values": match.values})
+        return results
+
+    def search(self, namespace, vector, k=4, where=None):
+        results = self._query(namespace, vector, k, where)
+        for result in results:
+            del result["values"]
+        return results
+
+    def mmr(self, namespace, vector, k=4, fetch_k=FETCH_K, lambda_mult=LAMBDA_MULT, where=None):
+        results = self._query(namespace, vector, fetch_k, where, include_values=True)
+        if not results:
+            return []
+        picked = mmr(_normalize(vector), _normalize([result.pop("values") for result in results]), k, lambda_mult)
+        return [results[i] for i in picked]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The notes vector index selected by NOTES_VECTOR_BACKEND"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            if NOTES_VECTOR_BACKEND == 'pinecone':
+                _index = PineconeVectorIndex()
+            else:
+                path = os.getenv('NOTES_VECTOR_PATH', DEFAULT_PATH)
+                _index = LocalVectorIndex.load(path) if path else LocalVectorIndex()
+        return _index
+
+
+def index_notes(user_id, notes, index=None, embed=None):
+    """Make the user's namespace hold exactly these notes, embedding only the changed ones
+
+    Note ids are hashes of the text, since update_notes rewrites the whole
+    list: a note whose text is unchanged keeps its vector wherever it moved
+    to. Returns the number of notes embedded.
+    """
+    index = index or get_index()
+    embed = embed or clients.get('embeddings').embed_documents
+    current = index.get(user_id)
+    wanted = {f"note-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]}": text for text in notes}
+    changed = [item_id for item_id, text in wanted.items() if current.get(item_id) != text]
+    if changed:
+        vectors = embed([wanted[item_id] for item_id in changed])
+        index.upsert(user_id, [{"id": item_id, "vector": vector, "text": wanted[item_id],
+                                "metadata": {"kind": "note"}} for item_id, vector in zip(changed, vectors)])
+    stale = [item_id for item_id in current if item_id not in wanted]
+    if stale:
+        index.delete(user_id, stale)
+    if isinstance(index, LocalVectorIndex):
+        index.checkpoint()
+    return len(changed)
+
+
+def search_notes(user_id, query, k=4, where=None, index=None, embed_query=None):
+    """The user's notes most relevant to query, diversified with MMR"""
+    index = index or get_index()
+    embed_query = embed_query or clients.get('embeddings').embed_query
+    return index.mmr(user_id, embed_query(query), k=k, where=where)
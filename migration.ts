@@ -49,6 +49,13 @@ async function runMigration() {
     CREATE INDEX IF NOT EXISTS idx_user_id ON transactions(user_id);
     CREATE INDEX IF NOT EXISTS idx_wallet_id ON transactions(wallet_id);
     CREATE INDEX IF NOT EXISTS idx_transaction_date ON transactions(date);
+    -- Keyset pagination of /api/transactions/<user_id>/page
+    CREATE INDEX IF NOT EXISTS idx_transactions_user_created ON transactions(user_id, created_at DESC, transaction_id DESC);
+    CREATE INDEX IF NOT EXISTS idx_transactions_user_amount ON transactions(user_id, amount, transaction_id);
+
+    -- Aggregate functions (amount.sum()) for the totals of /api/transactions/<user_id>/page
+    ALTER ROLE authenticator SET pgrst.db_aggregates_enabled = 'true';
+    NOTIFY pgrst, 'reload config';
   `;
 
   const { error } = await supabase.rpc('execute_sql', { sql });
@@ -89,3 +96,134 @@ runMigration();
 // ADD COLUMN recipient TEXT,
 // ADD COLUMN note TEXT,
 // ADD COLUMN is_fraud BOOLEAN DEFAULT FALSE;
+
+// -- Atomic transfer used by back/db.py transfer_funds (one RPC instead of
+// -- two wallet reads, two wallet updates and two transaction inserts)
+// CREATE OR REPLACE FUNCTION transfer_funds(
+//     p_sender_id UUID,
+//     p_recipient_id UUID,
+//     p_amount NUMERIC,
+//     p_description TEXT,
+//     p_sender_description TEXT DEFAULT NULL,
+//     p_recipient_description TEXT DEFAULT NULL,
+//     p_sender_note TEXT DEFAULT NULL,
+//     p_recipient_note TEXT DEFAULT NULL,
+//     p_category TEXT DEFAULT 'transfer',
+//     p_payment_method TEXT DEFAULT 'debit'
+// ) RETURNS JSONB LANGUAGE plpgsql AS $$
+// DECLARE
+//     sender_balance NUMERIC;
+//     recipient_balance NUMERIC;
+//     sender_row transactions;
+//     recipient_row transactions;
+// BEGIN
+//     IF p_amount IS NULL OR p_amount <= 0 THEN
+//         RETURN jsonb_build_object('success', false, 'error', 'Amount must be positive');
+//     END IF;
+//
+//     -- Lock both wallets in a fixed order so concurrent transfers cannot deadlock
+//     PERFORM 1 FROM wallets WHERE user_id IN (p_sender_id, p_recipient_id) ORDER BY user_id FOR UPDATE;
+//
+//     SELECT debit_balance INTO sender_balance FROM wallets WHERE user_id = p_sender_id;
+//     IF NOT FOUND THEN
+//         RETURN jsonb_build_object('success', false, 'error', 'Sender wallet not found');
+//     END IF;
+//     IF NOT EXISTS (SELECT 1 FROM wallets WHERE user_id = p_recipient_id) THEN
+//         RETURN jsonb_build_object('success', false, 'error', 'Recipient wallet not found');
+//     END IF;
+//     IF sender_balance < p_amount THEN
+//         RETURN jsonb_build_object('success', false, 'error', 'Insufficient funds', 'balance', sender_balance);
+//     END IF;
+//
+//     UPDATE wallets SET debit_balance = debit_balance - p_amount
+//         WHERE user_id = p_sender_id RETURNING debit_balance INTO sender_balance;
+//     UPDATE wallets SET debit_balance = debit_balance + p_amount
+//         WHERE user_id = p_recipient_id RETURNING debit_balance INTO recipient_balance;
+//
+//     INSERT INTO transactions (user_id, description, amount, category, payment_method, transaction_type, recipient, note, is_fraud)
+//         VALUES (p_sender_id, COALESCE(p_sender_description, p_description), -p_amount, p_category, p_payment_method, 'expense', p_recipient_id::TEXT, p_sender_note, FALSE)
+//         RETURNING * INTO sender_row;
+//     INSERT INTO transactions (user_id, description, amount, category, payment_method, transaction_type, recipient, note, is_fraud)
+//         VALUES (p_recipient_id, COALESCE(p_recipient_description, p_description), p_amount, p_category, p_payment_method, 'income', p_sender_id::TEXT, p_recipient_note, FALSE)
+//         RETURNING * INTO recipient_row;
+//
+//     RETURN jsonb_build_object(
+//         'success', true,
+//         'sender_balance', sender_balance,
+//         'recipient_balance', recipient_balance,
+//         'sender_transaction', to_jsonb(sender_row),
+//         'recipient_transaction', to_jsonb(recipient_row)
+//     );
+// END;
+// $$;
+
+// -- Version stamp for the financial summary cache (back/finance_summary_agent.py):
+// -- one cheap call instead of re-reading transactions, wallet and budgets
+// CREATE OR REPLACE FUNCTION summary_watermark(p_user_id UUID)
+// RETURNS JSONB LANGUAGE sql STABLE AS $$
+//     SELECT jsonb_build_object(
+//         'transaction', (
+//             SELECT jsonb_build_object('transaction_id', transaction_id, 'created_at', created_at)
+//             FROM transactions WHERE user_id = p_user_id
+//             ORDER BY created_at DESC, transaction_id DESC LIMIT 1
+//         ),
+//         'wallet', (
+//             SELECT md5(concat_ws('|', debit_balance, credit_balance, saving_balance))
+//             FROM wallets WHERE user_id = p_user_id
+//         ),
+//         'budgets', (
+//             SELECT md5(COALESCE(string_agg(concat_ws('|', id, category, amount, period, start_date, end_date), '|' ORDER BY id), ''))
+//             FROM budget_plans WHERE user_id = p_user_id
+//         )
+//     );
+// $$;
+
+// -- Bulk import used by back/db.py import_transactions: one call per batch
+// -- inserts every row and applies the batch's net amount to the debit balance
+// CREATE OR REPLACE FUNCTION import_transactions(
+//     p_user_id UUID,
+//     p_rows JSONB,
+//     p_adjust_balance BOOLEAN DEFAULT TRUE
+// ) RETURNS JSONB LANGUAGE plpgsql AS $$
+// DECLARE
+//     user_wallet wallets%ROWTYPE;
+//     inserted_count INTEGER;
+//     inserted_rows JSONB;
+//     net NUMERIC;
+//     new_balance NUMERIC;
+// BEGIN
+//     SELECT * INTO user_wallet FROM wallets WHERE user_id = p_user_id FOR UPDATE;
+//     IF NOT FOUND THEN
+//         RETURN jsonb_build_object('success', false, 'error', 'Wallet not found');
+//     END IF;
+//
+//     WITH inserted AS (
+//         INSERT INTO transactions (user_id, wallet_id, description, amount, category, payment_method,
+//                                   transaction_type, created_at, recipient, note, is_fraud)
+//         SELECT p_user_id, user_wallet.wallet_id, r.description, r.amount, r.category, r.payment_method,
+//                r.transaction_type, COALESCE(r.created_at, now()), r.recipient, r.note, COALESCE(r.is_fraud, FALSE)
+//         FROM jsonb_to_recordset(p_rows) AS r(
+//             description TEXT, amount NUMERIC, category TEXT, payment_method TEXT, transaction_type TEXT,
+//             created_at TIMESTAMPTZ, recipient TEXT, note TEXT, is_fraud BOOLEAN
+//         )
+//         RETURNING *
+//     )
+//     SELECT count(*), COALESCE(jsonb_agg(to_jsonb(inserted)), '[]'::jsonb)
+//     INTO inserted_count, inserted_rows FROM inserted;
+//
+//     SELECT COALESCE(SUM((r->>'amount')::NUMERIC), 0) INTO net FROM jsonb_array_elements(p_rows) AS r;
+//     new_balance := user_wallet.debit_balance;
+//     IF p_adjust_balance AND net <> 0 THEN
+//         UPDATE wallets SET debit_balance = debit_balance + net
+//         WHERE user_id = p_user_id RETURNING debit_balance INTO new_balance;
+//     END IF;
+//
+//     RETURN jsonb_build_object(
+//         'success', true,
+//         'inserted', inserted_count,
+//         'transactions', inserted_rows,
+//         'net_amount', net,
+//         'balance', new_balance
+//     );
+// END;
+// $$;